@@ -0,0 +1,110 @@
+"""
+Throughput, chunk sizes and import cost of the page-aware chunker (utils/chunker.py)
+against langchain's RecursiveCharacterTextSplitter, which it replaced.
+
+    cd backend && python -m benchmarks.chunker [--books books_pdfs] [--max-files 0]
+                                               [--repeat 3] [--output results.json]
+
+Pages are extracted once up front; only splitting is timed (best of --repeat runs).
+Both splitters use CHUNK_SIZE / CHUNK_OVERLAP characters; the chunker is also timed
+in token mode. The langchain rows need `pip install langchain-text-splitters` and are
+reported as unavailable without it.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from config.config import BOOKS_FOLDER_PATH, CHUNK_SIZE, CHUNK_OVERLAP
+from utils.pdf_processor import list_pdf_files, extract_pages
+from utils.chunker import chunk_pages
+
+
+def best_time(fn, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def report(texts, characters, seconds):
+    sizes = sorted(len(t) for t in texts)
+    return {
+        "chunks": len(sizes),
+        "seconds": round(seconds, 4),
+        "mb_per_sec": round(characters / 1e6 / seconds, 2),
+        "mean_chars": round(sum(sizes) / len(sizes), 1) if sizes else 0,
+        "max_chars": sizes[-1] if sizes else 0,
+    }
+
+
+def import_seconds(module):
+    """Wall time of importing module in a fresh interpreter, or None if it is not installed."""
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    proc = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return None
+    return round(float(proc.stdout.split()[-1]), 4)  # config prints its own startup lines first
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", default=BOOKS_FOLDER_PATH, help="folder of PDFs to split")
+    parser.add_argument("--max-files", type=int, default=0, help="only the first N PDFs (0 = all)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per splitter; the fastest is reported")
+    parser.add_argument("--output", help="write the JSON results to this file")
+    args = parser.parse_args()
+
+    pdf_files = list_pdf_files(args.books)
+    if args.max_files:
+        pdf_files = pdf_files[:args.max_files]
+    documents = {f: extract_pages(os.path.join(args.books, f)) for f in pdf_files}
+    characters = sum(len(text) for pages in documents.values() for _, text in pages)
+
+    def run_chunker(unit, size, overlap):
+        return [c.text for f, pages in documents.items() for c in chunk_pages(pages, f, size, overlap, unit)]
+
+    texts, seconds = best_time(lambda: run_chunker("chars", CHUNK_SIZE, CHUNK_OVERLAP), args.repeat)
+    results = {
+        "files": len(documents),
+        "pages": sum(len(pages) for pages in documents.values()),
+        "megachars": round(characters / 1e6, 2),
+        "chunker_chars": report(texts, characters, seconds),
+    }
+    # Roughly the same chunk length in tokens (about 4 characters per token)
+    texts, seconds = best_time(lambda: run_chunker("tokens", CHUNK_SIZE // 4, CHUNK_OVERLAP // 4), args.repeat)
+    results["chunker_tokens"] = report(texts, characters, seconds)
+
+    try:
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+    except ImportError:
+        results["langchain"] = {"error": "langchain-text-splitters is not installed"}
+    else:
+        splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, length_function=len)
+        joined = ["".join(text for _, text in pages) for pages in documents.values()]
+        texts, seconds = best_time(lambda: [t for doc in joined for t in splitter.split_text(doc)], args.repeat)
+        results["langchain"] = report(texts, characters, seconds)
+        results["speedup"] = round(results["langchain"]["seconds"] / results["chunker_chars"]["seconds"], 2)
+
+    results["import_seconds"] = {
+        "utils.chunker": import_seconds("utils.chunker"),
+        "langchain_text_splitters": import_seconds("langchain_text_splitters"),
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Accuracy and latency of the domain gate (models/domain_gate.py).
+
+    cd backend && python -m benchmarks.domain_gate [--embed] [--output results.json]
+
+Scores the keyword matcher against the labelled questions in data/domain_queries.jsonl
+and times it per call. With --embed the questions are also embedded with Cohere and the
+embedding classifier (library centroid vs DOMAIN_EMBED_THRESHOLD) is scored; this needs
+a corpus artifact built with `python -m utils.corpus --embed` and a COHERE_API_KEY.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.domain_gate import matches_domain_terms, embedding_domain_score, is_data_science_query
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), "data", "domain_queries.jsonl")
+
+
+def load_queries(path=DATA_FILE):
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def score(predictions, labels):
+    tp = sum(p and l for p, l in zip(predictions, labels))
+    fp = sum(p and not l for p, l in zip(predictions, labels))
+    fn = sum(l and not p for p, l in zip(predictions, labels))
+    correct = sum(p == l for p, l in zip(predictions, labels))
+    return {
+        "accuracy": round(correct / len(labels), 4),
+        "precision": round(tp / (tp + fp), 4) if tp + fp else 0.0,
+        "recall": round(tp / (tp + fn), 4) if tp + fn else 0.0,
+        "errors": [i for i, (p, l) in enumerate(zip(predictions, labels)) if p != l],
+    }
+
+
+def time_per_call(fn, texts, repeat=200):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            fn(text)
+    return (time.perf_counter() - start) / (repeat * len(texts)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--embed", action="store_true", help="also score the embedding classifier (calls Cohere)")
+    parser.add_argument("--output", help="write the JSON results to this file")
+    args = parser.parse_args()
+
+    rows = load_queries()
+    texts = [r["query"] for r in rows]
+    labels = [r["label"] for r in rows]
+
+    keyword = score([matches_domain_terms(t) for t in texts], labels)
+    keyword["errors"] = [texts[i] for i in keyword["errors"]]
+    results = {
+        "queries": len(rows),
+        "keyword": {**keyword, "us_per_call": round(time_per_call(matches_domain_terms, texts), 2)},
+    }
+
+    if args.embed:
+        from models.embeddings import get_clients, embed_query
+        cohere_client, _ = get_clients()
+        embeddings = [embed_query(t, cohere_client) for t in texts]
+        if embedding_domain_score(embeddings[0]) is None:
+            results["embedding"] = {"error": "corpus artifact has no embeddings"}
+        else:
+            combined = score([is_data_science_query(t, e) for t, e in zip(texts, embeddings)], labels)
+            combined["errors"] = [texts[i] for i in combined["errors"]]
+            results["embedding"] = {
+                **combined,
+                "scores": {t: round(embedding_domain_score(e), 4) for t, e in zip(texts, embeddings)},
+            }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
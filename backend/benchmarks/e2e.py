@@ -0,0 +1,330 @@
+"""
+Offline end-to-end benchmark and load test.
+
+    cd backend && python -m benchmarks.e2e [--sections ingest,retrieval,chat,threads]
+                                           [--max-files 3] [--requests 200] [--concurrency 20]
+                                           [--output results.json]
+
+Cohere, Pinecone and Groq are replaced by the stubs in benchmarks/stubs.py (latencies
+and streaming speed are flags), and every file the app writes goes to a temporary
+directory, so runs need no API keys and are comparable between commits. Measures:
+
+- ingest: load_and_chunk_pdfs and setup_vector_store throughput over the first
+  --max-files PDFs, plus the corpus artifact and BM25 index builds
+- retrieval: retrieve_context and the chat path's hybrid retrieval + packing, cold and
+  with the query-embedding cache warm
+- chat: /api/chat latency percentiles and throughput under --concurrency clients,
+  served in-process through the ASGI app (no sockets, no gunicorn)
+- threads: thread store operations, serially and with concurrent writers
+
+The JSON report goes to stdout (and --output); progress logs go to stderr.
+The answer cache is off by default so every chat request reaches the LLM stub.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import tempfile
+import argparse
+import platform
+import subprocess
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+SECTIONS = ("ingest", "retrieval", "chat", "threads")
+
+
+def configure_environment(work_dir):
+    """Points every path the app writes at work_dir and disables what the stubs do not need."""
+    defaults = {
+        "APP_DB_PATH": os.path.join(work_dir, "app.sqlite3"),
+        "QUERY_CACHE_DB": "",
+        "CORPUS_DIR": os.path.join(work_dir, "corpus"),
+        "LEXICAL_INDEX_DIR": os.path.join(work_dir, "lexical_index"),
+        "STATIC_BUILD_DIR": os.path.join(work_dir, "static"),
+        "VECTOR_BACKEND": "pinecone",
+        "COHERE_CALLS_PER_MINUTE": "0",
+        "PINECONE_CALLS_PER_MINUTE": "0",
+        "WEB_SEARCH_ENABLED": "false",
+        "ANSWER_CACHE_SIZE": "0",
+    }
+    for key, value in defaults.items():
+        os.environ.setdefault(key, value)
+
+
+def summarize(samples):
+    """Latency summary in milliseconds."""
+    if not samples:
+        return {"count": 0}
+    ms = np.asarray(samples) * 1000
+    return {
+        "count": len(ms),
+        "mean_ms": round(float(ms.mean()), 2),
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+        "max_ms": round(float(ms.max()), 2),
+    }
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def sample_queries():
+    from benchmarks.domain_gate import load_queries
+    return [r["query"] for r in load_queries() if r["label"]]
+
+
+# ---------- sections ----------
+
+def bench_ingest(books, work_dir, stubs):
+    from utils.pdf_processor import load_and_chunk_pdfs
+    from utils.corpus import build_corpus, get_corpus
+    from models.embeddings import setup_vector_store
+    from models.lexical_index import build_lexical_index
+    from config.config import CORPUS_DIR
+
+    size = sum(os.path.getsize(os.path.join(books, f)) for f in os.listdir(books))
+    chunks, seconds = timed(load_and_chunk_pdfs, books)
+    results = {
+        "files": len(os.listdir(books)),
+        "megabytes": round(size / 1e6, 2),
+        "load_and_chunk_pdfs": {
+            "chunks": len(chunks),
+            "seconds": round(seconds, 3),
+            "chunks_per_sec": round(len(chunks) / seconds, 1),
+            "mb_per_sec": round(size / 1e6 / seconds, 2),
+        },
+    }
+
+    calls_before = stubs.cohere.calls
+    _, seconds = timed(setup_vector_store, books, stubs.cohere, os.path.join(work_dir, "manifest.json"))
+    indexed = stubs.index.describe_index_stats()["total_vector_count"]
+    results["setup_vector_store"] = {
+        "chunks": indexed,
+        "seconds": round(seconds, 3),
+        "chunks_per_sec": round(indexed / seconds, 1),
+        "embed_calls": stubs.cohere.calls - calls_before,
+    }
+
+    # setup_vector_store built the corpus artifact while ingesting; time a full build on its own
+    _, seconds = timed(build_corpus, books, os.path.join(work_dir, "corpus_rebuild"))
+    results["build_corpus_seconds"] = round(seconds, 3)
+    _, seconds = timed(build_lexical_index, get_corpus(CORPUS_DIR))
+    results["build_lexical_index_seconds"] = round(seconds, 3)
+    return results
+
+
+def bench_retrieval(queries, stubs):
+    import main
+    from models.embeddings import retrieve_context
+    from models import query_cache
+    from models.vector_store import get_vector_store
+
+    main.VECTOR_READY = True
+    index = get_vector_store()
+    results = {}
+    for name, fn in (
+        ("retrieve_context", lambda q: retrieve_context(q, stubs.cohere, index)),
+        ("hybrid_retrieve_and_pack", main.retrieve_for_query),
+    ):
+        query_cache._query_cache = None  # memory-only cache (QUERY_CACHE_DB=""), so this starts it cold
+        cold = [timed(fn, q)[1] for q in queries]
+        warm = [timed(fn, q)[1] for q in queries]
+        results[name] = {"cold": summarize(cold), "warm_embedding_cache": summarize(warm)}
+    return results
+
+
+async def _chat_load(queries, total, concurrency):
+    import httpx
+    import main
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        response = await client.post("/register", json={"username": "bench", "password": "bench-password"})
+        if response.status_code == 409:
+            response = await client.post("/login", json={"username": "bench", "password": "bench-password"})
+        headers = {"Authorization": f"Bearer {response.json()['token']}"}
+
+        latencies = []
+        failures = 0
+        counter = iter(range(total))
+
+        async def client_loop(worker):
+            nonlocal failures
+            for i in counter:
+                payload = {"username": "bench", "query": queries[i % len(queries)],
+                           "thread_id": f"bench_{worker}"}
+                start = time.perf_counter()
+                try:
+                    r = await client.post("/api/chat", json=payload, headers=headers)
+                    ok = r.status_code == 200
+                except Exception:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    failures += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*[client_loop(w) for w in range(concurrency)])
+        wall = time.perf_counter() - start
+
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "failures": failures,
+        "seconds": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2),
+        "latency": summarize(latencies),
+    }
+
+
+def bench_chat(queries, total, concurrency):
+    import main
+    main.VECTOR_READY = True
+    return asyncio.run(_chat_load(queries, total, concurrency))
+
+
+def bench_threads(users=20, threads_per_user=10, turns=10, workers=8):
+    from datetime import datetime
+    from utils import thread_store
+
+    def turn(i):
+        return [
+            {"role": "user", "content": f"question {i} about gradient boosting", "ts": str(datetime.now())},
+            {"role": "assistant", "content": "answer " * 150, "ts": str(datetime.now())},
+        ]
+
+    keys = [(f"tuser{u}", f"tthread{t}") for u in range(users) for t in range(threads_per_user)]
+    results = {}
+
+    append = []
+    for i in range(turns):
+        for username, thread_id in keys:
+            append.append(timed(thread_store.append_messages, username, thread_id, turn(i), title="bench")[1])
+    results["append_messages"] = summarize(append)
+    results["list_thread_page"] = summarize(
+        [timed(thread_store.list_thread_page, f"tuser{u}", 50)[1] for u in range(users)]
+    )
+    results["get_thread"] = summarize([timed(thread_store.get_thread, u, t)[1] for u, t in keys])
+    # A client pushing its copy of the last turn, which the server already holds
+    results["sync_messages"] = summarize(
+        [timed(thread_store.sync_messages, u, t, (turns - 1) * 2, turn(turns - 1))[1] for u, t in keys]
+    )
+
+    # Writers from several threads contend for SQLite's single write lock
+    jobs = [(u, t, turn(turns)) for u, t in keys]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        start = time.perf_counter()
+        concurrent = list(pool.map(lambda job: timed(thread_store.append_messages, *job)[1], jobs))
+        wall = time.perf_counter() - start
+    results["concurrent_append"] = {
+        "workers": workers,
+        "ops_per_sec": round(len(jobs) / wall, 1),
+        "latency": summarize(concurrent),
+    }
+
+    results["delete_thread"] = summarize([timed(thread_store.delete_thread, u, t)[1] for u, t in keys])
+    return results
+
+
+# ---------- entry point ----------
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", default=",".join(SECTIONS), help="comma-separated subset of " + ", ".join(SECTIONS))
+    parser.add_argument("--books", default=os.path.join(BACKEND_DIR, "books_pdfs"), help="folder of PDFs to ingest")
+    parser.add_argument("--max-files", type=int, default=3, help="PDFs to ingest (0 = all)")
+    parser.add_argument("--requests", type=int, default=200, help="/api/chat requests to send")
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent chat clients")
+    parser.add_argument("--embed-latency", type=float, default=0.08, help="seconds per Cohere embed call")
+    parser.add_argument("--search-latency", type=float, default=0.03, help="seconds per Pinecone call")
+    parser.add_argument("--ttft", type=float, default=0.25, help="seconds to the first LLM token")
+    parser.add_argument("--tokens-per-sec", type=float, default=750, help="LLM streaming speed")
+    parser.add_argument("--answer-tokens", type=int, default=300, help="tokens per LLM answer")
+    parser.add_argument("--work-dir", help="keep benchmark files here instead of a temporary directory")
+    parser.add_argument("--output", help="write the JSON results to this file")
+    args = parser.parse_args()
+
+    sections = [s for s in args.sections.split(",") if s]
+    unknown = set(sections) - set(SECTIONS)
+    if unknown:
+        parser.error(f"unknown sections: {', '.join(sorted(unknown))}")
+    # Retrieval and chat need an ingested index to query
+    if {"retrieval", "chat"} & set(sections) and "ingest" not in sections:
+        sections.insert(0, "ingest")
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="qads-bench-")
+    os.makedirs(work_dir, exist_ok=True)
+    configure_environment(work_dir)
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "stubs": {
+            "embed_latency": args.embed_latency,
+            "search_latency": args.search_latency,
+            "ttft": args.ttft,
+            "tokens_per_sec": args.tokens_per_sec,
+            "answer_tokens": args.answer_tokens,
+        },
+    }
+
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            from benchmarks.stubs import install_stubs
+            from utils import thread_store, user_store
+            stubs = install_stubs(embed_latency=args.embed_latency, search_latency=args.search_latency,
+                                  ttft=args.ttft, tokens_per_sec=args.tokens_per_sec,
+                                  answer_tokens=args.answer_tokens)
+            user_store.init_user_store()
+            thread_store.init_thread_store()
+
+            if "ingest" in sections:
+                books = os.path.join(work_dir, "books")
+                os.makedirs(books, exist_ok=True)
+                pdfs = sorted(f for f in os.listdir(args.books) if f.lower().endswith(".pdf"))
+                for pdf in pdfs[:args.max_files or None]:
+                    link = os.path.join(books, pdf)
+                    if not os.path.exists(link):
+                        os.symlink(os.path.abspath(os.path.join(args.books, pdf)), link)
+                results["ingest"] = bench_ingest(books, work_dir, stubs)
+            queries = sample_queries()
+            if "retrieval" in sections:
+                results["retrieval"] = bench_retrieval(queries, stubs)
+            if "chat" in sections:
+                results["chat"] = bench_chat(queries, args.requests, args.concurrency)
+            if "threads" in sections:
+                results["threads"] = bench_threads()
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Local stand-ins for Cohere, Pinecone and Groq used by the benchmarks.
+
+Each stub mimics the slice of the SDK the app calls, sleeps for a configurable
+latency instead of going over the network, and is installed into the shared client
+registry (models.clients) so the app code runs unchanged:
+
+    from benchmarks.stubs import install_stubs
+    stubs = install_stubs(embed_latency=0.08, search_latency=0.03, ttft=0.25, tokens_per_sec=750)
+
+Embeddings are deterministic hashed bags of words on top of a shared component, so
+every pair of texts scores above the retriever's 0.5 threshold and texts sharing words
+score higher - enough for retrieval to return realistic, ranked match lists.
+"""
+import re
+import time
+import asyncio
+import threading
+import zlib
+from types import SimpleNamespace
+import numpy as np
+
+from config.config import EMBEDDING_DIMENSION, PINECONE_INDEX_NAME
+from models import clients
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_SHARED = np.random.default_rng(0).normal(size=EMBEDDING_DIMENSION).astype(np.float32)
+_SHARED /= np.linalg.norm(_SHARED)
+
+
+def fake_embedding(text, dimension=EMBEDDING_DIMENSION):
+    """Unit vector: 0.8 shared direction + 0.6 hashed bag of words."""
+    bag = np.zeros(dimension, dtype=np.float32)
+    for word in _WORD_RE.findall(text.lower()):
+        h = zlib.crc32(word.encode())
+        bag[h % dimension] += 1.0 if h & 0x80000000 else -1.0
+    norm = np.linalg.norm(bag)
+    vector = 0.8 * _SHARED[:dimension] + (0.6 * bag / norm if norm else 0.0)
+    return vector / np.linalg.norm(vector)
+
+
+class StubCohere:
+    """cohere.Client stand-in: embed() costs latency + per_text * len(texts) seconds."""
+
+    def __init__(self, latency=0.08, per_text=0.0005):
+        self.latency = latency
+        self.per_text = per_text
+        self.calls = 0
+        self.texts = 0
+        self._lock = threading.Lock()
+
+    def embed(self, texts, model=None, input_type=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+            self.texts += len(texts)
+        time.sleep(self.latency + self.per_text * len(texts))
+        return SimpleNamespace(embeddings=[fake_embedding(t).tolist() for t in texts])
+
+
+class StubPineconeIndex:
+    """In-memory Pinecone index handle doing exact cosine search after `latency` seconds."""
+
+    def __init__(self, latency=0.03, dimension=EMBEDDING_DIMENSION):
+        self.latency = latency
+        self.dimension = dimension
+        self._vectors = {}
+        self._matrix = None
+        self._ids = []
+        self._lock = threading.Lock()
+
+    def upsert(self, vectors):
+        time.sleep(self.latency)
+        with self._lock:
+            for v in vectors:
+                self._vectors[v["id"]] = (np.asarray(v["values"], dtype=np.float32), v.get("metadata") or {})
+            self._matrix = None
+        return {"upserted_count": len(vectors)}
+
+    def delete(self, ids):
+        time.sleep(self.latency)
+        with self._lock:
+            for vid in ids:
+                self._vectors.pop(vid, None)
+            self._matrix = None
+
+    def _snapshot(self):
+        with self._lock:
+            if self._matrix is None:
+                self._ids = list(self._vectors)
+                rows = [self._vectors[vid][0] for vid in self._ids]
+                matrix = np.asarray(rows, dtype=np.float32).reshape(-1, self.dimension)
+                norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                self._matrix = matrix / np.where(norms == 0, 1, norms)
+            return self._matrix, self._ids
+
+    def query(self, vector, top_k=5, include_metadata=True, **kwargs):
+        time.sleep(self.latency)
+        matrix, ids = self._snapshot()
+        if not len(ids):
+            return {"matches": []}
+        q = np.asarray(vector, dtype=np.float32)
+        scores = matrix @ (q / (np.linalg.norm(q) or 1.0))
+        top = np.argsort(-scores)[:top_k]
+        return {"matches": [
+            {"id": ids[i], "score": float(scores[i]),
+             "metadata": self._vectors[ids[i]][1] if include_metadata else {}}
+            for i in top
+        ]}
+
+    def describe_index_stats(self):
+        return {"total_vector_count": len(self._vectors), "dimension": self.dimension}
+
+
+class StubPinecone:
+    """Pinecone control-plane stand-in that always hands out the same index."""
+
+    def __init__(self, index):
+        self.index = index
+
+    def list_indexes(self):
+        return SimpleNamespace(names=lambda: [PINECONE_INDEX_NAME])
+
+    def create_index(self, **kwargs):
+        return None
+
+    def describe_index(self, name):
+        return SimpleNamespace(host="stub")
+
+    def Index(self, host=None, name=None):
+        return self.index
+
+
+class _StubStream:
+    def __init__(self, tokens, ttft, tokens_per_sec):
+        self._tokens = iter(tokens)
+        self._delay = ttft
+        self._interval = 1.0 / tokens_per_sec if tokens_per_sec > 0 else 0.0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        token = next(self._tokens, None)
+        if token is None:
+            raise StopAsyncIteration
+        await asyncio.sleep(self._delay)
+        self._delay = self._interval
+        return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+
+
+class StubAsyncGroq:
+    """
+    AsyncGroq stand-in: the first token arrives after `ttft` seconds and the rest
+    stream at `tokens_per_sec`. Answers are `answer_tokens` tokens long.
+    """
+
+    def __init__(self, ttft=0.25, tokens_per_sec=750, answer_tokens=300):
+        self.ttft = ttft
+        self.tokens_per_sec = tokens_per_sec
+        self.answer_tokens = answer_tokens
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self.models = SimpleNamespace(list=self._list_models)
+
+    async def _create(self, messages, model=None, stream=False, **kwargs):
+        self.calls += 1
+        words = " ".join(m["content"] for m in messages if m["role"] == "user").split() or ["answer"]
+        count = min(self.answer_tokens, kwargs.get("max_tokens") or self.answer_tokens)
+        tokens = [f"{words[i % len(words)]} " for i in range(count)]
+        if stream:
+            return _StubStream(tokens, self.ttft, self.tokens_per_sec)
+        await asyncio.sleep(self.ttft + len(tokens) / max(self.tokens_per_sec, 1e-9))
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="".join(tokens)))])
+
+    async def _list_models(self):
+        return SimpleNamespace(data=[])
+
+
+def install_stubs(embed_latency=0.08, embed_per_text=0.0005, search_latency=0.03,
+                  ttft=0.25, tokens_per_sec=750, answer_tokens=300):
+    """Registers the stubs as the shared provider clients and returns them."""
+    stubs = SimpleNamespace(
+        cohere=StubCohere(embed_latency, embed_per_text),
+        index=StubPineconeIndex(search_latency),
+        async_groq=StubAsyncGroq(ttft, tokens_per_sec, answer_tokens),
+    )
+    with clients._lock:
+        clients._clients.update({
+            "cohere": stubs.cohere,
+            "pinecone": StubPinecone(stubs.index),
+            "pinecone_index": stubs.index,
+            "async_groq": stubs.async_groq,
+        })
+    return stubs
@@ -1 +1 @@
-from .config import BOOKS_FOLDER_PATH, get_cohere_api_key, get_pinecone_api_key, PINECONE_INDEX_NAME
+from .config import BOOKS_FOLDER_PATH, get_cohere_api_key, get_pinecone_api_key, PINECONE_INDEX_NAME, VECTOR_BACKEND
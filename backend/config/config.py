@@ -38,6 +38,166 @@ def get_all_pdf_paths(folder_path):
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))  # .../q_backend
 BOOKS_FOLDER_PATH = os.path.join(BASE_DIR, "books_pdfs")
 PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "qads")
+DATA_DIR = os.path.join(BASE_DIR, "data")
+# SQLite database holding chat threads (shared by all workers)
+APP_DB_PATH = os.getenv("APP_DB_PATH", os.path.join(DATA_DIR, "qads.sqlite3"))
+# Per-file hashes and chunk IDs of everything already embedded
+INGEST_MANIFEST_PATH = os.path.join(DATA_DIR, "ingested_files.json")
+# Only the worker holding this lock ingests; the others wait for the status file to say "ready"
+INGEST_LOCK_PATH = os.path.join(DATA_DIR, "ingest.lock")
+INGEST_STATUS_PATH = os.path.join(DATA_DIR, "ingest_status.json")
+INGEST_POLL_INTERVAL = float(os.getenv("INGEST_POLL_INTERVAL", "2"))
+# Prebuilt chunks (and optionally embeddings) written by `python -m utils.corpus`
+CORPUS_DIR = os.getenv("CORPUS_DIR", os.path.join(DATA_DIR, "corpus"))
+FRONTEND_DIR = os.path.join(os.path.dirname(BASE_DIR), "frontend")
+# Fingerprinted, precompressed frontend builds written by `python -m utils.static_assets`
+STATIC_BUILD_DIR = os.getenv("STATIC_BUILD_DIR", os.path.join(DATA_DIR, "static"))
+# Superseded builds are kept this long, so pages loaded before a deploy can still fetch
+# their fingerprinted assets and workers that have not restarted keep serving their build
+STATIC_BUILD_GRACE_SECONDS = int(os.getenv("STATIC_BUILD_GRACE_SECONDS", str(7 * 24 * 3600)))
+
+# --- PDF Ingestion ---
+# Processes used to parse PDFs in parallel; 1 parses serially in-process
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(os.cpu_count() or 1, 8))))
+# Large books are split into page ranges of this size so one file can use several workers
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "100"))
+# Chunk size and overlap, in characters (CHUNK_UNIT=chars) or approximate LLM tokens (tokens)
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+CHUNK_UNIT = os.getenv("CHUNK_UNIT", "chars")
+
+# --- Embedding Pipeline ---
+# Embedding calls allowed in flight at once during ingestion
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+# Retries (with exponential backoff) after a provider rate-limit response
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+# Token-bucket limits per provider; calls_per_minute <= 0 disables limiting
+PROVIDER_RATE_LIMITS = {
+    "cohere": {
+        "calls_per_minute": float(os.getenv("COHERE_CALLS_PER_MINUTE", "100")),
+        "burst": int(os.getenv("COHERE_BURST", "5")),
+    },
+    "pinecone": {
+        "calls_per_minute": float(os.getenv("PINECONE_CALLS_PER_MINUTE", "600")),
+        "burst": int(os.getenv("PINECONE_BURST", "10")),
+    },
+}
+
+# --- Query Embedding Cache ---
+# Entries kept in each worker's in-memory LRU
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "2048"))
+# SQLite file shared by all workers; set QUERY_CACHE_DB="" to keep the cache in memory only
+QUERY_CACHE_DB = os.getenv("QUERY_CACHE_DB", os.path.join(DATA_DIR, "query_cache.sqlite3"))
+QUERY_CACHE_DISK_MAX = int(os.getenv("QUERY_CACHE_DISK_MAX", "100000"))
+
+# --- Answer Cache ---
+# Cached LLM answers per worker; 0 disables the cache
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", str(24 * 3600)))
+# Minimum cosine similarity between query embeddings to reuse an answer
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+
+# --- Provider HTTP Clients ---
+# Keep-alive connections each provider client may hold per worker
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "120"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "60"))
+
+# --- Request Concurrency ---
+# Per-worker limits on concurrent calls of each chat stage; blocking stages run in a thread pool
+STAGE_CONCURRENCY = {
+    "retrieval": int(os.getenv("RETRIEVAL_CONCURRENCY", "16")),
+    "llm": int(os.getenv("LLM_CONCURRENCY", "32")),
+    "storage": int(os.getenv("STORAGE_CONCURRENCY", "8")),
+    # bcrypt is CPU-bound; keep it to a few threads so login bursts cannot starve chat
+    "auth": int(os.getenv("AUTH_CONCURRENCY", "4")),
+}
+
+# Concurrent identical questions share one retrieval, web search and LLM generation per worker
+COALESCE_REQUESTS = os.getenv("COALESCE_REQUESTS", "true").lower() == "true"
+
+# --- Sessions ---
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(7 * 24 * 3600)))
+# Validated session tokens each worker keeps in memory
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+# Seconds a cached token is trusted before it is re-checked in SQLite, which bounds how
+# long a session logged out through another worker keeps working there
+SESSION_RECHECK_SECONDS = float(os.getenv("SESSION_RECHECK_SECONDS", "30"))
+
+# --- Vector Store ---
+# "pinecone" (remote index) or "local" (memory-mapped NumPy index on disk)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone").lower()
+EMBEDDING_DIMENSION = 1024  # Cohere embed-english-v3.0 output size
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", os.path.join(DATA_DIR, "vector_index"))
+# Number of IVF clusters for the local index; 0 keeps exact brute-force search
+LOCAL_INDEX_NLIST = int(os.getenv("LOCAL_INDEX_NLIST", "0"))
+# Number of clusters scanned per query when IVF is enabled
+LOCAL_INDEX_NPROBE = int(os.getenv("LOCAL_INDEX_NPROBE", "8"))
+
+# --- Lexical / Hybrid Retrieval ---
+# BM25 postings built from the corpus artifact
+LEXICAL_INDEX_DIR = os.getenv("LEXICAL_INDEX_DIR", os.path.join(DATA_DIR, "lexical_index"))
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+# Fraction of a query's distinct terms a chunk must contain to count as a lexical hit
+LEXICAL_MIN_MATCH = float(os.getenv("LEXICAL_MIN_MATCH", "0.5"))
+# "hybrid" fuses BM25 and vector results; "dense" or "lexical" use one of them
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+# Candidates taken from each retriever before reciprocal rank fusion
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# --- Web Search Fallback ---
+# Used when the library has no context for an in-domain question
+WEB_SEARCH_ENABLED = os.getenv("WEB_SEARCH_ENABLED", "true").lower() == "true"
+WEB_SEARCH_URL = os.getenv("WEB_SEARCH_URL", "https://serpapi.com/search.json")
+WEB_MAX_PAGES = int(os.getenv("WEB_MAX_PAGES", "2"))
+WEB_FETCH_CONCURRENCY = int(os.getenv("WEB_FETCH_CONCURRENCY", "4"))
+# Seconds for the whole search + fetch; pages still loading after this are dropped
+WEB_SEARCH_DEADLINE = float(os.getenv("WEB_SEARCH_DEADLINE", "6"))
+WEB_FETCH_TIMEOUT = float(os.getenv("WEB_FETCH_TIMEOUT", "5"))
+# Download cap per page and text kept per page
+WEB_MAX_BYTES = int(os.getenv("WEB_MAX_BYTES", str(512 * 1024)))
+WEB_PAGE_MAX_CHARS = int(os.getenv("WEB_PAGE_MAX_CHARS", "6000"))
+# Search results and extracted page text are cached per query / URL
+WEB_CACHE_TTL = int(os.getenv("WEB_CACHE_TTL", "3600"))
+WEB_CACHE_SIZE = int(os.getenv("WEB_CACHE_SIZE", "512"))
+
+# --- Domain Gate ---
+# Cosine similarity to the library's mean embedding above which a question without domain
+# keywords still counts as data science (needs a corpus artifact built with --embed)
+DOMAIN_EMBED_THRESHOLD = float(os.getenv("DOMAIN_EMBED_THRESHOLD", "0.35"))
+
+# --- Context Packing ---
+# Chunks retrieved per question before deduplication and packing
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "10"))
+# Prompt tokens the retrieved context may use
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1000"))
+# tokenizer.json path or Hugging Face repo for exact counts; empty approximates Llama 3 tokens
+CONTEXT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER", "")
+# MMR trade-off: 1.0 ranks purely by relevance, lower values favour diverse chunks
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+# Word-trigram Jaccard similarity above which two chunks count as duplicates
+CONTEXT_DUPLICATE_THRESHOLD = float(os.getenv("CONTEXT_DUPLICATE_THRESHOLD", "0.8"))
+
+# --- Thread Listing ---
+# Threads per page of GET /api/threads (clients may ask for up to THREAD_PAGE_MAX)
+THREAD_PAGE_SIZE = int(os.getenv("THREAD_PAGE_SIZE", "50"))
+THREAD_PAGE_MAX = int(os.getenv("THREAD_PAGE_MAX", "200"))
+
+# --- Conversation History ---
+# Latest turns (question + answer) sent to the LLM verbatim; older ones are folded into a summary
+HISTORY_TURNS = int(os.getenv("HISTORY_TURNS", "3"))
+# Token caps that keep the history part of the prompt constant however long a thread gets
+HISTORY_MESSAGE_TOKENS = int(os.getenv("HISTORY_MESSAGE_TOKENS", "300"))
+HISTORY_SUMMARY_TOKENS = int(os.getenv("HISTORY_SUMMARY_TOKENS", "300"))
+# Messages folded into the summary per LLM call when a long thread catches up
+SUMMARY_BATCH_MESSAGES = int(os.getenv("SUMMARY_BATCH_MESSAGES", "20"))
+
+# --- Metrics ---
+# Requests at least this many seconds long log a [TRACE] line with their per-stage timings
+# (0 logs every request). Stage histograms are always exported on /metrics.
+TRACE_LOG_THRESHOLD = float(os.getenv("TRACE_LOG_THRESHOLD", "2.0"))
 
 #  Preload all PDFs (optional)
 try:
@@ -2,16 +2,18 @@
 import os
 import sys
 import json
-import bcrypt
+import base64
+import hashlib
+import asyncio
 import threading
 import time
+import logging
 from datetime import datetime
 from typing import Optional, List
-from fastapi import FastAPI, HTTPException, Query, Response
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, HTTPException, Query, Request, Response, Header, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 
 # Add backend directory to path
@@ -19,9 +21,24 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 # Local imports
 from config import config
-from utils.pdf_processor import load_and_chunk_pdfs
-from models.embeddings import get_clients, setup_vector_store, retrieve_context
-from models.llm import get_groq_client, generate_llm_response
+from models.embeddings import get_clients, setup_vector_store, retrieve_hybrid
+from models.lexical_index import build_lexical_index, load_lexical_index, get_lexical_index
+from models.context_builder import pack_context
+from models.domain_gate import is_data_science_query
+from models.answer_cache import get_answer_cache
+from models.vector_store import get_vector_store
+from models.clients import get_client, warmup_clients, close_clients
+from models.query_cache import normalize_query
+from models.conversation import load_history, refresh_summary
+from models.llm import get_async_groq_client, agenerate_llm_response
+from utils.concurrency import run_in_stage, stage_limiter
+from utils.metrics import (
+    start_trace, finish_trace, timed_stage, observe_stage, record_cache, record_coalesced, set_ingest_state, render_metrics
+)
+from utils.single_flight import SingleFlight
+from utils import thread_store, user_store, ingest_coordinator, static_assets
+from utils.corpus import ensure_corpus, get_corpus
+from utils.scraper import aperform_web_search
 
 # ------------------ Setup ------------------
 BOOKS_FOLDER_PATH = config.BOOKS_FOLDER_PATH
@@ -32,52 +49,76 @@ os.makedirs(DATA_DIR, exist_ok=True)
 USERS_FILE = os.path.join(DATA_DIR, "users.json")
 HISTORY_DIR = os.path.join(DATA_DIR, "history")
 os.makedirs(HISTORY_DIR, exist_ok=True)
-THREADS_FILE_TMPL = os.path.join(HISTORY_DIR, "threads_{username}.json")
+
+# Users and threads live in SQLite; legacy users.json / threads_<user>.json files are imported once
+user_store.init_user_store()
+user_store.migrate_users_json(USERS_FILE)
+thread_store.init_thread_store()
+thread_store.migrate_json_history(HISTORY_DIR)
 
 app = FastAPI(title="QADS Chatbot API", version="2.0")
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-FRONTEND_DIR = os.path.join(BASE_DIR, "../frontend")
+# Fingerprinted, precompressed pages and assets; built at image build time (see Dockerfile)
+STATIC_ASSETS = static_assets.ensure_static_assets()
 
 # ------------------ Frontend Routes ------------------
 
+def static_response(request: Request, path: str):
+    """
+    Serves a file of the static build: the brotli or gzip variant the client accepts,
+    an ETag per variant, and a year of caching for fingerprinted names.
+    """
+    entry = STATIC_ASSETS.lookup(path)
+    if entry is None:
+        raise HTTPException(status_code=404)
+    file_path, encoding = STATIC_ASSETS.select(entry, request.headers.get("accept-encoding"))
+    etag = f'"{entry["etag"]}-{encoding}"' if encoding else f'"{entry["etag"]}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": static_assets.IMMUTABLE if entry["immutable"] else static_assets.REVALIDATE,
+        "Vary": "Accept-Encoding",
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return FileResponse(file_path, media_type=entry["type"], headers=headers)
+
 @app.get("/")
-def serve_index():
-    return FileResponse(os.path.join(FRONTEND_DIR, "index.html"))
+async def serve_index(request: Request):
+    return static_response(request, "index.html")
 
 @app.head("/")
 def head_index():
     return Response(status_code=200)
 
 @app.get("/index.html")
-def serve_index_alias():
-    return FileResponse(os.path.join(FRONTEND_DIR, "index.html"))
+async def serve_index_alias(request: Request):
+    return static_response(request, "index.html")
 
 @app.get("/chat.html")
-def serve_chat():
-    return FileResponse(os.path.join(FRONTEND_DIR, "chat.html"))
+async def serve_chat(request: Request):
+    return static_response(request, "chat.html")
 
 @app.get("/login.html")
-def serve_login():
-    return FileResponse(os.path.join(FRONTEND_DIR, "login.html"))
+async def serve_login(request: Request):
+    return static_response(request, "login.html")
 
 @app.get("/instruction.html")
-def serve_instruction():
-    return FileResponse(os.path.join(FRONTEND_DIR, "instruction.html"))
+async def serve_instruction(request: Request):
+    return static_response(request, "instruction.html")
 
-# Serve static exactly as frontend expects: /static/js/*, /static/css/*
-if os.path.exists(FRONTEND_DIR):
-    app.mount("/static", StaticFiles(directory=FRONTEND_DIR), name="static")
+# Served exactly as the frontend expects: /static/js/*, /static/css/*, plus fingerprinted names
+@app.api_route("/static/{path:path}", methods=["GET", "HEAD"])
+async def serve_static(request: Request, path: str):
+    return static_response(request, path)
 
 # Favicon (supports both .ico and .svg)
 @app.get("/favicon.ico")
-def favicon():
-    ico = os.path.join(FRONTEND_DIR, "favicon.ico")
-    svg = os.path.join(FRONTEND_DIR, "favicon.svg")
-    if os.path.exists(ico):
-        return FileResponse(ico)
-    if os.path.exists(svg):
-        return FileResponse(svg)
+async def favicon(request: Request):
+    for name in ("favicon.ico", "favicon.svg"):
+        if STATIC_ASSETS.lookup(name):
+            return static_response(request, name)
     raise HTTPException(status_code=404)
 
 # ------------------ Middleware ------------------
@@ -91,31 +132,61 @@ app.add_middleware(
 
 # ------------------ Vector Store (load ONCE) ------------------
 
+# True once this run's ingestion has finished; one worker ingests, the rest wait for it
 VECTOR_READY = False
 
+def ensure_lexical_index(corpus):
+    if corpus is not None and load_lexical_index(corpus) is None:
+        build_lexical_index(corpus)
+
+def ingest_vector_store():
+    # The corpus artifact is rebuilt while its chunks stream into the vector store; BM25
+    # postings need no network, so lexical retrieval works before embedding finishes
+    print(f"[LOG] Syncing vector store with PDFs in {BOOKS_FOLDER_PATH} (startup only)...")
+    try:
+        cohere_client, _ = get_clients()
+        setup_vector_store(BOOKS_FOLDER_PATH, cohere_client, on_corpus=ensure_lexical_index)
+    except Exception:
+        # Without the vector store, lexical retrieval still needs an up-to-date corpus
+        ensure_lexical_index(ensure_corpus(BOOKS_FOLDER_PATH))
+        raise
+
 def background_ingest_once():
     global VECTOR_READY
     try:
-        print(f"[LOG] Ingesting PDFs from {BOOKS_FOLDER_PATH} (startup only)...")
-        chunks = load_and_chunk_pdfs(BOOKS_FOLDER_PATH)
-        print(f"[LOG] Generated {len(chunks)} chunks. Setting up vector store...")
-        cohere_client, pinecone_client = get_clients()
-        setup_vector_store(chunks, cohere_client, pinecone_client)
-        VECTOR_READY = True
-        print("[LOG] Vector store ready ✅")
+        state = ingest_coordinator.run_ingest_once(ingest_vector_store)
     except Exception as e:
         print(f"[WARNING] Vector store setup failed: {e}")
+        state = "failed"
+
+    if state == "ready":
+        VECTOR_READY = True
+        print("[LOG] Vector store ready ✅")
+    else:
         VECTOR_READY = False
+        print("[WARNING] Vector store unavailable; answering without book context")
 
 @app.on_event("startup")
-def startup_event():
+async def startup_event():
     threading.Thread(target=background_ingest_once, daemon=True).start()
+    asyncio.create_task(warmup_clients())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await close_clients()
 
 # ------------------ Health ------------------
 
 @app.get("/health")
 async def health_check():
-    return {"status": "ok", "vector_ready": VECTOR_READY}
+    return {"status": "ok", "vector_ready": VECTOR_READY, "ingest_state": ingest_coordinator.current_state()}
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint: stage latency histograms, cache lookups and ingestion progress."""
+    set_ingest_state(ingest_coordinator.current_state())
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
 
 # ==================== MODELS ====================
 
@@ -125,7 +196,8 @@ class ThreadCreate(BaseModel):
 
 class ThreadSync(BaseModel):
     username: str
-    messages: List[dict]
+    base_seq: int = Field(0, ge=0)  # messages the client already holds from the server
+    messages: List[dict] = []  # the client's messages after base_seq
 
 class User(BaseModel):
     username: str
@@ -136,165 +208,429 @@ class ChatMessage(BaseModel):
     query: str
     thread_id: Optional[str] = None
 
-# ==================== HELPERS ====================
-
-def get_threads_path(username):
-    return THREADS_FILE_TMPL.format(username=username)
-
-def load_threads(username):
-    path = get_threads_path(username)
-    if not os.path.exists(path):
-        return {}
-    try:
-        with open(path, "r") as f:
-            return json.load(f)
-    except Exception:
-        return {}
-
-def save_threads(username, threads):
-    path = get_threads_path(username)
-    with open(path, "w") as f:
-        json.dump(threads, f, indent=4)
-
 # ==================== AUTH ====================
 
+# bcrypt runs in the small "auth" stage pool so hashing never blocks the event loop.
+
+def bearer_token(authorization):
+    if authorization and authorization.lower().startswith("bearer "):
+        return authorization[7:].strip()
+    return None
+
+async def session_username(authorization: Optional[str] = Header(None)):
+    """Resolves the Bearer token to its user; repeat tokens are answered from memory."""
+    token = bearer_token(authorization)
+    if not token:
+        raise HTTPException(status_code=401, detail="Missing session token")
+    username = user_store.cached_session_user(token)
+    record_cache("session", username is not None)
+    if username is None:
+        username = await run_in_stage("storage", user_store.session_user, token)
+    if username is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired session")
+    return username
+
+def check_user(session_user, username):
+    if session_user != username:
+        raise HTTPException(status_code=403, detail="Session does not belong to this user")
+
 @app.post("/register")
 async def register(user: User):
-    users = {}
-    if os.path.exists(USERS_FILE):
-        with open(USERS_FILE, "r") as f:
-            users = json.load(f)
-
-    if user.username in users:
+    try:
+        await run_in_stage("auth", user_store.create_user, user.username, user.password)
+    except user_store.UserExistsError:
         raise HTTPException(status_code=409, detail="User already exists")
 
-    hashed_password = bcrypt.hashpw(user.password.encode(), bcrypt.gensalt()).decode()
-    users[user.username] = {"password": hashed_password, "created_at": str(datetime.now())}
-
-    with open(USERS_FILE, "w") as f:
-        json.dump(users, f, indent=4)
-
-    return {"ok": True, "username": user.username}
+    token = await run_in_stage("storage", user_store.create_session, user.username)
+    return {"ok": True, "username": user.username, "token": token}
 
 @app.post("/login")
 async def login(user: User):
-    if not os.path.exists(USERS_FILE):
+    if not await run_in_stage("auth", user_store.verify_user, user.username, user.password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    with open(USERS_FILE, "r") as f:
-        users = json.load(f)
+    token = await run_in_stage("storage", user_store.create_session, user.username)
+    return {"ok": True, "username": user.username, "token": token}
 
-    if user.username not in users:
-        raise HTTPException(status_code=401, detail="Invalid credentials")
-
-    if not bcrypt.checkpw(user.password.encode(), users[user.username]["password"].encode()):
-        raise HTTPException(status_code=401, detail="Invalid credentials")
-
-    return {"ok": True, "username": user.username, "token": user.username}
+@app.post("/logout")
+async def logout(authorization: Optional[str] = Header(None)):
+    token = bearer_token(authorization)
+    if token:
+        await run_in_stage("storage", user_store.delete_session, token)
+    return {"ok": True}
 
 # ==================== CHAT (FAST PATH) ====================
 
+FALLBACK_RESPONSE = "The AI service is currently slow. Please try again in a few seconds."
+OUT_OF_DOMAIN_RESPONSE = "Sorry, I am built to answer only data science questions."
+LIBRARY_SOURCE = "Source: Data Science Library"
+WEB_SOURCE = "Source: Web Search"
+
+def retrieve_for_query(query):
+    """
+    Returns (context, query_embedding, chunk_ids). Uses hybrid BM25 + vector retrieval,
+    BM25 alone while the vector store is not ready, and nothing if neither is available.
+    """
+    lexical_index = get_lexical_index()
+    if not VECTOR_READY and lexical_index is None:
+        return "", None, []
+    try:
+        cohere_client, index = None, None
+        if VECTOR_READY:
+            cohere_client, _ = get_clients()
+            index = get_vector_store()
+        query_embedding, matches = retrieve_hybrid(
+            query, cohere_client, index, lexical_index, n_results=config.CONTEXT_CANDIDATES
+        )
+        # Vector matches clear a similarity threshold; BM25 hits only share words with the
+        # question ("best model of car"), so context made of them alone must pass the domain gate
+        if matches and all(match.get("lexical") for match in matches) \
+                and not is_data_science_query(query, query_embedding):
+            return "", query_embedding, []
+        with timed_stage("context_assembly"):
+            context, used = pack_context(matches)
+        return context, query_embedding, [match["id"] for match in used]
+    except Exception as e:
+        print(f"[WARNING] Vector retrieval failed: {e}")
+        return "", None, []
+
+# Identical questions asked at the same time share one retrieval, web search and LLM
+# generation in this worker; every request still gets its own thread entry.
+_inflight = SingleFlight(on_coalesced=lambda key, seconds: record_coalesced(key[0], seconds))
+
+async def coalesce(key, fn, *args):
+    if not config.COALESCE_REQUESTS:
+        return await fn(*args)
+    return await _inflight.call(key, fn, *args)
+
+async def retrieve(query):
+    """retrieve_for_query in the retrieval stage, shared by concurrent identical questions."""
+    return await coalesce(
+        ("retrieval", normalize_query(query), VECTOR_READY), run_in_stage, "retrieval", retrieve_for_query, query
+    )
+
+async def thread_history(username, thread_id):
+    """Summary and latest turns of an existing thread, so follow-up questions keep their context."""
+    if not thread_id:
+        return []
+    with timed_stage("history"):
+        return await run_in_stage("storage", load_history, username, thread_id)
+
+async def gather_inputs(message):
+    """Retrieval and the thread's history, loaded concurrently. Returns (context, embedding, chunk_ids, history)."""
+    (context, query_embedding, chunk_ids), history = await asyncio.gather(
+        retrieve(message.query), thread_history(message.username, message.thread_id)
+    )
+    return context, query_embedding, chunk_ids, history
+
+_background_tasks = set()
+
+def schedule_summary_refresh(username, thread_id):
+    """Updates the thread's rolling summary after the response, once per thread at a time."""
+    task = asyncio.ensure_future(coalesce(("summary", username, thread_id), refresh_summary, username, thread_id))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+def library_fingerprint():
+    """Identifies the published corpus build; cached answers are only reused within one build."""
+    corpus = get_corpus()
+    return corpus.fingerprint if corpus is not None else None
+
+def immediate_answer(query, context, query_embedding, chunk_ids, history=()):
+    """
+    Answers that need no LLM call: a cached answer for the same question and context, or
+    the refusal for an off-topic question the library has nothing on. None otherwise.
+    Follow-ups in an ongoing thread always reach the LLM, since they depend on the conversation.
+    """
+    if history:
+        return None
+    if query_embedding is not None:
+        response = get_answer_cache().get(query_embedding, chunk_ids, library_fingerprint())
+        record_cache("answer", response is not None)
+        if response is not None:
+            return response
+    if not context and not is_data_science_query(query, query_embedding):
+        return OUT_OF_DOMAIN_RESPONSE
+    return None
+
+async def web_context(query):
+    """Fallback context for an in-domain question the library has nothing on."""
+    if not config.WEB_SEARCH_ENABLED:
+        return ""
+    with timed_stage("web_search"):
+        return await coalesce(("web_search", normalize_query(query)), aperform_web_search, query, get_client("web"))
+
+async def answer_context(query, context):
+    """Returns (context, source note): the library context, or web results when it is empty."""
+    if context:
+        return context, LIBRARY_SOURCE
+    return await web_context(query), WEB_SOURCE
+
+def cache_answer(query_embedding, chunk_ids, response):
+    if response and query_embedding is not None and not response.startswith("Error generating response"):
+        get_answer_cache().put(query_embedding, chunk_ids, response, library_fingerprint())
+
+def answer_outcome(response, source_note):
+    """Label for how a request was answered, used by the requests counter."""
+    if response == FALLBACK_RESPONSE:
+        return "fallback"
+    if response == OUT_OF_DOMAIN_RESPONSE:
+        return "out_of_domain"
+    if source_note is None:
+        return "cached"
+    return "web" if source_note == WEB_SOURCE else "library"
+
+# Slow-request traces go through logging, so they reach gunicorn's error log from every worker
+trace_logger = logging.getLogger("qads.trace")
+
+def log_trace(outcome):
+    line = finish_trace(outcome)
+    if line:
+        trace_logger.warning(f"[TRACE] {line}")
+
+async def persist_turn(username, thread_id, query, response):
+    with timed_stage("persistence"):
+        await run_in_stage(
+            "storage",
+            thread_store.append_messages,
+            username,
+            thread_id,
+            [
+                {"role": "user", "content": query, "ts": str(datetime.now())},
+                {"role": "assistant", "content": response, "ts": str(datetime.now())}
+            ],
+            title=query[:30]
+        )
+
+async def stream_answer(query, context, source_note=LIBRARY_SOURCE, history=()):
+    """
+    Yields LLM tokens from AsyncGroq, holding an LLM-stage slot for the whole generation.
+    Records the wait for a slot, time to first token and total generation time.
+    """
+    queued = time.perf_counter()
+    async with stage_limiter("llm"):
+        start = time.perf_counter()
+        observe_stage("llm_queue", start - queued)
+        first_token = True
+        try:
+            async for token in agenerate_llm_response(
+                list(history) + [{"role": "user", "content": query}],
+                context,
+                get_async_groq_client(),
+                source_note=source_note
+            ):
+                if token:
+                    if first_token:
+                        observe_stage("llm_ttft", time.perf_counter() - start)
+                        first_token = False
+                    yield token
+        finally:
+            observe_stage("llm_total", time.perf_counter() - start)
+
+async def generate_answer(query, context, source_note, query_embedding, chunk_ids, history):
+    """One LLM generation; the finished answer is cached once, however many requests share it."""
+    parts = []
+    async for token in stream_answer(query, context, source_note, history):
+        parts.append(token)
+        yield token
+    if not history:
+        cache_answer(query_embedding, chunk_ids, "".join(parts).strip())
+
+def answer_stream(query, context, source_note, query_embedding, chunk_ids, history=()):
+    """
+    Token stream for a question, joining an identical generation (same question, context
+    and conversation history) in flight.
+    """
+    args = (query, context, source_note, query_embedding, chunk_ids, history)
+    if not config.COALESCE_REQUESTS:
+        return generate_answer(*args)
+    fingerprint = hashlib.sha1(json.dumps([context, history]).encode()).hexdigest()
+    key = ("llm", normalize_query(query), fingerprint, source_note)
+    return _inflight.stream(key, generate_answer, *args)
+
 @app.post("/api/chat")
 @app.post("/chat")
-async def chat_endpoint(message: ChatMessage):
-    context = ""
-
-    # Fast, non-blocking retrieval (skip if vector not ready)
-    if VECTOR_READY:
+async def chat_endpoint(message: ChatMessage, session_user: str = Depends(session_username)):
+    check_user(session_user, message.username)
+    start_trace("chat")
+    context, query_embedding, chunk_ids, history = await gather_inputs(message)
+
+    source_note = None
+    response = immediate_answer(message.query, context, query_embedding, chunk_ids, history)
+    if response is None:
         try:
-            start = time.time()
-            cohere_client, pinecone_client = get_clients()
-            index = pinecone_client.Index(config.PINECONE_INDEX_NAME)
-            ctx_list = retrieve_context(message.query, cohere_client, index)
-            context = "\n\n".join(ctx_list) if ctx_list else ""
-            print(f"[LOG] Context retrieval took {time.time() - start:.2f}s")
+            context, source_note = await answer_context(message.query, context)
+            tokens = answer_stream(message.query, context, source_note, query_embedding, chunk_ids, history)
+            response = "".join([token async for token in tokens]).strip()
         except Exception as e:
-            print(f"[WARNING] Vector retrieval failed: {e}")
-            context = ""
-
-    groq_client = get_groq_client()
-    try:
-        chunks = list(generate_llm_response(
-            [{"role": "user", "content": message.query}],
-            context,
-            groq_client
-        ))
-        response = "".join(chunks).strip()
-    except Exception as e:
-        print(f"[ERROR] LLM failed: {e}")
-        response = ""
+            print(f"[ERROR] LLM failed: {e}")
+            response = ""
 
     if not response:
-        response = "The AI service is currently slow. Please try again in a few seconds."
+        response = FALLBACK_RESPONSE
 
-    threads = load_threads(message.username)
     thread_id = message.thread_id or f"thread_{int(datetime.now().timestamp())}"
-
-    threads.setdefault(thread_id, {
-        "id": thread_id,
-        "title": message.query[:30],
-        "created_at": str(datetime.now()),
-        "updated_at": str(datetime.now()),
-        "messages": []
-    })
-
-    threads[thread_id]["messages"].extend([
-        {"role": "user", "content": message.query, "ts": str(datetime.now())},
-        {"role": "assistant", "content": response, "ts": str(datetime.now())}
-    ])
-    threads[thread_id]["updated_at"] = str(datetime.now())
-    save_threads(message.username, threads)
+    await persist_turn(message.username, thread_id, message.query, response)
+    log_trace(answer_outcome(response, source_note))
+    schedule_summary_refresh(message.username, thread_id)
 
     return {"ok": True, "response": response, "thread_id": thread_id}
 
+@app.post("/api/chat/stream")
+async def chat_stream_endpoint(message: ChatMessage, session_user: str = Depends(session_username)):
+    """
+    Streams the answer as NDJSON events while the LLM generates it:
+    {"type": "meta", "thread_id"}, then {"type": "token", "content"} per token and
+    finally {"type": "done", "response", "thread_id", "ts"} once the thread is saved.
+    """
+    check_user(session_user, message.username)
+    thread_id = message.thread_id or f"thread_{int(datetime.now().timestamp())}"
+
+    async def events():
+        yield json.dumps({"type": "meta", "thread_id": thread_id}) + "\n"
+
+        start_trace("chat_stream")
+        source_note = None
+        context, query_embedding, chunk_ids, history = await gather_inputs(message)
+        response = immediate_answer(message.query, context, query_embedding, chunk_ids, history)
+        if response is not None:
+            yield json.dumps({"type": "token", "content": response}) + "\n"
+
+        if response is None:
+            parts = []
+            try:
+                context, source_note = await answer_context(message.query, context)
+                tokens = answer_stream(message.query, context, source_note, query_embedding, chunk_ids, history)
+                async for token in tokens:
+                    parts.append(token)
+                    yield json.dumps({"type": "token", "content": token}) + "\n"
+                response = "".join(parts).strip()
+            except Exception as e:
+                print(f"[ERROR] LLM failed: {e}")
+                response = "".join(parts).strip()
+
+        if not response:
+            response = FALLBACK_RESPONSE
+            yield json.dumps({"type": "token", "content": response}) + "\n"
+
+        await persist_turn(message.username, thread_id, message.query, response)
+        log_trace(answer_outcome(response, source_note))
+        schedule_summary_refresh(message.username, thread_id)
+        yield json.dumps({
+            "type": "done",
+            "response": response,
+            "thread_id": thread_id,
+            "ts": datetime.now().isoformat()
+        }) + "\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # ==================== THREADS ====================
+# Store calls run in the storage stage's thread pool; SQLite serializes writers across workers.
+
+# Listing and fetch responses carry an ETag derived from thread metadata only (updated_at
+# changes on every write), so an unchanged list or thread is answered with a 304.
+
+THREAD_META_FIELDS = ("id", "title", "created_at", "updated_at", "message_count")
+
+def make_etag(value):
+    return '"' + hashlib.sha1(json.dumps(value, sort_keys=True).encode()).hexdigest()[:20] + '"'
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+def not_modified(request, etag):
+    """A 304 response if the client already holds this version, otherwise None."""
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+    return None
+
+def conditional_json(request, etag, payload):
+    return not_modified(request, etag) or JSONResponse(
+        payload, headers={"ETag": etag, "Cache-Control": "private, no-cache"}
+    )
+
+def encode_cursor(after):
+    return base64.urlsafe_b64encode(json.dumps(after).encode()).decode().rstrip("=") if after else None
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        updated_at, thread_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return str(updated_at), str(thread_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 @app.get("/api/threads")
-async def list_threads(username: str = Query(...)):
-    return {"ok": True, "threads": list(load_threads(username).values())}
+async def list_threads(
+    request: Request,
+    username: str = Query(...),
+    limit: int = Query(config.THREAD_PAGE_SIZE, ge=1, le=config.THREAD_PAGE_MAX),
+    cursor: Optional[str] = Query(None),
+    session_user: str = Depends(session_username),
+):
+    """
+    One page of the user's threads, most recently updated first, as metadata only
+    (id, title, timestamps, message_count). Pass next_cursor back as `cursor` for the next page.
+    """
+    check_user(session_user, username)
+    threads, after = await run_in_stage("storage", thread_store.list_thread_page, username, limit, decode_cursor(cursor))
+    payload = {"ok": True, "threads": threads, "next_cursor": encode_cursor(after)}
+    return conditional_json(request, make_etag(payload), payload)
 
 @app.get("/api/threads/{thread_id}")
-async def get_thread(thread_id: str, username: str = Query(...)):
-    threads = load_threads(username)
-    if thread_id not in threads:
+async def get_thread(request: Request, thread_id: str, username: str = Query(...),
+                     session_user: str = Depends(session_username)):
+    check_user(session_user, username)
+    meta = await run_in_stage("storage", thread_store.get_thread_meta, username, thread_id)
+    if meta is None:
         raise HTTPException(status_code=404, detail="Thread not found")
-    return {"ok": True, "thread": threads[thread_id]}
+    unchanged = not_modified(request, make_etag(meta))
+    if unchanged:
+        return unchanged
+
+    thread = await run_in_stage("storage", thread_store.get_thread, username, thread_id)
+    if thread is None:
+        raise HTTPException(status_code=404, detail="Thread not found")
+    # Tagged with the metadata of what was actually read, in case the thread changed in between
+    etag = make_etag({field: thread[field] for field in THREAD_META_FIELDS})
+    return conditional_json(request, etag, {"ok": True, "thread": thread})
 
 @app.post("/api/threads")
-async def create_thread_api(payload: ThreadCreate):
-    threads = load_threads(payload.username)
+async def create_thread_api(payload: ThreadCreate, session_user: str = Depends(session_username)):
+    check_user(session_user, payload.username)
     tid = f"thread_{int(datetime.now().timestamp())}"
-    threads[tid] = {
-        "id": tid,
-        "title": payload.title or "New Chat",
-        "created_at": str(datetime.now()),
-        "updated_at": str(datetime.now()),
-        "messages": []
-    }
-    save_threads(payload.username, threads)
-    return {"ok": True, "thread": threads[tid]}
+    thread = await run_in_stage("storage", thread_store.create_thread, payload.username, tid, payload.title or "New Chat")
+    return {"ok": True, "thread": thread}
 
 @app.post("/api/threads/{thread_id}/sync")
-async def sync_thread(thread_id: str, payload: ThreadSync, username: str = Query(...)):
-    threads = load_threads(username)
-    threads.setdefault(thread_id, {
-        "id": thread_id,
-        "title": "Synced Chat",
-        "created_at": str(datetime.now()),
-        "updated_at": str(datetime.now()),
-        "messages": []
-    })
-    threads[thread_id]["messages"] = payload.messages
-    threads[thread_id]["updated_at"] = str(datetime.now())
-    save_threads(username, threads)
-    return {"ok": True, "thread": threads[thread_id]}
+async def sync_thread(thread_id: str, payload: ThreadSync, username: str = Query(...), session_user: str = Depends(session_username)):
+    """
+    Delta sync: appends the client's messages after base_seq that the server lacks and
+    returns the thread's messages from base_seq on with the new sequence number. 409 when
+    the client's base_seq is ahead of the server; the client then resyncs from 0.
+    """
+    check_user(session_user, username)
+    result = await run_in_stage(
+        "storage", thread_store.sync_messages, username, thread_id, payload.base_seq, payload.messages
+    )
+    if result is None:
+        raise HTTPException(status_code=409, detail="base_seq is ahead of the server's thread")
+    return {"ok": True, **result}
 
 @app.delete("/api/threads/{thread_id}")
-async def delete_thread_api(thread_id: str, username: str = Query(...)):
-    threads = load_threads(username)
-    if thread_id in threads:
-        del threads[thread_id]
-        save_threads(username, threads)
+async def delete_thread_api(thread_id: str, username: str = Query(...), session_user: str = Depends(session_username)):
+    check_user(session_user, username)
+    deleted = await run_in_stage("storage", thread_store.delete_thread, username, thread_id)
+    if deleted:
         return {"ok": True}
     raise HTTPException(status_code=404, detail="Thread not found")
 
@@ -0,0 +1,110 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+
+from config.config import ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+
+class AnswerCache:
+    """
+    Semantic cache of LLM answers.
+
+    Entries are grouped by the set of retrieved chunk IDs and the fingerprint of the
+    library they came from, so a cached answer is only reused when the new query retrieved
+    exactly the same context from the same build and its embedding is at least `threshold`
+    cosine-similar to the cached query. After a re-ingest the fingerprint changes and old
+    entries simply stop matching, in every worker. Entries expire after `ttl`
+    seconds and the least recently used ones are evicted beyond `capacity`.
+    """
+
+    def __init__(self, capacity=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL, threshold=ANSWER_CACHE_THRESHOLD):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries = OrderedDict()  # entry id -> (context key, unit embedding, response, expires at)
+        self._by_context = {}          # context key -> set of entry ids
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _context_key(chunk_ids, fingerprint):
+        return fingerprint, tuple(sorted(chunk_ids))
+
+    @staticmethod
+    def _unit(embedding):
+        v = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def _remove(self, entry_id):
+        context_key = self._entries.pop(entry_id)[0]
+        ids = self._by_context.get(context_key)
+        if ids is not None:
+            ids.discard(entry_id)
+            if not ids:
+                del self._by_context[context_key]
+
+    def get(self, embedding, chunk_ids, fingerprint=None):
+        """Returns a cached response for a similar query over the same context, or None."""
+        if self.capacity <= 0:
+            return None
+        q = self._unit(embedding)
+        now = time.time()
+
+        with self._lock:
+            best_id, best_score = None, self.threshold
+            for entry_id in list(self._by_context.get(self._context_key(chunk_ids, fingerprint), ())):
+                _, cached, _, expires = self._entries[entry_id]
+                if expires < now:
+                    self._remove(entry_id)
+                    continue
+                score = float(cached @ q)
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return self._entries[best_id][2]
+
+    def put(self, embedding, chunk_ids, response, fingerprint=None):
+        if self.capacity <= 0:
+            return
+        context_key = self._context_key(chunk_ids, fingerprint)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (context_key, self._unit(embedding), response, time.time() + self.ttl)
+            self._by_context.setdefault(context_key, set()).add(entry_id)
+            while len(self._entries) > self.capacity:
+                self._remove(next(iter(self._entries)))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+
+_answer_cache = None
+
+
+def get_answer_cache():
+    """Returns the process-wide answer cache."""
+    global _answer_cache
+    if _answer_cache is None:
+        _answer_cache = AnswerCache()
+    return _answer_cache
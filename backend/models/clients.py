@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import threading
+import httpx
+import cohere
+from groq import AsyncGroq
+from pinecone import Pinecone
+
+from config.config import (
+    get_cohere_api_key,
+    get_groq_api_key,
+    get_pinecone_api_key,
+    VECTOR_BACKEND,
+    PINECONE_INDEX_NAME,
+    HTTP_POOL_SIZE,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_TIMEOUT,
+    WEB_FETCH_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+# Provider clients are created once per worker process and shared by every request,
+# so each turn reuses warm keep-alive connections instead of new TLS handshakes.
+_clients = {}
+_http_pools = []
+_lock = threading.Lock()
+
+
+def _http_pool(pool_cls=httpx.Client, timeout=HTTP_TIMEOUT, **kwargs):
+    """Keep-alive connection pool handed to an SDK client; tracked so shutdown can close it."""
+    pool = pool_cls(
+        limits=httpx.Limits(
+            max_connections=HTTP_POOL_SIZE,
+            max_keepalive_connections=HTTP_POOL_SIZE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=timeout,
+        **kwargs,
+    )
+    _http_pools.append(pool)
+    return pool
+
+
+def _build_cohere():
+    cohere_api_key = get_cohere_api_key()
+    if not cohere_api_key:
+        raise RuntimeError("Cohere API key not found. Set COHERE_API_KEY in env or config.")
+    return cohere.Client(api_key=cohere_api_key, timeout=HTTP_TIMEOUT, httpx_client=_http_pool())
+
+
+def _build_pinecone():
+    pinecone_api_key = get_pinecone_api_key()
+    if not pinecone_api_key:
+        raise RuntimeError("Pinecone API key not found. Set PINECONE_API_KEY in env or config.")
+    return Pinecone(api_key=pinecone_api_key)
+
+
+def _build_async_groq():
+    groq_api_key = get_groq_api_key()
+    if not groq_api_key:
+        raise RuntimeError("Groq API key not found. Set it in your environment/config.")
+    return AsyncGroq(api_key=groq_api_key, http_client=_http_pool(httpx.AsyncClient))
+
+
+def _build_web():
+    # Plain async HTTP client for web-search fallback fetches
+    return _http_pool(
+        httpx.AsyncClient,
+        timeout=WEB_FETCH_TIMEOUT,
+        follow_redirects=True,
+        headers={"User-Agent": "Mozilla/5.0 (compatible; QADS-Chatbot)"},
+    )
+
+
+_BUILDERS = {
+    "cohere": _build_cohere,
+    "pinecone": _build_pinecone,
+    "async_groq": _build_async_groq,
+    "web": _build_web,
+}
+
+
+def get_client(name):
+    """Returns the shared client for a provider, creating it on first use."""
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = _BUILDERS[name]()
+    return client
+
+
+def get_pinecone_index():
+    """
+    Returns the shared Pinecone index handle. The index host is resolved once,
+    so later requests go straight to the data plane.
+    """
+    index = _clients.get("pinecone_index")
+    if index is None:
+        pinecone_client = get_client("pinecone")
+        with _lock:
+            index = _clients.get("pinecone_index")
+            if index is None:
+                host = pinecone_client.describe_index(PINECONE_INDEX_NAME).host
+                index = _clients["pinecone_index"] = pinecone_client.Index(host=host)
+    return index
+
+
+async def warmup_clients():
+    """
+    Creates every client and opens connections ahead of the first request:
+    resolves the Pinecone index host and makes a cheap call to Groq and Pinecone.
+    Failures are logged and left for the request path to surface.
+    """
+    try:
+        get_client("cohere")
+        if VECTOR_BACKEND == "pinecone":
+            await asyncio.to_thread(lambda: get_pinecone_index().describe_index_stats())
+        await get_client("async_groq").models.list()
+        print("[LOG] Provider clients warmed up")
+    except Exception as e:
+        print(f"[WARNING] Client warmup failed: {e}")
+
+
+async def close_clients():
+    """Closes pooled connections on shutdown."""
+    with _lock:
+        pools = list(_http_pools)
+        _http_pools.clear()
+        _clients.clear()
+
+    for pool in pools:
+        try:
+            if isinstance(pool, httpx.AsyncClient):
+                await pool.aclose()
+            else:
+                pool.close()
+        except Exception as e:
+            logger.warning(f"Failed to close HTTP pool: {e}")
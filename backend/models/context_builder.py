@@ -0,0 +1,219 @@
+import os
+import re
+import logging
+
+from config.config import CONTEXT_TOKEN_BUDGET, CONTEXT_TOKENIZER, CONTEXT_MMR_LAMBDA, CONTEXT_DUPLICATE_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+# ---------- token counting ----------
+
+# Approximates Llama 3's BPE pre-tokenization: words, 1-3 digit groups, punctuation runs, newlines
+_PIECE_RE = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]+|\n+")
+_WORD_PIECE = 8  # letters per token for long, rare words
+
+_tokenizer = None
+_tokenizer_loaded = False
+
+
+def get_tokenizer():
+    """
+    Returns a Hugging Face `tokenizers` tokenizer when CONTEXT_TOKENIZER names a
+    tokenizer.json file or hub repo, otherwise None (the built-in approximation is used).
+    """
+    global _tokenizer, _tokenizer_loaded
+    if not _tokenizer_loaded:
+        _tokenizer_loaded = True
+        if CONTEXT_TOKENIZER:
+            try:
+                from tokenizers import Tokenizer
+                if os.path.exists(CONTEXT_TOKENIZER):
+                    _tokenizer = Tokenizer.from_file(CONTEXT_TOKENIZER)
+                else:
+                    _tokenizer = Tokenizer.from_pretrained(CONTEXT_TOKENIZER)
+            except Exception as e:
+                logger.warning(f"Could not load tokenizer '{CONTEXT_TOKENIZER}', approximating token counts: {e}")
+    return _tokenizer
+
+
+def count_tokens(text):
+    tokenizer = get_tokenizer()
+    if tokenizer is not None:
+        return len(tokenizer.encode(text, add_special_tokens=False).ids)
+    count = 0
+    for piece in _PIECE_RE.findall(text):
+        count += 1 + (len(piece) - 1) // _WORD_PIECE if piece[0].isalpha() else 1
+    return count
+
+
+def token_prefix_length(text, budget):
+    """Length of the longest prefix of text that ends on a token boundary and has at most `budget` tokens."""
+    tokenizer = get_tokenizer()
+    if tokenizer is not None:
+        encoding = tokenizer.encode(text, add_special_tokens=False)
+        if len(encoding.ids) <= budget:
+            return len(text)
+        return encoding.offsets[budget][0]
+    count = 0
+    for match in _PIECE_RE.finditer(text):
+        piece = match.group()
+        count += 1 + (len(piece) - 1) // _WORD_PIECE if piece[0].isalpha() else 1
+        if count > budget:
+            return match.start()
+    return len(text)
+
+
+def truncate_to_tokens(text, budget):
+    """Cuts text to at most `budget` tokens, preferring to end at a sentence or line break."""
+    if count_tokens(text) <= budget:
+        return text
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count_tokens(text[:mid]) <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    cut = text[:lo]
+    boundary = max(cut.rfind(". "), cut.rfind(".\n"), cut.rfind("\n"))
+    if boundary > len(cut) // 2:
+        cut = cut[:boundary + 1]
+    return cut.rstrip()
+
+
+# ---------- overlap and similarity ----------
+
+def _shingles(text, n=3):
+    words = re.findall(r"\w+", text.lower())
+    return {tuple(words[i:i + n]) for i in range(max(len(words) - n + 1, 1))}
+
+
+def _jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _span(metadata):
+    """(page_start, char_start, page_end, char_end) of a chunk (see utils.chunker.Chunk), or None."""
+    try:
+        return tuple(int(metadata[k]) for k in ("page_start", "char_start", "page_end", "char_end"))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _suffix_prefix(prev, text, min_chars, max_chars):
+    """
+    Longest suffix of prev (at most max_chars, at least min_chars) that is a prefix of text.
+    Only positions where text's first min_chars characters occur in prev's tail are tried.
+    """
+    tail = prev[-max_chars:]
+    anchor = text[:min_chars]
+    if len(anchor) < min_chars:
+        return 0
+    i = tail.find(anchor)
+    while i >= 0:
+        if text.startswith(tail[i:]):
+            return len(tail) - i
+        i = tail.find(anchor, i + 1)
+    return 0
+
+
+def _overlap(prev, text, prev_span=None, span=None, min_chars=40, max_chars=400):
+    """
+    Length of the suffix of prev that starts text (the chunker's overlap). With both chunks'
+    offsets it is read off them; text matching is only needed for matches without offsets
+    or an overlap that crosses a page break.
+    """
+    if prev_span and span:
+        start, prev_start, prev_end = span[:2], prev_span[:2], prev_span[2:]
+        if start <= prev_start or start >= prev_end:
+            return 0
+        if span[0] == prev_span[2]:
+            size = prev_span[3] - span[1]
+            return size if size <= min(len(prev), len(text)) and text.startswith(prev[-size:]) else 0
+    return _suffix_prefix(prev, text, min_chars, max_chars)
+
+
+# ---------- packing ----------
+
+def citation(metadata):
+    """'[book.pdf, p. 3]' or '[book.pdf, pp. 3-4]' for a chunk with page metadata, otherwise ''."""
+    source, first, last = metadata.get("source"), metadata.get("page_start"), metadata.get("page_end")
+    if not source or not first:
+        return ""
+    pages = f"p. {first}" if not last or last == first else f"pp. {first}-{last}"
+    return f"[{os.path.splitext(source)[0]}, {pages}]"
+
+
+def pack_context(matches, budget=CONTEXT_TOKEN_BUDGET, mmr_lambda=CONTEXT_MMR_LAMBDA,
+                 duplicate_threshold=CONTEXT_DUPLICATE_THRESHOLD):
+    """
+    Assembles retrieved matches into prompt context within a token budget.
+
+    Near-duplicate chunks are dropped, then chunks are picked in MMR order (relevance
+    traded off against similarity to what is already picked) and packed until the
+    budget is spent. Each pair's similarity is computed once. When two picked chunks
+    are neighbours in the same book, the text the chunker repeated at the start of the
+    later one is cut. Only the last chunk
+    that fits is truncated, at a sentence boundary. Each chunk is preceded by its
+    citation label (book and pages) when the match carries page metadata.
+
+    Returns (context, used_matches) where used_matches are the matches that made it in.
+    """
+    candidates = []
+    for match in matches:
+        metadata = match.get("metadata") or {}
+        text = metadata.get("text", "")
+        if not text.strip():
+            continue
+        shingles = _shingles(text)
+        # Similarity to every earlier candidate, kept for the MMR redundancy term
+        similar = [_jaccard(shingles, c["shingles"]) for c in candidates]
+        if any(sim >= duplicate_threshold for sim in similar):
+            continue
+        c = {"match": match, "text": text, "shingles": shingles, "source": metadata.get("source"),
+             "span": _span(metadata), "index": len(candidates), "similar": similar, "redundancy": 0.0}
+        candidates.append(c)
+    if not candidates:
+        return "", []
+
+    def similarity(a, b):
+        return a["similar"][b["index"]] if a["index"] > b["index"] else b["similar"][a["index"]]
+
+    top = max(c["match"].get("score", 0.0) for c in candidates) or 1.0
+    for c in candidates:
+        c["relevance"] = c["match"].get("score", 0.0) / top
+
+    picked = []
+    remaining = budget
+    while candidates and remaining > 0:
+        best = max(candidates, key=lambda c: mmr_lambda * c["relevance"] - (1 - mmr_lambda) * c["redundancy"])
+        candidates.remove(best)
+        # Redundancy is the highest similarity to any picked chunk, so only the newest one needs checking
+        for c in candidates:
+            c["redundancy"] = max(c["redundancy"], similarity(c, best))
+
+        text = best["text"]
+        for p in picked:
+            if p["source"] == best["source"]:
+                text = text[_overlap(p["text"], text, p["span"], best["span"]):]
+                text = text[:len(text) - _overlap(text, p["text"], best["span"], p["span"])]
+        text = text.strip()
+        if not text:
+            continue
+
+        label = citation(best["match"].get("metadata") or {})
+        label_tokens = count_tokens(label) + 1 if label else 0
+        tokens = count_tokens(text)
+        if tokens + label_tokens > remaining:
+            # Keep a partial chunk only if a useful amount of it fits
+            if remaining - label_tokens < min(tokens, 64):
+                continue
+            text = truncate_to_tokens(text, remaining - label_tokens)
+            tokens = count_tokens(text)
+        best["packed"] = f"{label}\n{text}" if label else text
+        picked.append(best)
+        remaining -= tokens + label_tokens + 1  # blank-line separator
+
+    return "\n\n".join(p["packed"] for p in picked), [p["match"] for p in picked]
@@ -0,0 +1,59 @@
+import logging
+
+from config.config import HISTORY_TURNS, HISTORY_MESSAGE_TOKENS, HISTORY_SUMMARY_TOKENS, SUMMARY_BATCH_MESSAGES
+from models.context_builder import truncate_to_tokens
+from models.llm import get_async_groq_client, asummarize_conversation
+from utils import thread_store
+from utils.concurrency import run_in_stage, stage_limiter
+from utils.metrics import timed_stage
+
+logger = logging.getLogger(__name__)
+
+
+def _clip(messages):
+    return [
+        {"role": m["role"], "content": truncate_to_tokens(m["content"], HISTORY_MESSAGE_TOKENS)}
+        for m in messages
+    ]
+
+
+def load_history(username, thread_id):
+    """
+    Chat messages describing a thread's earlier conversation for the next prompt: the
+    cached summary of older turns as a system message, then the last HISTORY_TURNS
+    turns verbatim (each message capped at HISTORY_MESSAGE_TOKENS). Blocking.
+    """
+    summary, recent = thread_store.conversation_window(username, thread_id, HISTORY_TURNS * 2)
+    messages = []
+    if summary:
+        messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
+    return messages + _clip(recent)
+
+
+async def refresh_summary(username, thread_id):
+    """
+    Folds turns that have fallen out of the verbatim window into the thread's cached
+    summary, SUMMARY_BATCH_MESSAGES at a time. Does nothing while the thread is short.
+    Failures are logged; the old summary is kept and the next turn retries.
+    """
+    window = HISTORY_TURNS * 2
+    try:
+        while True:
+            summary, covered, pending = await run_in_stage(
+                "storage", thread_store.summary_backlog, username, thread_id, window, SUMMARY_BATCH_MESSAGES
+            )
+            if not pending:
+                return
+            with timed_stage("summary"):
+                async with stage_limiter("llm"):
+                    updated = await asummarize_conversation(
+                        summary, _clip(pending), get_async_groq_client(), HISTORY_SUMMARY_TOKENS
+                    )
+            if not updated:
+                raise RuntimeError("empty summary")
+            await run_in_stage(
+                "storage", thread_store.save_summary, username, thread_id,
+                truncate_to_tokens(updated, HISTORY_SUMMARY_TOKENS), covered + len(pending)
+            )
+    except Exception as e:
+        logger.warning(f"Could not update the summary of thread '{thread_id}': {e}")
@@ -0,0 +1,154 @@
+import re
+import logging
+import numpy as np
+
+from config.config import DOMAIN_EMBED_THRESHOLD
+from utils.corpus import get_corpus
+
+logger = logging.getLogger(__name__)
+
+# Terms that mark a question as data science / ML / statistics / data engineering.
+# Matched as whole words (an optional plural "s" is allowed), case-insensitively;
+# hyphens, slashes and spaces are interchangeable ("p-value" also matches "p value").
+DOMAIN_TERMS = (
+    # data & tooling
+    "dataset", "dataframe", "pandas", "numpy", "scipy", "scikit-learn", "scikit", "sklearn",
+    "matplotlib", "seaborn", "plotly", "ggplot", "jupyter", "notebook", "colab", "kaggle", "csv",
+    "sql", "nosql", "groupby", "pivot", "etl", "elt", "pipeline", "data warehouse",
+    "data lake", "spark", "pyspark", "hadoop", "big data", "snowflake", "redshift", "databricks",
+    "airflow", "dbt", "mlops", "r programming", "tidyverse", "dplyr",
+    # analysis & visualization
+    "histogram", "boxplot", "scatter plot", "heatmap", "visualization",
+    "visualisation", "dashboard", "eda", "exploratory", "outlier", "missing values", "imputation",
+    "normalization", "standardization", "feature scaling", "one-hot encoding", "data wrangling",
+    "data cleaning", "train test split", "data leakage", "feature importance",
+    # statistics & probability
+    "statistic", "statistics", "statistical", "probability", "distribution",
+    "arithmetic mean", "sample mean", "population mean", "median",
+    "variance", "standard deviation", "std", "standard error", "covariance", "correlation",
+    "regression", "percentile", "quantile", "quartile", "interquartile range", "iqr",
+    "skewness", "skew", "skewed", "kurtosis", "z-score", "zscore", "gaussian", "normal distribution",
+    "binomial", "poisson", "bernoulli", "probability density", "cdf", "conditional probability",
+    "hypothesis", "null hypothesis", "p-value", "pvalue", "significance level", "type i error",
+    "type ii error", "effect size", "confidence interval", "t-test", "chi-square", "anova",
+    "a/b test", "ab test", "a/b testing", "ab testing", "bayesian", "bayes", "likelihood", "maximum likelihood", "sampling",
+    "central limit theorem", "random variable", "expected value", "markov", "monte carlo",
+    "bootstrap", "time series", "arima", "sarima", "prophet", "forecast", "forecasting",
+    "seasonality", "stationarity", "autocorrelation", "multicollinearity", "heteroscedasticity",
+    "residual",
+    # machine learning
+    "machine learning", "artificial intelligence", "deep learning",
+    "model training", "training set", "test set", "validation", "cross-validation", "cross validation",
+    "overfitting", "underfitting", "bias-variance", "regularization", "lasso", "ridge",
+    "classification", "classifier", "clustering", "kmeans", "k-means", "knn",
+    "k-nearest neighbors", "dbscan", "pca", "principal component", "dimensionality reduction",
+    "svm", "support vector", "decision tree", "gini impurity", "gini index", "entropy",
+    "information gain", "k-fold", "random forest", "gradient boosting", "xgboost",
+    "lightgbm", "catboost", "ensemble", "bagging", "boosting", "naive bayes",
+    "logistic regression", "linear regression", "feature engineering",
+    "feature selection", "hyperparameter", "grid search", "random search", "gradient descent",
+    "optimizer", "loss function", "learning rate", "epoch", "batch size",
+    "supervised", "unsupervised", "semi-supervised", "reinforcement learning",
+    "accuracy", "precision", "recall", "f1", "f1-score", "roc", "auc", "confusion matrix",
+    "mse", "rmse", "mae", "mean squared error", "mean absolute error", "r-squared", "log loss", "model evaluation", "class imbalance",
+    "smote", "shap", "lime", "interpretability", "explainability", "anomaly detection",
+    "recommender", "recommendation system",
+    # neural networks & NLP / vision
+    "neural network", "neural", "perceptron", "backpropagation", "activation function",
+    "relu", "sigmoid", "softmax", "cnn", "rnn", "lstm", "gru", "transformer", "self-attention",
+    "bert", "gpt", "llm", "large language model", "embedding", "word2vec", "nlp",
+    "natural language processing", "tokenization", "sentiment analysis", "computer vision",
+    "image classification", "object detection", "gan", "autoencoder", "tensorflow", "keras",
+    "pytorch", "tensor", "fine-tuning", "transfer learning", "predictive",
+)
+
+# Generic words that only count alongside another domain term: "model accuracy" and
+# "summary stats of a dataframe" are in scope, "fashion model", "stats of Messi" and
+# "data plan" are not
+WEAK_TERMS = ("data", "model", "stats", "mean", "average", "mode", "plot", "chart", "column", "ml", "ai")
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def _words(text):
+    return _WORD_RE.findall(text.lower())
+
+
+# Terms grouped by first word, as word tuples; most query words start no term and cost one dict lookup
+_TERMS = {}
+for _term in DOMAIN_TERMS + WEAK_TERMS:
+    _w = tuple(_words(_term))
+    _TERMS.setdefault(_w[0], set()).add(_w)
+_WEAK = {tuple(_words(_term)) for _term in WEAK_TERMS}
+
+
+def _term_starts(word):
+    candidates = _TERMS.get(word)
+    if candidates is None and word.endswith("s"):
+        candidates = _TERMS.get(word[:-1])
+    return candidates
+
+
+def matches_domain_terms(text):
+    """
+    True if a domain term, or two different weak terms, occur as whole words (plural allowed).
+    Costs a few microseconds.
+    """
+    if not text:
+        return False
+    words = _words(text)
+    weak = set()
+    for i, word in enumerate(words):
+        candidates = _term_starts(word)
+        if not candidates:
+            continue
+        for term in candidates:
+            n = len(term)
+            gram = words[i:i + n]
+            if n > 1 and not (len(gram) == n and tuple(gram[:-1]) == term[:-1]
+                              and gram[-1] in (term[-1], term[-1] + "s")):
+                continue
+            if term not in _WEAK:
+                return True
+            weak.add(term)
+    return len(weak) > 1
+
+
+_centroid = None
+_centroid_corpus = None
+
+
+def domain_centroid():
+    """
+    Unit-length mean of the library's document embeddings, or None when the corpus
+    artifact was built without embeddings. Computed once per corpus build.
+    """
+    global _centroid, _centroid_corpus
+    corpus = get_corpus()
+    if corpus is None or corpus.embeddings is None or not len(corpus):
+        return None
+    if _centroid_corpus is not corpus:
+        centroid = np.asarray(corpus.embeddings.mean(axis=0), dtype=np.float32)
+        _centroid = centroid / (np.linalg.norm(centroid) or 1.0)
+        _centroid_corpus = corpus
+    return _centroid
+
+
+def embedding_domain_score(query_embedding):
+    """Cosine similarity between a query embedding and the library centroid, or None if unavailable."""
+    centroid = domain_centroid()
+    if centroid is None or query_embedding is None:
+        return None
+    q = np.asarray(query_embedding, dtype=np.float32)
+    return float(q @ centroid / (np.linalg.norm(q) or 1.0))
+
+
+def is_data_science_query(text, query_embedding=None, threshold=DOMAIN_EMBED_THRESHOLD):
+    """
+    True if the question is about data science. A keyword hit decides immediately;
+    otherwise the retrieval embedding (when given) is compared with the library centroid.
+    """
+    if matches_domain_terms(text):
+        return True
+    score = embedding_domain_score(query_embedding)
+    return score is not None and score >= threshold
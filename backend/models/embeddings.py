@@ -1,115 +1,254 @@
 import os
-import time
-import cohere
-from pinecone import Pinecone   
-
-from config.config import (
-    get_cohere_api_key,
-    get_pinecone_api_key,
-    PINECONE_INDEX_NAME
+import logging
+
+from config.config import VECTOR_BACKEND, INGEST_MANIFEST_PATH, RETRIEVAL_MODE, HYBRID_CANDIDATES, RRF_K
+from models.clients import get_client
+from models.vector_store import get_vector_store, vector_store_target
+from models.query_cache import get_query_cache, normalize_query
+from models.ingest_pipeline import IngestPipeline, cohere_document_embedder, get_rate_limiter
+from models.lexical_index import reciprocal_rank_fusion
+from utils.pdf_processor import list_pdf_files
+from utils.corpus import get_corpus, corpus_matches, iter_build_corpus, CHUNKER
+from utils.metrics import timed_stage, record_cache, INGEST_FILES
+from utils.ingest_manifest import (
+    load_manifest,
+    save_manifest,
+    file_unchanged,
+    manifest_entry,
+    all_chunk_ids,
 )
 
+logger = logging.getLogger(__name__)
+
 
 def get_clients():
-    """Initializes and returns Cohere and Pinecone clients."""
+    """
+    Returns the shared Cohere and Pinecone clients.
+    The Pinecone client is None when the local vector backend is selected.
+    """
     try:
-        cohere_api_key = get_cohere_api_key()
-        if not cohere_api_key:
-            raise RuntimeError("Cohere API key not found. Set COHERE_API_KEY in env or config.")
-
-        cohere_client = cohere.Client(api_key=cohere_api_key, timeout=60)
-
-        pinecone_api_key = get_pinecone_api_key()
-        if not pinecone_api_key:
-            raise RuntimeError("Pinecone API key not found. Set PINECONE_API_KEY in env or config.")
-
-        # instantiate Pinecone
-        pinecone_client = Pinecone(api_key=pinecone_api_key)
-
-        return cohere_client, pinecone_client
+        cohere_client = get_client("cohere")
+        if VECTOR_BACKEND == "local":
+            return cohere_client, None
+        return cohere_client, get_client("pinecone")
 
     except Exception as e:
         raise RuntimeError(f"Failed to initialize API clients: {e}")
 
 
-def setup_vector_store(chunks, cohere_client, pinecone_client):
-    """Sets up Pinecone index and uploads embeddings if empty."""
+def setup_vector_store(folder_path, cohere_client, manifest_path=INGEST_MANIFEST_PATH, on_corpus=None):
+    """
+    Brings the vector store in line with the PDFs in folder_path.
+
+    Chunk IDs are derived from chunk content and tracked per file in the ingestion
+    manifest, so only new or changed files are re-chunked, only chunks the index
+    has never seen are embedded, and vectors no longer referenced by any file are deleted.
+
+    Files whose hash matches the prebuilt corpus artifact are read from it instead of
+    being parsed, and its stored embeddings (if any) are upserted without calling Cohere.
+    If the artifact is stale, it is rebuilt file by file from the same stream that feeds
+    the pipeline, so only one file's chunks are held in memory. on_corpus(corpus) is
+    called once the up-to-date artifact is published, before the last vectors are upserted.
+
+    The manifest records which index it describes. If that is not the current one (the
+    backend was switched or the index renamed), or the index is empty although the
+    manifest is not (it was recreated or wiped), every file is ingested again.
+    """
+    index = get_vector_store(create_if_missing=True)
+    target = vector_store_target()
+    indexed = index.describe_index_stats().get("total_vector_count", 0)
+    manifest = load_manifest(manifest_path)
+    # Indexes built before the manifest existed used positional IDs ("0", "1", ...)
+    if not manifest["files"] and indexed:
+        print(f"Removing {indexed} legacy positional vectors before re-ingesting...")
+        index.delete([str(i) for i in range(indexed)])
+
+    # Manifests written before the target was recorded are taken to describe this index
+    recorded = manifest.get("target", target)
+    if manifest["files"] and (recorded != target or not indexed):
+        reason = f"it describes {recorded}" if recorded != target else "the index is empty"
+        print(f"[WARNING] Ingestion manifest does not match {target} ({reason}). Re-ingesting every file...")
+        manifest = {"version": manifest["version"], "files": {}}
+    known_ids = all_chunk_ids(manifest)
+
+    pdf_files = list_pdf_files(folder_path)
+    files = {}
+    changed = {}
+    # Chunks cut with other settings are replaced: every file is re-chunked and the old
+    # vectors, no longer referenced, are deleted below
+    rechunk = manifest.get("chunker") != CHUNKER
+
+    for pdf_file in pdf_files:
+        file_path = os.path.join(folder_path, pdf_file)
+        entry = manifest["files"].get(pdf_file)
+        try:
+            unchanged, sha = file_unchanged(entry, file_path)
+        except OSError as e:
+            print(f"[WARNING] Could not read '{pdf_file}'. Skipping. Error: {e}")
+            if entry:
+                files[pdf_file] = entry
+            continue
+        if unchanged and not rechunk:
+            files[pdf_file] = manifest_entry(file_path, sha, entry["chunk_ids"])
+        else:
+            changed[pdf_file] = sha
+
+    INGEST_FILES.labels("total").set(len(pdf_files))
+    INGEST_FILES.labels("done").set(len(pdf_files) - len(changed))
+
+    # Chunks stream in as each changed file is parsed; embedding starts on the first full batch
+    batch_size = 96  # Cohere API batch limit
+    pending = []
+    # After a chunker change even chunks with unchanged text are upserted again, for their new metadata
+    seen = set() if rechunk else set(known_ids)
+    pipeline = IngestPipeline(
+        cohere_document_embedder(cohere_client),
+        index,
+        embed_limiter=get_rate_limiter("cohere"),
+        upsert_limiter=get_rate_limiter("pinecone") if VECTOR_BACKEND == "pinecone" else None,
+    )
+
+    def ingest_file(pdf_file, chunks, embeddings):
+        nonlocal pending
+        INGEST_FILES.labels("done").inc()
+        if chunks is None:
+            return
+        ids = []
+        vectors = []
+        for i, (vid, chunk, metadata) in enumerate(chunks):
+            ids.append(vid)
+            if vid in seen:
+                continue
+            seen.add(vid)
+            if embeddings is None:
+                pending.append((vid, chunk, metadata))
+            else:
+                vectors.append({"id": vid, "values": embeddings[i].tolist(), "metadata": {"text": chunk, **metadata}})
+        files[pdf_file] = manifest_entry(os.path.join(folder_path, pdf_file), changed[pdf_file], ids)
+
+        for start in range(0, len(vectors), batch_size):
+            pipeline.submit_embedded(vectors[start:start + batch_size])
+        while len(pending) >= batch_size:
+            pipeline.submit(pending[:batch_size])
+            pending = pending[batch_size:]
+
+    corpus = get_corpus()
     try:
-        # Create index if missing
-        if PINECONE_INDEX_NAME not in pinecone_client.list_indexes().names():
-            print(f"Creating new Pinecone index: {PINECONE_INDEX_NAME}")
-            pinecone_client.create_index(
-                name=PINECONE_INDEX_NAME,
-                dimension=1024,  # Cohere embed-english-v3.0 output size
-                metric="cosine"
-            )
-
-        # Correct way to connect to index
-        index = pinecone_client.Index(PINECONE_INDEX_NAME)
-
-    except Exception as e:
-        raise RuntimeError(f"Failed to get or create Pinecone index: {e}")
-
-    # Check if index is empty
-    stats = index.describe_index_stats()
-    if stats.get("total_vector_count", 0) == 0:
-        print("Index empty → embedding and uploading documents...")
-
-        batch_size = 96  # Cohere API batch limit
-        for i in range(0, len(chunks), batch_size):
-            batch_chunks = chunks[i:i + batch_size]
-            try:
-                response = cohere_client.embed(
-                    texts=batch_chunks,
-                    model="embed-english-v3.0",
-                    input_type="search_document"
-                )
-                embeddings = response.embeddings
-
-                vectors_to_upsert = [
-                    {
-                        "id": str(i + j),
-                        "values": embedding,
-                        "metadata": {"text": chunk}
-                    }
-                    for j, (chunk, embedding) in enumerate(zip(batch_chunks, embeddings))
-                ]
-
-                index.upsert(vectors=vectors_to_upsert)
-                time.sleep(1)  # avoid hitting rate limits
-
-            except Exception as e:
-                raise RuntimeError(f"Error during embedding: {e}")
-
+        if corpus_matches(corpus, folder_path):
+            if on_corpus:
+                on_corpus(corpus)
+            prebuilt = [f for f in changed if corpus.has_file(f, changed[f])]
+            if prebuilt:
+                print(f"Loading {len(prebuilt)} file(s) from the corpus artifact...")
+            for pdf_file in prebuilt:
+                ingest_file(pdf_file, corpus.file_chunks(pdf_file), corpus.file_embeddings(pdf_file))
+        else:
+            # The corpus artifact is rebuilt in the same pass: each file is written to it
+            # and handed to the pipeline as soon as it is chunked
+            if changed:
+                print(f"Ingesting {len(changed)} new or changed file(s)...")
+            for pdf_file, sha, chunks, embeddings in iter_build_corpus(folder_path, previous=corpus):
+                if changed.get(pdf_file) == sha:
+                    ingest_file(pdf_file, chunks, embeddings)
+            if on_corpus:
+                on_corpus(get_corpus())
+
+        if pending:
+            pipeline.submit(pending)
+    finally:
+        stats = pipeline.close()
+    # Files that could not be parsed keep their previous vectors
+    for pdf_file in changed:
+        if pdf_file not in files and pdf_file in manifest["files"]:
+            files[pdf_file] = manifest["files"][pdf_file]
+    if stats["chunks"]:
+        print(f"Indexed {stats['chunks']} new chunks in {stats['seconds']}s ({stats['chunks_per_sec']} chunks/s).")
+
+    new_manifest = {"version": manifest["version"], "target": target, "chunker": CHUNKER, "files": files}
+    removed = known_ids - all_chunk_ids(new_manifest)
+
+    if removed:
+        print(f"Deleting {len(removed)} stale vectors...")
+        index.delete(removed)
+    index.flush()
+
+    save_manifest(manifest_path, new_manifest)
     return index
 
 
-def retrieve_context(query, cohere_client, index, n_results=5):
-    """Retrieve most relevant chunks for a query."""
-    try:
+def embed_query(query, cohere_client):
+    """Embeds a search query, reusing the cached embedding for repeated questions."""
+    cache = get_query_cache()
+    key = f"embed-english-v3.0:{normalize_query(query)}"
+    embedding = cache.get(key)
+    record_cache("query_embedding", embedding is not None)
+    if embedding is not None:
+        return embedding
+
+    with timed_stage("query_embedding"):
         response = cohere_client.embed(
             texts=[query],
             model="embed-english-v3.0",
             input_type="search_query"
         )
-        query_embedding = response.embeddings[0]
+    embedding = response.embeddings[0]
+    cache.put(key, embedding)
+    return embedding
 
-        results = index.query(
-            vector=query_embedding,
-            top_k=n_results,
-            include_metadata=True
-        )
 
-        similarity_threshold = 0.5
+def retrieve_matches(query, cohere_client, index, n_results=5, similarity_threshold=0.5):
+    """Returns (query_embedding, matches) for the chunks scoring above the threshold."""
+    try:
+        query_embedding = embed_query(query, cohere_client)
+
+        with timed_stage("vector_search"):
+            results = index.query(
+                vector=query_embedding,
+                top_k=n_results,
+                include_metadata=True
+            )
+
         filtered_matches = [
             match for match in results.get("matches", [])
             if match.get("score", 0) > similarity_threshold
         ]
-
-        if not filtered_matches:
-            return []
-
-        return [match["metadata"]["text"] for match in filtered_matches]
+        return query_embedding, filtered_matches
 
     except Exception as e:
         raise RuntimeError(f"Failed to retrieve context: {e}")
+
+
+def retrieve_hybrid(query, cohere_client, index, lexical_index, n_results=5, mode=RETRIEVAL_MODE):
+    """
+    Returns (query_embedding, matches) fusing BM25 and vector results with reciprocal rank fusion.
+
+    Either retriever may be None (vector store not ready, no corpus artifact yet); a dense
+    failure falls back to the lexical results, so retrieval keeps working without the network.
+    query_embedding is None whenever the dense side did not run.
+    """
+    use_dense = index is not None and mode in ("hybrid", "dense")
+    use_lexical = lexical_index is not None and mode in ("hybrid", "lexical")
+    candidates = HYBRID_CANDIDATES if use_dense and use_lexical else n_results
+
+    query_embedding, dense = None, []
+    if use_dense:
+        try:
+            query_embedding, dense = retrieve_matches(query, cohere_client, index, candidates)
+        except RuntimeError as e:
+            if not use_lexical:
+                raise
+            logger.warning(f"Dense retrieval failed, using lexical results only: {e}")
+
+    lexical = []
+    if use_lexical:
+        with timed_stage("lexical_search"):
+            lexical = lexical_index.query(query, candidates)
+    if not dense or not lexical:
+        return query_embedding, (dense or lexical)[:n_results]
+    return query_embedding, reciprocal_rank_fusion([dense, lexical], n_results, k=RRF_K)
+
+
+def retrieve_context(query, cohere_client, index, n_results=5):
+    """Retrieve most relevant chunks for a query."""
+    _, matches = retrieve_matches(query, cohere_client, index, n_results)
+    return [match["metadata"]["text"] for match in matches]
@@ -0,0 +1,193 @@
+import time
+import queue
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config.config import EMBED_CONCURRENCY, EMBED_MAX_RETRIES, PROVIDER_RATE_LIMITS
+from utils.metrics import INGEST_CHUNKS
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. acquire() blocks until a token is available.
+
+    The refill rate adapts to the provider: penalize() halves it after a
+    rate-limit response and reward() creeps it back towards the configured rate.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, rate))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self, tokens=1.0):
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def penalize(self):
+        with self._lock:
+            self.rate = max(self.max_rate / 16, self.rate / 2)
+            self._tokens = 0.0
+
+    def reward(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate * 1.05)
+
+
+def get_rate_limiter(provider):
+    """Returns a TokenBucket for a provider listed in PROVIDER_RATE_LIMITS, or None if unlimited."""
+    limits = PROVIDER_RATE_LIMITS.get(provider)
+    if not limits or limits["calls_per_minute"] <= 0:
+        return None
+    return TokenBucket(limits["calls_per_minute"] / 60.0, limits["burst"])
+
+
+def is_rate_limit_error(error):
+    """Recognizes 429s from the Cohere, Pinecone and Groq SDKs without importing them."""
+    status = getattr(error, "status_code", None) or getattr(error, "status", None)
+    if status == 429:
+        return True
+    name = type(error).__name__.lower()
+    return "ratelimit" in name or "toomanyrequests" in name
+
+
+def call_with_retries(fn, limiter=None, max_retries=EMBED_MAX_RETRIES, base_delay=1.0, max_delay=30.0):
+    """Calls fn, backing off exponentially (with jitter) on rate-limit errors."""
+    for attempt in range(max_retries + 1):
+        if limiter:
+            limiter.acquire()
+        try:
+            result = fn()
+        except Exception as e:
+            if not is_rate_limit_error(e) or attempt == max_retries:
+                raise
+            if limiter:
+                limiter.penalize()
+            delay = min(max_delay, base_delay * 2 ** attempt) * (0.5 + random.random())
+            logger.warning(f"Rate limited, retrying in {delay:.1f}s ({attempt + 1}/{max_retries})")
+            time.sleep(delay)
+            continue
+        if limiter:
+            limiter.reward()
+        return result
+
+
+def cohere_document_embedder(cohere_client):
+    """Adapts a Cohere client to the embed_fn(texts) -> embeddings shape used by the pipeline."""
+    def embed(texts):
+        response = cohere_client.embed(
+            texts=texts,
+            model="embed-english-v3.0",
+            input_type="search_document"
+        )
+        return response.embeddings
+    return embed
+
+
+class IngestPipeline:
+    """
+    Two-stage ingestion pipeline: up to `concurrency` embedding calls run in a thread
+    pool while a single upsert thread writes finished batches to the vector store.
+
+    Batches are (chunk_id, text, metadata) lists. At most 2 * concurrency batches are
+    in flight, so submit() applies back-pressure instead of buffering the whole corpus.
+    embed_fn takes a list of texts and returns their embeddings, so any stub can stand
+    in for a real provider.
+    """
+
+    def __init__(self, embed_fn, index, concurrency=EMBED_CONCURRENCY, embed_limiter=None, upsert_limiter=None):
+        self.embed_fn = embed_fn
+        self.index = index
+        self.embed_limiter = embed_limiter
+        self.upsert_limiter = upsert_limiter
+
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="embed")
+        self._slots = threading.BoundedSemaphore(concurrency * 2)
+        self._ready = queue.Queue()
+        self._error = None
+        self._upserter = threading.Thread(target=self._upsert_loop, name="upsert", daemon=True)
+
+        self.chunks = 0
+        self._started = None
+        self._upserter.start()
+
+    def submit(self, batch):
+        if self._error:
+            raise RuntimeError(f"Error during embedding: {self._error}")
+        if self._started is None:
+            self._started = time.perf_counter()
+        self._slots.acquire()
+        self._executor.submit(self._embed_batch, batch)
+
+    def submit_embedded(self, vectors):
+        """Queues vectors that already have embeddings (e.g. from the corpus artifact) for upsert."""
+        if self._error:
+            raise RuntimeError(f"Error during embedding: {self._error}")
+        if self._started is None:
+            self._started = time.perf_counter()
+        self._slots.acquire()
+        self._ready.put(vectors)
+
+    def _embed_batch(self, batch):
+        try:
+            embeddings = call_with_retries(
+                lambda: self.embed_fn([text for _, text, _ in batch]),
+                limiter=self.embed_limiter
+            )
+            vectors = [
+                {"id": vid, "values": embedding, "metadata": {"text": text, **metadata}}
+                for (vid, text, metadata), embedding in zip(batch, embeddings)
+            ]
+            self._ready.put(vectors)
+        except Exception as e:
+            self._error = self._error or e
+            self._slots.release()
+
+    def _upsert_loop(self):
+        while True:
+            vectors = self._ready.get()
+            if vectors is None:
+                return
+            try:
+                if not self._error:
+                    call_with_retries(lambda: self.index.upsert(vectors=vectors), limiter=self.upsert_limiter)
+                    self.chunks += len(vectors)
+                    INGEST_CHUNKS.inc(len(vectors))
+            except Exception as e:
+                self._error = self._error or e
+            finally:
+                self._slots.release()
+
+    def close(self):
+        """Waits for all batches to be embedded and upserted and returns throughput stats."""
+        self._executor.shutdown(wait=True)
+        self._ready.put(None)
+        self._upserter.join()
+
+        elapsed = time.perf_counter() - self._started if self._started else 0.0
+        stats = {
+            "chunks": self.chunks,
+            "seconds": round(elapsed, 3),
+            "chunks_per_sec": round(self.chunks / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+        if self._error:
+            raise RuntimeError(f"Error during embedding: {self._error}")
+        return stats
@@ -0,0 +1,218 @@
+import os
+import re
+import json
+import logging
+import threading
+from array import array
+from collections import Counter
+import numpy as np
+
+from config.config import LEXICAL_INDEX_DIR, BM25_K1, BM25_B, LEXICAL_MIN_MATCH
+from utils.corpus import get_corpus
+from utils import snapshots
+
+logger = logging.getLogger(__name__)
+
+LEXICAL_INDEX_VERSION = 1
+# Each build is published as LEXICAL_INDEX_DIR/<prefix><time>_<pid>, selected by CURRENT
+BUILD_PREFIX = "build_"
+# Files of the flat layout used before builds were versioned; removed when a build is published
+LEGACY_FILES = ("lexical.json", "indptr.npy", "doc_ids.npy", "tfs.npy", "doc_len.npy")
+
+_TOKEN_RE = re.compile(r"[a-z0-9_]+")
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in into is it its
+me my no not of on or so such that the their them then there these they this to
+was we what when where which who why will with you your
+""".split())
+
+
+def tokenize(text):
+    """Lowercased word tokens; keeps identifiers like read_csv or groupby intact."""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over the corpus artifact's chunks.
+
+    Postings are stored CSR-style: the documents containing term t are
+    doc_ids[indptr[t]:indptr[t + 1]] with their term frequencies in tfs.
+    A query only touches the postings of its own terms.
+    """
+
+    def __init__(self, corpus, terms, indptr, doc_ids, tfs, doc_len, k1=BM25_K1, b=BM25_B):
+        self.corpus = corpus
+        self.vocab = {term: i for i, term in enumerate(terms)}
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.k1 = k1
+        self.b = b
+
+        n = len(doc_len)
+        df = np.diff(indptr)
+        self.idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avgdl = float(doc_len.mean()) if n else 1.0
+        # Length normalisation term of the BM25 denominator, precomputed per document
+        self._norm = (k1 * (1 - b + b * doc_len / max(avgdl, 1e-9))).astype(np.float32)
+
+    def __len__(self):
+        return len(self.doc_len)
+
+    def search(self, query, top_k=10, min_match=LEXICAL_MIN_MATCH):
+        """
+        Returns [(row, score)] for the top_k chunks, best first. Chunks must contain at
+        least min_match of the query's distinct terms, so one common word is not a hit.
+        """
+        query_terms = set(tokenize(query))
+        term_ids = {self.vocab[t] for t in query_terms if t in self.vocab}
+        if not term_ids or not len(self):
+            return []
+
+        scores = np.zeros(len(self), dtype=np.float32)
+        matched = np.zeros(len(self), dtype=np.int16)
+        for t in term_ids:
+            start, end = self.indptr[t], self.indptr[t + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.tfs[start:end].astype(np.float32)
+            # Each document appears once per term, so fancy-index accumulation is safe
+            scores[docs] += self.idf[t] * tf * (self.k1 + 1) / (tf + self._norm[docs])
+            matched[docs] += 1
+
+        hits = np.flatnonzero(matched >= max(1, int(np.ceil(min_match * len(query_terms)))))
+        if len(hits) > top_k:
+            hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return [(int(row), float(scores[row])) for row in hits]
+
+    def query(self, query, top_k=10):
+        """
+        Same match shape as the vector stores: {"id", "score", "metadata": {"text", "source", pages...}},
+        plus "lexical": True, since a BM25 hit says nothing about whether the question is on topic.
+        """
+        return [
+            {
+                "id": self.corpus.chunk_id(row),
+                "score": score,
+                "metadata": {"text": self.corpus.text(row), **self.corpus.metadata(row)},
+                "lexical": True,
+            }
+            for row, score in self.search(query, top_k)
+        ]
+
+
+def build_postings(texts):
+    """Tokenizes texts and returns (terms, indptr, doc_ids, tfs, doc_len) arrays."""
+    vocab = {}
+    term_col = array("i")
+    doc_col = array("i")
+    tf_col = array("H")
+    doc_len = np.zeros(len(texts), dtype=np.float32)
+
+    for d, text in enumerate(texts):
+        counts = Counter(tokenize(text))
+        doc_len[d] = sum(counts.values())
+        for term, tf in counts.items():
+            term_col.append(vocab.setdefault(term, len(vocab)))
+            doc_col.append(d)
+            tf_col.append(min(tf, 65535))
+
+    term_ids = np.frombuffer(term_col, dtype=np.int32)
+    order = np.argsort(term_ids, kind="stable")
+    indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(term_ids, minlength=len(vocab)), out=indptr[1:])
+    doc_ids = np.frombuffer(doc_col, dtype=np.int32)[order]
+    tfs = np.frombuffer(tf_col, dtype=np.uint16)[order]
+    return list(vocab), indptr, doc_ids, tfs, doc_len
+
+
+def build_lexical_index(corpus, path=LEXICAL_INDEX_DIR):
+    """
+    Builds the BM25 postings for a corpus artifact and publishes them under path for every
+    worker to map. Readers keep the previous build until CURRENT is swapped to the new one.
+    """
+    terms, indptr, doc_ids, tfs, doc_len = build_postings([corpus.text(i) for i in range(len(corpus))])
+
+    os.makedirs(path, exist_ok=True)
+    tmp = snapshots.staging_dir(path)
+    np.save(os.path.join(tmp, "indptr.npy"), indptr)
+    np.save(os.path.join(tmp, "doc_ids.npy"), doc_ids)
+    np.save(os.path.join(tmp, "tfs.npy"), tfs)
+    np.save(os.path.join(tmp, "doc_len.npy"), doc_len)
+    with open(os.path.join(tmp, "lexical.json"), "w") as f:
+        json.dump({"version": LEXICAL_INDEX_VERSION, "corpus": corpus.fingerprint, "terms": terms}, f)
+
+    snapshots.publish(path, tmp, BUILD_PREFIX, legacy=LEGACY_FILES)
+    logger.info(f"Lexical index built: {len(terms)} terms over {len(corpus)} chunks")
+
+
+def _load_build(corpus, path):
+    try:
+        with open(os.path.join(path, "lexical.json"), "r") as f:
+            meta = json.load(f)
+    except json.JSONDecodeError:
+        return None
+    if meta.get("version") != LEXICAL_INDEX_VERSION or meta.get("corpus") != corpus.fingerprint:
+        return None
+
+    def load(name):
+        return np.load(os.path.join(path, name), mmap_mode="r")
+
+    try:
+        return BM25Index(corpus, meta["terms"], load("indptr.npy"), load("doc_ids.npy"),
+                         load("tfs.npy"), np.asarray(load("doc_len.npy")))
+    except FileNotFoundError:
+        raise
+    except Exception as e:
+        logger.warning(f"Could not load lexical index at '{path}': {e}")
+        return None
+
+
+def load_lexical_index(corpus, path=LEXICAL_INDEX_DIR):
+    """Maps the current postings under path if they were built from this corpus; otherwise returns None."""
+    try:
+        return snapshots.load_current(path, lambda build: _load_build(corpus, build))
+    except FileNotFoundError:
+        return None
+
+
+_lexical_index = None
+_lexical_key = None
+_lexical_lock = threading.Lock()
+
+
+def get_lexical_index(path=LEXICAL_INDEX_DIR):
+    """
+    Returns the BM25 index for the current corpus artifact, or None until one has been built.
+    Needs no network, so it is usable before (or without) the vector store.
+    """
+    global _lexical_index, _lexical_key
+    corpus = get_corpus()
+    if corpus is None:
+        return None
+    published = snapshots.pointer_key(path)
+    if published is None:
+        return None
+    # Remapped only when the corpus or the postings are rebuilt
+    key = (corpus.fingerprint, *published)
+    if key != _lexical_key:
+        with _lexical_lock:
+            if key != _lexical_key:
+                _lexical_index = load_lexical_index(corpus, path)
+                _lexical_key = key
+    return _lexical_index
+
+
+def reciprocal_rank_fusion(result_lists, top_k, k=60):
+    """
+    Merges ranked match lists by summing 1 / (k + rank) per chunk ID.
+    The fused score replaces each match's score; metadata comes from its first list.
+    """
+    fused = {}
+    for matches in result_lists:
+        for rank, match in enumerate(matches):
+            entry = fused.setdefault(match["id"], {**match, "score": 0.0})
+            entry["score"] += 1.0 / (k + rank + 1)
+    return sorted(fused.values(), key=lambda m: m["score"], reverse=True)[:top_k]
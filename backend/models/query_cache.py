@@ -0,0 +1,142 @@
+import re
+import time
+import sqlite3
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+
+from config.config import QUERY_CACHE_SIZE, QUERY_CACHE_DB, QUERY_CACHE_DISK_MAX
+from utils.db import get_connection
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query):
+    """Case- and whitespace-insensitive form of a query, ignoring trailing punctuation."""
+    return _WHITESPACE.sub(" ", query).strip().lower().rstrip("?!.")
+
+
+class QueryEmbeddingCache:
+    """
+    Two-tier cache of query embeddings.
+
+    The first tier is an in-process LRU. The optional second tier is a SQLite file
+    shared by every gunicorn worker, so a question embedded by one worker is a hit
+    in the others. The disk tier is trimmed to disk_max entries by least recent use.
+
+    The lock only guards the in-memory LRU and counters; disk lookups and writes run
+    outside it on per-thread connections, so threads never queue behind another's I/O.
+    """
+
+    def __init__(self, capacity=QUERY_CACHE_SIZE, disk_path=QUERY_CACHE_DB, disk_max=QUERY_CACHE_DISK_MAX):
+        self.capacity = capacity
+        self.disk_max = disk_max
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_path = None
+        self._writes = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if disk_path:
+            try:
+                db = get_connection(disk_path)
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                    "key TEXT PRIMARY KEY, embedding BLOB NOT NULL, last_used REAL NOT NULL)"
+                )
+                db.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON query_embeddings(last_used)")
+                self._disk_path = disk_path
+            except sqlite3.Error as e:
+                logger.warning(f"Query cache disk tier disabled: {e}")
+
+    def get(self, key):
+        with self._lock:
+            embedding = self._memory.get(key)
+            if embedding is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return embedding
+
+        embedding = self._disk_get(key)
+        with self._lock:
+            if embedding is None:
+                self.misses += 1
+                return None
+            self._remember(key, embedding)
+            self.hits += 1
+            self.disk_hits += 1
+        return embedding
+
+    def put(self, key, embedding):
+        with self._lock:
+            self._remember(key, embedding)
+            if self._disk_path is None:
+                return
+            self._writes += 1
+            trim = self._writes % 100 == 0
+        try:
+            db = get_connection(self._disk_path)
+            db.execute(
+                "INSERT OR REPLACE INTO query_embeddings (key, embedding, last_used) VALUES (?, ?, ?)",
+                (key, array("f", embedding).tobytes(), time.time())
+            )
+            if trim:
+                self._trim_disk(db)
+        except sqlite3.Error as e:
+            logger.warning(f"Query cache write failed: {e}")
+
+    def _disk_get(self, key):
+        if self._disk_path is None:
+            return None
+        try:
+            db = get_connection(self._disk_path)
+            row = db.execute("SELECT embedding FROM query_embeddings WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE query_embeddings SET last_used = ? WHERE key = ?", (time.time(), key))
+            return array("f", row[0]).tolist()
+        except sqlite3.Error as e:
+            logger.warning(f"Query cache read failed: {e}")
+            return None
+
+    def _remember(self, key, embedding):
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.capacity:
+            self._memory.popitem(last=False)
+
+    def _trim_disk(self, db):
+        count = db.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0]
+        if count > self.disk_max:
+            db.execute(
+                "DELETE FROM query_embeddings WHERE key IN "
+                "(SELECT key FROM query_embeddings ORDER BY last_used LIMIT ?)",
+                (count - self.disk_max,)
+            )
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+
+_query_cache = None
+
+
+def get_query_cache():
+    """Returns the process-wide query embedding cache."""
+    global _query_cache
+    if _query_cache is None:
+        _query_cache = QueryEmbeddingCache()
+    return _query_cache
@@ -0,0 +1,310 @@
+import os
+import json
+import logging
+import numpy as np
+
+from config.config import (
+    VECTOR_BACKEND,
+    PINECONE_INDEX_NAME,
+    EMBEDDING_DIMENSION,
+    LOCAL_INDEX_DIR,
+    LOCAL_INDEX_NLIST,
+    LOCAL_INDEX_NPROBE,
+)
+
+from models.clients import get_client, get_pinecone_index
+from utils import snapshots
+
+logger = logging.getLogger(__name__)
+
+
+class VectorStore:
+    """
+    Minimal interface shared by all vector store backends.
+    Query results use the same shape as Pinecone: {"matches": [{"id", "score", "metadata"}]}.
+    """
+
+    def upsert(self, vectors):
+        raise NotImplementedError
+
+    def delete(self, ids):
+        raise NotImplementedError
+
+    def query(self, vector, top_k=5, include_metadata=True):
+        raise NotImplementedError
+
+    def describe_index_stats(self):
+        raise NotImplementedError
+
+    def flush(self):
+        """Persists pending writes. Remote backends write through, so this is a no-op."""
+        return None
+
+
+class PineconeVectorStore(VectorStore):
+    """Thin adapter around a Pinecone index."""
+
+    def __init__(self, index):
+        self.index = index
+
+    def upsert(self, vectors):
+        return self.index.upsert(vectors=vectors)
+
+    def delete(self, ids):
+        ids = list(ids)
+        for i in range(0, len(ids), 1000):
+            self.index.delete(ids=ids[i:i + 1000])
+
+    def query(self, vector, top_k=5, include_metadata=True):
+        return self.index.query(vector=vector, top_k=top_k, include_metadata=include_metadata)
+
+    def describe_index_stats(self):
+        return self.index.describe_index_stats()
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Local cosine-similarity index backed by a memory-mapped float32 matrix.
+
+    Each snapshot lives in its own directory (vectors.f32, meta.json, optional ivf.npz)
+    and CURRENT points at the live one. Writers build a new snapshot and swap CURRENT
+    atomically (see utils.snapshots); readers map the matrix read-only, so every gunicorn
+    worker shares the same pages through the OS page cache and picks up new snapshots on
+    the next query. Superseded snapshots are kept for a grace period so a reader that
+    resolved CURRENT just before a swap can still open them.
+
+    With nlist > 0 rows are grouped by k-means cluster (IVF) and a query only scores
+    the nprobe closest clusters instead of the whole matrix.
+    """
+
+    def __init__(self, path, dimension=EMBEDDING_DIMENSION, nlist=0, nprobe=8):
+        self.path = path
+        self.dimension = dimension
+        self.nlist = nlist
+        self.nprobe = nprobe
+        os.makedirs(path, exist_ok=True)
+
+        self._loaded_key = None
+        self._matrix = np.zeros((0, dimension), dtype=np.float32)
+        self._ids = []
+        self._metadata = []
+        self._centroids = None
+        self._offsets = None
+
+        self._pending_upserts = {}
+        self._pending_deletes = set()
+        self._maybe_reload()
+
+    # ---------- reading ----------
+
+    def _maybe_reload(self):
+        # os.replace gives CURRENT a fresh inode, so this changes on every publish
+        key = snapshots.pointer_key(self.path)
+        if key is None or key == self._loaded_key:
+            return
+        # A snapshot pruned between reading CURRENT and opening its files is retried with the new CURRENT
+        loaded = snapshots.load_current(self.path, self._read_snapshot)
+        if loaded is None:
+            return
+        self._matrix, self._ids, self._metadata, self._centroids, self._offsets = loaded
+        self._loaded_key = key
+
+    def _read_snapshot(self, snapshot):
+        with open(os.path.join(snapshot, "meta.json"), "r") as f:
+            meta = json.load(f)
+
+        count = len(meta["ids"])
+        if count:
+            matrix = np.memmap(
+                os.path.join(snapshot, "vectors.f32"),
+                dtype=np.float32,
+                mode="r",
+                shape=(count, meta["dimension"]),
+            )
+        else:
+            matrix = np.zeros((0, meta["dimension"]), dtype=np.float32)
+
+        centroids, offsets = None, None
+        ivf_path = os.path.join(snapshot, "ivf.npz")
+        if os.path.exists(ivf_path):
+            with np.load(ivf_path) as ivf:
+                centroids = ivf["centroids"]
+                offsets = ivf["offsets"]
+
+        return matrix, meta["ids"], meta["metadata"], centroids, offsets
+
+    def _candidate_rows(self, q):
+        """Returns the row ranges to score: everything, or the nprobe nearest IVF lists."""
+        if self._centroids is None or len(self._centroids) == 0:
+            return [(0, len(self._ids))]
+        centroid_scores = self._centroids @ q
+        nprobe = min(self.nprobe, len(centroid_scores))
+        probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        return [(int(self._offsets[c]), int(self._offsets[c + 1])) for c in probe]
+
+    def query(self, vector, top_k=5, include_metadata=True):
+        self._maybe_reload()
+        if not self._ids:
+            return {"matches": []}
+
+        q = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm == 0:
+            return {"matches": []}
+        q = q / norm
+
+        ranges = self._candidate_rows(q)
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            rows = np.arange(start, end)
+            scores = self._matrix[start:end] @ q
+        else:
+            rows = np.concatenate([np.arange(s, e) for s, e in ranges])
+            scores = np.concatenate([self._matrix[s:e] @ q for s, e in ranges])
+
+        k = min(top_k, len(scores))
+        if k == 0:
+            return {"matches": []}
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+
+        matches = []
+        for i in top:
+            row = int(rows[i])
+            match = {"id": self._ids[row], "score": float(scores[i])}
+            if include_metadata:
+                match["metadata"] = self._metadata[row]
+            matches.append(match)
+        return {"matches": matches}
+
+    def describe_index_stats(self):
+        self._maybe_reload()
+        live = set(self._ids) - self._pending_deletes
+        live.update(self._pending_upserts)
+        return {"total_vector_count": len(live), "dimension": self.dimension}
+
+    # ---------- writing ----------
+
+    def upsert(self, vectors):
+        for v in vectors:
+            self._pending_upserts[v["id"]] = (v["values"], v.get("metadata", {}))
+            self._pending_deletes.discard(v["id"])
+
+    def delete(self, ids):
+        for vid in ids:
+            self._pending_upserts.pop(vid, None)
+            self._pending_deletes.add(vid)
+
+    def flush(self):
+        """Merges pending writes into a new snapshot and publishes it atomically."""
+        if not self._pending_upserts and not self._pending_deletes:
+            return
+        self._maybe_reload()
+
+        keep = [
+            i for i, vid in enumerate(self._ids)
+            if vid not in self._pending_deletes and vid not in self._pending_upserts
+        ]
+        ids = [self._ids[i] for i in keep] + list(self._pending_upserts)
+        metadata = [self._metadata[i] for i in keep] + [m for _, m in self._pending_upserts.values()]
+
+        new_rows = np.asarray([v for v, _ in self._pending_upserts.values()], dtype=np.float32)
+        new_rows = new_rows.reshape(-1, self.dimension)
+        norms = np.linalg.norm(new_rows, axis=1, keepdims=True)
+        new_rows = new_rows / np.where(norms == 0, 1, norms)
+        matrix = np.concatenate([np.asarray(self._matrix[keep]), new_rows]) if keep else new_rows
+
+        centroids, offsets = None, None
+        if self.nlist > 0 and len(ids) >= self.nlist * 4:
+            centroids, assignment = _kmeans(matrix, self.nlist)
+            order = np.argsort(assignment, kind="stable")
+            matrix = matrix[order]
+            ids = [ids[i] for i in order]
+            metadata = [metadata[i] for i in order]
+            counts = np.bincount(assignment, minlength=len(centroids))
+            offsets = np.concatenate([[0], np.cumsum(counts)])
+
+        self._write_snapshot(matrix, ids, metadata, centroids, offsets)
+        self._pending_upserts.clear()
+        self._pending_deletes.clear()
+        self._maybe_reload()
+
+    def _write_snapshot(self, matrix, ids, metadata, centroids, offsets):
+        snapshot = snapshots.staging_dir(self.path)
+
+        np.ascontiguousarray(matrix, dtype=np.float32).tofile(os.path.join(snapshot, "vectors.f32"))
+        with open(os.path.join(snapshot, "meta.json"), "w") as f:
+            json.dump({"dimension": self.dimension, "ids": ids, "metadata": metadata}, f)
+        if centroids is not None:
+            np.savez(os.path.join(snapshot, "ivf.npz"), centroids=centroids, offsets=offsets)
+
+        # Older snapshots are dropped after a grace period; workers still mapping them keep their open pages
+        snapshots.publish(self.path, snapshot, "snap_")
+
+
+def _kmeans(matrix, nlist, iterations=10, sample_size=20000, seed=0):
+    """Spherical k-means used to partition rows into IVF lists."""
+    rng = np.random.default_rng(seed)
+    sample = matrix
+    if len(matrix) > sample_size:
+        sample = matrix[rng.choice(len(matrix), sample_size, replace=False)]
+
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        for c in range(nlist):
+            members = sample[assignment == c]
+            if len(members):
+                centroid = members.sum(axis=0)
+                centroids[c] = centroid / (np.linalg.norm(centroid) or 1)
+
+    assignment = np.argmax(matrix @ centroids.T, axis=1)
+    return centroids.astype(np.float32), assignment
+
+
+def vector_store_target():
+    """Names the index VECTOR_BACKEND points at, e.g. "pinecone:qads" or "local:/path/to/index"."""
+    if VECTOR_BACKEND == "local":
+        return f"local:{os.path.abspath(LOCAL_INDEX_DIR)}"
+    return f"pinecone:{PINECONE_INDEX_NAME}"
+
+
+_local_store = None
+_pinecone_store = None
+
+
+def get_vector_store(create_if_missing=False):
+    """
+    Returns the process-wide vector store selected by VECTOR_BACKEND.
+    The Pinecone index is only created (an extra control-plane round-trip)
+    when create_if_missing is set.
+    """
+    global _local_store, _pinecone_store
+    if VECTOR_BACKEND == "local":
+        if _local_store is None:
+            _local_store = LocalVectorStore(
+                LOCAL_INDEX_DIR,
+                dimension=EMBEDDING_DIMENSION,
+                nlist=LOCAL_INDEX_NLIST,
+                nprobe=LOCAL_INDEX_NPROBE,
+            )
+        return _local_store
+
+    try:
+        if create_if_missing:
+            pinecone_client = get_client("pinecone")
+            if PINECONE_INDEX_NAME not in pinecone_client.list_indexes().names():
+                print(f"Creating new Pinecone index: {PINECONE_INDEX_NAME}")
+                pinecone_client.create_index(
+                    name=PINECONE_INDEX_NAME,
+                    dimension=EMBEDDING_DIMENSION,  # Cohere embed-english-v3.0 output size
+                    metric="cosine"
+                )
+        if _pinecone_store is None:
+            _pinecone_store = PineconeVectorStore(get_pinecone_index())
+        return _pinecone_store
+    except Exception as e:
+        raise RuntimeError(f"Failed to get or create Pinecone index: {e}")
@@ -0,0 +1,164 @@
+import bisect
+
+from config.config import CHUNK_SIZE, CHUNK_OVERLAP, CHUNK_UNIT
+
+# Preferred cut points, best first: paragraph, line, sentence, word
+SEPARATORS = ("\n\n", "\n", ". ", " ")
+# A chunk is cut at a separator only if it keeps at least this share of the maximum size
+MIN_FILL = 0.5
+# Upper bound on characters per token, used to size the search window in token mode
+MAX_CHARS_PER_TOKEN = 12
+# Consumed text is dropped from the buffer once this much has piled up
+_TRIM_AT = 1 << 16
+
+
+class Chunk:
+    """
+    A piece of a document with where it came from. Pages are 1-based and inclusive;
+    char_start is an offset into page_start's text and char_end an end offset into
+    page_end's text, so a chunk can be located (or re-made) from its own pages alone.
+    """
+
+    def __init__(self, text, source, page_start, page_end, char_start, char_end):
+        self.text = text
+        self.source = source
+        self.page_start = page_start
+        self.page_end = page_end
+        self.char_start = char_start
+        self.char_end = char_end
+
+    def metadata(self):
+        return {
+            "source": self.source,
+            "page_start": self.page_start,
+            "page_end": self.page_end,
+            "char_start": self.char_start,
+            "char_end": self.char_end,
+        }
+
+    def __repr__(self):
+        return f"Chunk({self.source!r}, pages {self.page_start}-{self.page_end}, {len(self.text)} chars)"
+
+
+def chunker_id(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, unit=CHUNK_UNIT):
+    """Identifies the chunking settings; artifacts and manifests built with others are redone."""
+    return f"pages-{unit}-{chunk_size}-{chunk_overlap}"
+
+
+class _Window:
+    """Finds how far a chunk starting at some offset may extend, in characters or tokens."""
+
+    def __init__(self, chunk_size, chunk_overlap, unit):
+        if unit not in ("chars", "tokens"):
+            raise ValueError(f"Unknown chunk unit '{unit}'")
+        if not 0 <= chunk_overlap < chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+        self.size = chunk_size
+        self.overlap = chunk_overlap
+        self.prefix = None
+        if unit == "tokens":
+            # Imported here so character chunking does not load the token counter
+            from models.context_builder import token_prefix_length
+            self.prefix = token_prefix_length
+        # Characters that must be buffered past a chunk's start before it can be cut
+        self.lookahead = chunk_size if self.prefix is None else chunk_size * MAX_CHARS_PER_TOKEN
+
+    def end(self, text, start, limit):
+        """Largest end <= limit such that text[start:end] fits in one chunk."""
+        if self.prefix is None:
+            return min(limit, start + self.size)
+        window = text[start:min(limit, start + self.lookahead)]
+        return start + max(1, self.prefix(window, self.size))
+
+    def overlap_chars(self, length):
+        """Characters carried into the next chunk from one of `length` characters."""
+        if self.prefix is None:
+            return self.overlap
+        return length * self.overlap // self.size
+
+
+def _cut(text, start, end, final):
+    """Where to end the chunk text[start:end]: at the best separator, or end itself if nothing better."""
+    if final and end == len(text):
+        return end
+    floor = start + int((end - start) * MIN_FILL)
+    for sep in SEPARATORS:
+        i = text.rfind(sep, floor, end)
+        if i >= 0:
+            return i + len(sep)
+    return end
+
+
+def _next_start(text, start, cut, overlap):
+    """Start of the next chunk: `overlap` characters before cut, moved forward to a word start."""
+    begin = cut - overlap
+    if begin <= start:
+        return cut
+    i = text.find(" ", begin, cut)
+    j = text.find("\n", begin, cut)
+    candidates = [k for k in (i, j) if k >= 0]
+    return min(candidates) + 1 if candidates else cut
+
+
+def chunk_pages(pages, source, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, unit=CHUNK_UNIT):
+    """
+    Splits a document given as (page_no, text) pairs into overlapping chunks, yielding
+    each Chunk as soon as the text after it has arrived. Pages are consumed as a stream
+    and only about one chunk of look-ahead is buffered, so memory does not grow with
+    the document. page_no is 0-based (as PyMuPDF numbers pages); chunks report 1-based pages.
+
+    Chunks hold at most chunk_size characters (unit="chars") or tokens (unit="tokens")
+    and end at the best of SEPARATORS in their second half. Consecutive chunks share
+    about chunk_overlap characters / tokens, starting at a word boundary. Chunks may
+    span pages; text is joined across pages exactly as extract_pages joins it.
+    """
+    window = _Window(chunk_size, chunk_overlap, unit)
+    buf = ""
+    base = 0  # document offset of buf[0]
+    page_offsets = []  # document offset where each page starts
+    page_numbers = []
+    start = 0  # offset in buf of the next chunk
+
+    def locate(offset, at_end):
+        # Page holding the character at offset (or just before it for an end offset)
+        i = bisect.bisect_right(page_offsets, offset - 1 if at_end else offset) - 1
+        return page_numbers[i] + 1, offset - page_offsets[i]
+
+    def emit(final):
+        nonlocal start
+        while start < len(buf) and (final or len(buf) - start > window.lookahead):
+            end = window.end(buf, start, len(buf))
+            cut = _cut(buf, start, end, final)
+            s, e = start, cut
+            while s < e and buf[s].isspace():
+                s += 1
+            while e > s and buf[e - 1].isspace():
+                e -= 1
+            if s < e:
+                page_start, char_start = locate(base + s, False)
+                page_end, char_end = locate(base + e, True)
+                yield Chunk(buf[s:e], source, page_start, page_end, char_start, char_end)
+            if cut >= len(buf):
+                start = cut
+                break
+            start = _next_start(buf, start, cut, window.overlap_chars(cut - start))
+
+    for page_no, text in pages:
+        page_offsets.append(base + len(buf))
+        page_numbers.append(page_no)
+        buf += text
+        yield from emit(False)
+        if start >= _TRIM_AT:
+            buf = buf[start:]
+            base += start
+            start = 0
+            # Keep the page the buffer starts in; earlier ones can no longer be referenced
+            keep = bisect.bisect_right(page_offsets, base) - 1
+            del page_offsets[:keep], page_numbers[:keep]
+    if page_offsets:
+        yield from emit(True)
+
+
+def chunk_text(text, source="", **kwargs):
+    """Splits a single string (treated as one page) into chunk texts."""
+    return [chunk.text for chunk in chunk_pages([(0, text)], source, **kwargs)]
@@ -0,0 +1,22 @@
+import functools
+import anyio
+from anyio import to_thread
+
+from config.config import STAGE_CONCURRENCY
+
+# Limiters are created lazily because anyio binds them to the running event loop
+_limiters = {}
+
+
+def stage_limiter(stage):
+    """Returns the capacity limiter bounding how many calls of a stage run at once."""
+    limiter = _limiters.get(stage)
+    if limiter is None:
+        limiter = _limiters[stage] = anyio.CapacityLimiter(STAGE_CONCURRENCY[stage])
+    return limiter
+
+
+async def run_in_stage(stage, fn, *args, **kwargs):
+    """Runs a blocking call in a worker thread without holding up the event loop."""
+    return await to_thread.run_sync(functools.partial(fn, *args, **kwargs), limiter=stage_limiter(stage))
+
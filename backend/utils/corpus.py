@@ -0,0 +1,396 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+from array import array
+import numpy as np
+
+from config.config import CORPUS_DIR, EMBEDDING_DIMENSION
+from utils.pdf_processor import list_pdf_files, iter_chunked_pdfs
+from utils.chunker import chunker_id
+from utils.ingest_manifest import file_sha256, chunk_id
+from utils import snapshots
+
+logger = logging.getLogger(__name__)
+
+CORPUS_VERSION = 3
+# Each build is published as CORPUS_DIR/<prefix><time>_<pid>, selected by CORPUS_DIR/CURRENT
+BUILD_PREFIX = "build_"
+# Identifies the chunker settings; artifacts built with a different chunker are ignored
+CHUNKER = chunker_id()
+EMBEDDING_MODEL = "embed-english-v3.0"
+# Files of the flat layout used before builds were versioned; removed when a build is published
+LEGACY_FILES = (
+    "corpus.json", "text.bin", "offsets.npy", "ids.npy", "sources.npy", "pages.npy", "spans.npy", "embeddings.npy",
+)
+
+
+class Corpus:
+    """
+    Read-only view of a prebuilt corpus artifact. Every array is memory-mapped, so
+    workers share the same page-cache pages instead of holding private copies.
+
+    Builds are published atomically (see utils.snapshots). Layout of a build directory:
+        corpus.json     version, chunker, embedding model and per-file sha256, chunk range
+                        and whether the file's embeddings are stored
+        text.bin        UTF-8 chunk texts, back to back
+        offsets.npy     int64[n + 1] byte offsets of each chunk in text.bin
+        ids.npy         S32[n] content-derived chunk IDs
+        sources.npy     int32[n] index of each chunk's file in corpus.json's file order
+        pages.npy       int32[n, 2] first and last page of each chunk (1-based, inclusive)
+        spans.npy       int32[n, 2] start offset in its first page, end offset in its last page
+        embeddings.f32  raw float32[n, dimension] (optional; zero rows for files without embeddings)
+    """
+
+    def __init__(self, path, meta, fingerprint=None):
+        self.path = path
+        self.meta = meta
+        # Identifies this build; indexes derived from the corpus record it to detect staleness
+        self.fingerprint = fingerprint
+        self.files = meta["files"]
+        self.sources = list(self.files)
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self.ids = np.load(os.path.join(path, "ids.npy"), mmap_mode="r")
+        self.source_index = np.load(os.path.join(path, "sources.npy"), mmap_mode="r")
+        self.pages = np.load(os.path.join(path, "pages.npy"), mmap_mode="r")
+        self.spans = np.load(os.path.join(path, "spans.npy"), mmap_mode="r")
+
+        text_path = os.path.join(path, "text.bin")
+        if os.path.getsize(text_path):
+            self._text = np.memmap(text_path, dtype=np.uint8, mode="r")
+        else:
+            self._text = np.zeros(0, dtype=np.uint8)
+
+        self.embeddings = None
+        if meta.get("embedding_model") and meta["count"]:
+            self.embeddings = np.memmap(os.path.join(path, "embeddings.f32"), dtype=np.float32, mode="r",
+                                        shape=(meta["count"], meta["dimension"]))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def text(self, i):
+        return self._text[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    def chunk_id(self, i):
+        return self.ids[i].decode("ascii")
+
+    def source(self, i):
+        return self.sources[self.source_index[i]]
+
+    def metadata(self, i):
+        """The chunk's source file, page range and offsets (see utils.chunker.Chunk)."""
+        return {
+            "source": self.source(i),
+            "page_start": int(self.pages[i, 0]),
+            "page_end": int(self.pages[i, 1]),
+            "char_start": int(self.spans[i, 0]),
+            "char_end": int(self.spans[i, 1]),
+        }
+
+    def has_file(self, pdf_file, sha):
+        entry = self.files.get(pdf_file)
+        return bool(entry) and entry["sha256"] == sha
+
+    def file_chunks(self, pdf_file):
+        """Returns the (chunk_id, text, metadata) triples of a file in document order."""
+        entry = self.files[pdf_file]
+        return [(self.chunk_id(i), self.text(i), self.metadata(i)) for i in range(entry["start"], entry["end"])]
+
+    def file_embeddings(self, pdf_file):
+        """Returns the stored embeddings of a file's chunks, or None if the artifact has none for it."""
+        entry = self.files[pdf_file]
+        if self.embeddings is None or not entry.get("embedded", True):
+            return None
+        return self.embeddings[entry["start"]:entry["end"]]
+
+
+class _CorpusWriter:
+    """Appends files' chunks (and embeddings) to a staging directory as they arrive."""
+
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+        self.count = 0
+        self._text = open(os.path.join(path, "text.bin"), "wb")
+        self._embeddings = None  # opened once the first file with embeddings arrives
+        self._offsets = array("q", [0])
+        self._ids = []
+        self._sources = array("i")
+        self._pages = array("i")
+        self._spans = array("i")
+
+    def add(self, pdf_file, sha, size, chunks, embeddings):
+        """chunks: [(chunk_id, text, metadata)]; embeddings: float32[len(chunks), dimension] or None."""
+        source = len(self.files)
+        self.files[pdf_file] = {
+            "sha256": sha,
+            "size": size,
+            "start": self.count,
+            "end": self.count + len(chunks),
+            "embedded": embeddings is not None,
+        }
+        for vid, text, metadata in chunks:
+            encoded = text.encode("utf-8")
+            self._text.write(encoded)
+            self._offsets.append(self._offsets[-1] + len(encoded))
+            self._ids.append(vid)
+            self._sources.append(source)
+            self._pages.extend((metadata["page_start"], metadata["page_end"]))
+            self._spans.extend((metadata["char_start"], metadata["char_end"]))
+
+        if embeddings is not None and self._embeddings is None:
+            self._embeddings = open(os.path.join(self.path, "embeddings.f32"), "wb")
+            self._write_zero_rows(self.count)
+        if self._embeddings is not None:
+            if embeddings is None:
+                self._write_zero_rows(len(chunks))
+            else:
+                self._embeddings.write(np.ascontiguousarray(embeddings, dtype=np.float32).tobytes())
+        self.count += len(chunks)
+
+    def _write_zero_rows(self, rows):
+        row = bytes(4 * EMBEDDING_DIMENSION)
+        for _ in range(rows):
+            self._embeddings.write(row)
+
+    def close(self, skipped):
+        """Writes the index arrays and corpus.json; returns the artifact metadata."""
+        self._text.close()
+        embedded = self._embeddings is not None
+        if embedded:
+            self._embeddings.close()
+        np.save(os.path.join(self.path, "offsets.npy"), np.frombuffer(self._offsets, dtype=np.int64))
+        np.save(os.path.join(self.path, "ids.npy"), np.array(self._ids, dtype="S32"))
+        np.save(os.path.join(self.path, "sources.npy"), np.frombuffer(self._sources, dtype=np.int32))
+        np.save(os.path.join(self.path, "pages.npy"), np.frombuffer(self._pages, dtype=np.int32).reshape(-1, 2))
+        np.save(os.path.join(self.path, "spans.npy"), np.frombuffer(self._spans, dtype=np.int32).reshape(-1, 2))
+
+        meta = {
+            "version": CORPUS_VERSION,
+            "chunker": CHUNKER,
+            "embedding_model": EMBEDDING_MODEL if embedded else None,
+            "dimension": EMBEDDING_DIMENSION if embedded else None,
+            "count": self.count,
+            "files": self.files,
+            "skipped": skipped,
+        }
+        with open(os.path.join(self.path, "corpus.json"), "w") as f:
+            json.dump(meta, f)
+        return meta
+
+    def abort(self):
+        self._text.close()
+        if self._embeddings is not None:
+            self._embeddings.close()
+
+
+def _embed_chunks(chunks, embed_fn, batch_size):
+    # Repeated chunks within a file share an ID, so each distinct text is embedded once
+    first = {}
+    for i, (vid, _, _) in enumerate(chunks):
+        first.setdefault(vid, i)
+    unique = list(first.values())
+    embeddings = np.zeros((len(chunks), EMBEDDING_DIMENSION), dtype=np.float32)
+    for start in range(0, len(unique), batch_size):
+        rows = unique[start:start + batch_size]
+        embeddings[rows] = np.asarray(embed_fn([chunks[i][1] for i in rows]), dtype=np.float32)
+    for i, (vid, _, _) in enumerate(chunks):
+        embeddings[i] = embeddings[first[vid]]
+    return embeddings
+
+
+def iter_build_corpus(folder_path, out_dir=CORPUS_DIR, embed_fn=None, batch_size=96, previous=None):
+    """
+    Builds the corpus artifact for folder_path file by file, yielding
+    (pdf_file, sha256, chunks, embeddings) as each file is written: chunks are
+    (chunk_id, text, metadata) triples, or None for a PDF that could not be read, and
+    embeddings are float32 rows or None. Only one file's chunks are held in memory, so
+    callers can embed and upsert while later files are still being parsed.
+
+    Files whose sha256 is unchanged since the previous build (by default the current one)
+    are copied from it, embeddings included, without parsing. The others are chunked and,
+    with embed_fn (texts -> embeddings), embedded. The artifact is published once every
+    file is written; the generator then returns its metadata.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    if previous is None:
+        previous = load_corpus(out_dir)
+    old_skipped = previous.meta.get("skipped", {}) if previous is not None else {}
+
+    pdf_files = list_pdf_files(folder_path)
+    hashes = {f: file_sha256(os.path.join(folder_path, f)) for f in pdf_files}
+    # Files stored without embeddings are parsed again when this build embeds
+    reused = [
+        f for f in pdf_files
+        if previous is not None and previous.has_file(f, hashes[f])
+        and (embed_fn is None or previous.file_embeddings(f) is not None)
+    ]
+    skipped = {f: hashes[f] for f in pdf_files if old_skipped.get(f) == hashes[f]}
+    to_parse = [f for f in pdf_files if f not in reused and f not in skipped]
+    if to_parse:
+        logger.info(f"Chunking {len(to_parse)} new or changed file(s) into the corpus artifact...")
+
+    tmp = snapshots.staging_dir(out_dir)
+    writer = _CorpusWriter(tmp)
+    missing = 0
+    try:
+        for pdf_file in reused:
+            chunks = previous.file_chunks(pdf_file)
+            embeddings = previous.file_embeddings(pdf_file)
+            size = previous.files[pdf_file]["size"]
+            writer.add(pdf_file, hashes[pdf_file], size, chunks, embeddings)
+            yield pdf_file, hashes[pdf_file], chunks, embeddings
+
+        for pdf_file, parsed in iter_chunked_pdfs(folder_path, to_parse) if to_parse else ():
+            if parsed is None:
+                # Remembered so an unreadable PDF does not make the artifact look stale forever
+                skipped[pdf_file] = hashes[pdf_file]
+                yield pdf_file, hashes[pdf_file], None, None
+                continue
+            chunks = [(chunk_id(c.text), c.text, c.metadata()) for c in parsed]
+            del parsed
+            embeddings = _embed_chunks(chunks, embed_fn, batch_size) if embed_fn else None
+            missing += embeddings is None
+            size = os.path.getsize(os.path.join(folder_path, pdf_file))
+            writer.add(pdf_file, hashes[pdf_file], size, chunks, embeddings)
+            if embed_fn:
+                logger.info(f"Embedded {len(chunks)} chunks of '{pdf_file}'")
+            yield pdf_file, hashes[pdf_file], chunks, embeddings
+
+        meta = writer.close(skipped)
+    except BaseException:
+        writer.abort()
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+    if missing and previous is not None and previous.embeddings is not None:
+        logger.warning(f"{missing} new or changed file(s) are stored without embeddings; rebuild with --embed to embed them")
+    # Workers that mapped the previous build keep reading it; it is removed after a grace period
+    snapshots.publish(out_dir, tmp, BUILD_PREFIX, legacy=LEGACY_FILES)
+    return meta
+
+
+def build_corpus(folder_path, out_dir=CORPUS_DIR, embed_fn=None, batch_size=96, previous=None):
+    """
+    Parses and chunks every PDF in folder_path and publishes the corpus artifact under out_dir.
+    With embed_fn (texts -> embeddings), document embeddings are stored as well, so
+    ingestion can fill an empty vector store without calling the embedding provider.
+    Unchanged files are carried over from the previous build (see iter_build_corpus).
+    Returns the artifact metadata.
+    """
+    builder = iter_build_corpus(folder_path, out_dir, embed_fn, batch_size, previous)
+    while True:
+        try:
+            next(builder)
+        except StopIteration as done:
+            return done.value
+
+
+def _load_build(path):
+    try:
+        with open(os.path.join(path, "corpus.json"), "rb") as f:
+            raw = f.read()
+        meta = json.loads(raw)
+    except json.JSONDecodeError:
+        return None
+
+    if meta.get("version") != CORPUS_VERSION or meta.get("chunker") != CHUNKER:
+        logger.warning(f"Ignoring corpus artifact at '{path}': built by a different version; rebuild it.")
+        return None
+    if meta.get("embedding_model") not in (None, EMBEDDING_MODEL):
+        meta["embedding_model"] = None
+    try:
+        return Corpus(path, meta, hashlib.sha256(raw).hexdigest()[:16])
+    except FileNotFoundError:
+        raise
+    except Exception as e:
+        logger.warning(f"Could not load corpus artifact at '{path}': {e}")
+        return None
+
+
+def load_corpus(path=CORPUS_DIR):
+    """Maps the current corpus build under path. Returns None if there is none or it was built differently."""
+    try:
+        return snapshots.load_current(path, _load_build)
+    except FileNotFoundError:
+        return None
+
+
+def corpus_matches(corpus, folder_path):
+    """True if the artifact holds exactly the PDFs currently in folder_path."""
+    if corpus is None:
+        return False
+    skipped = corpus.meta.get("skipped", {})
+    pdf_files = list_pdf_files(folder_path)
+    if sorted([*corpus.files, *skipped]) != pdf_files:
+        return False
+    for pdf_file in pdf_files:
+        file_path = os.path.join(folder_path, pdf_file)
+        if pdf_file in skipped:
+            expected = skipped[pdf_file]
+        elif os.path.getsize(file_path) != corpus.files[pdf_file]["size"]:
+            return False
+        else:
+            expected = corpus.files[pdf_file]["sha256"]
+        if file_sha256(file_path) != expected:
+            return False
+    return True
+
+
+def ensure_corpus(folder_path, path=CORPUS_DIR):
+    """
+    Returns the corpus artifact for folder_path, rebuilding it if it is stale. The rebuild
+    keeps the stored embeddings of unchanged files but does not embed new ones.
+    """
+    corpus = load_corpus(path)
+    if corpus_matches(corpus, folder_path):
+        return corpus
+    logger.info(f"Building corpus artifact for {folder_path}...")
+    build_corpus(folder_path, path, previous=corpus)
+    return get_corpus(path)
+
+
+_corpus = None
+_corpus_stat = None
+
+
+def get_corpus(path=CORPUS_DIR):
+    """
+    Returns the process-wide corpus artifact, or None if none has been built.
+    Publishing a rebuilt artifact replaces CURRENT, which triggers a remap.
+    """
+    global _corpus, _corpus_stat
+    key = snapshots.pointer_key(path)
+    if key is None:
+        return None
+    stat = (path, *key)
+    if stat != _corpus_stat:
+        _corpus = load_corpus(path)
+        _corpus_stat = stat
+    return _corpus
+
+
+if __name__ == "__main__":
+    import argparse
+    from config.config import BOOKS_FOLDER_PATH
+
+    parser = argparse.ArgumentParser(description="Build the precompiled corpus artifact from the PDF library.")
+    parser.add_argument("--books", default=BOOKS_FOLDER_PATH, help="folder of PDFs to compile")
+    parser.add_argument("--out", default=CORPUS_DIR, help="artifact directory to write")
+    parser.add_argument("--embed", action="store_true", help="also store Cohere document embeddings")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="[LOG] %(message)s")
+
+    embed_fn = None
+    if args.embed:
+        from models.clients import get_client
+        from models.ingest_pipeline import cohere_document_embedder, call_with_retries, get_rate_limiter
+
+        embed = cohere_document_embedder(get_client("cohere"))
+        limiter = get_rate_limiter("cohere")
+        embed_fn = lambda texts: call_with_retries(lambda: embed(texts), limiter=limiter)
+
+    meta = build_corpus(args.books, args.out, embed_fn)
+    print(f"Wrote {meta['count']} chunks from {len(meta['files'])} files to {args.out}")
@@ -0,0 +1,36 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from config.config import APP_DB_PATH
+
+# One connection per thread; WAL lets every gunicorn worker read while one writes
+_local = threading.local()
+
+
+def get_connection(path=APP_DB_PATH):
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        connections[path] = conn
+    return conn
+
+
+@contextmanager
+def transaction(path=APP_DB_PATH):
+    """Write transaction that takes the database write lock up front (BEGIN IMMEDIATE)."""
+    conn = get_connection(path)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
@@ -0,0 +1,92 @@
+import os
+import json
+import time
+import uuid
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows dev server: a single process, which always leads
+    fcntl = None
+
+from config.config import INGEST_LOCK_PATH, INGEST_STATUS_PATH, INGEST_POLL_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Identifies one server start. gunicorn.conf.py sets it in the master so every worker
+# shares it; a standalone process gets its own.
+RUN_ID = os.environ.setdefault("INGEST_RUN_ID", uuid.uuid4().hex)
+
+
+def read_status():
+    """Returns this run's ingestion status ({"state", "pid", ...}) or None if nobody has started."""
+    try:
+        with open(INGEST_STATUS_PATH, "r") as f:
+            status = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return status if status.get("run_id") == RUN_ID else None
+
+
+def current_state():
+    status = read_status()
+    return status["state"] if status else "pending"
+
+
+def _write_status(state, **extra):
+    status = {"run_id": RUN_ID, "state": state, "pid": os.getpid(), "updated_at": time.time(), **extra}
+    tmp = f"{INGEST_STATUS_PATH}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(status, f)
+    os.replace(tmp, INGEST_STATUS_PATH)
+
+
+def _try_lock():
+    """Takes the ingest lock without blocking. Returns the open lock file, or None if held elsewhere."""
+    f = open(INGEST_LOCK_PATH, "a")
+    if fcntl is None:
+        return f
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return f
+    except BlockingIOError:
+        f.close()
+        return None
+
+
+def run_ingest_once(ingest_fn):
+    """
+    Runs ingest_fn in exactly one worker per server start and waits for it everywhere else.
+    The lock is released if the leader dies, so a waiting worker takes over an unfinished run.
+    Returns the shared outcome: "ready" or "failed".
+    """
+    announced = False
+    while True:
+        status = read_status()
+        if status and status["state"] in ("ready", "failed"):
+            return status["state"]
+
+        lock = _try_lock()
+        if lock is None:
+            if not announced:
+                print(f"[LOG] Waiting for worker {status['pid'] if status else '?'} to finish ingestion...")
+                announced = True
+            time.sleep(INGEST_POLL_INTERVAL)
+            continue
+
+        try:
+            # The previous leader may have finished between the status check and the lock
+            status = read_status()
+            if status and status["state"] in ("ready", "failed"):
+                return status["state"]
+
+            _write_status("ingesting")
+            try:
+                ingest_fn()
+            except Exception as e:
+                _write_status("failed", error=str(e))
+                raise
+            _write_status("ready")
+            return "ready"
+        finally:
+            lock.close()
@@ -0,0 +1,81 @@
+import os
+import json
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+
+def file_sha256(file_path, block_size=1 << 20):
+    """Returns the SHA-256 hex digest of a file, read in 1 MB blocks."""
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def chunk_id(text):
+    """Stable, content-derived vector ID for a chunk of text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+def load_manifest(path):
+    """
+    Loads the ingestion manifest:
+    {"version": 1, "target": str, "chunker": str,
+     "files": {filename: {"sha256", "size", "mtime", "chunk_ids"}}}
+    target names the vector index the manifest describes (see vector_store_target).
+    A missing, unreadable or legacy manifest is treated as empty.
+    """
+    try:
+        with open(path, "r") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        manifest = {}
+
+    if manifest.get("version") != MANIFEST_VERSION:
+        manifest = {"version": MANIFEST_VERSION, "files": {}}
+    return manifest
+
+
+def save_manifest(path, manifest):
+    """Writes the manifest atomically so a crash never leaves a half-written file."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, path)
+
+
+def file_unchanged(entry, file_path):
+    """
+    Cheap change check: size and mtime first, falling back to the content hash
+    so a touched-but-identical file is not re-embedded.
+    Returns (unchanged, sha256) where sha256 is None if it was not computed.
+    """
+    st = os.stat(file_path)
+    if entry and entry.get("size") == st.st_size and entry.get("mtime") == st.st_mtime_ns:
+        return True, entry.get("sha256")
+
+    sha = file_sha256(file_path)
+    return bool(entry) and entry.get("sha256") == sha, sha
+
+
+def manifest_entry(file_path, sha, chunk_ids):
+    st = os.stat(file_path)
+    return {
+        "sha256": sha,
+        "size": st.st_size,
+        "mtime": st.st_mtime_ns,
+        "chunk_ids": chunk_ids,
+    }
+
+
+def all_chunk_ids(manifest):
+    """Union of chunk IDs referenced by every file in the manifest."""
+    ids = set()
+    for entry in manifest["files"].values():
+        ids.update(entry["chunk_ids"])
+    return ids
@@ -0,0 +1,145 @@
+import os
+import time
+import json
+import contextvars
+from contextlib import contextmanager
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+from config.config import TRACE_LOG_THRESHOLD
+
+# Under gunicorn every worker writes its samples to PROMETHEUS_MULTIPROC_DIR (set in
+# gunicorn.conf.py) and /metrics aggregates them, so a scrape sees the whole server.
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30)
+
+STAGE_SECONDS = Histogram(
+    "qads_stage_seconds",
+    "Time spent in each stage of answering a chat request",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    "qads_request_seconds",
+    "End-to-end chat request latency",
+    ["endpoint"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS = Counter(
+    "qads_requests_total",
+    "Chat requests by how they were answered",
+    ["endpoint", "outcome"],
+)
+CACHE_LOOKUPS = Counter(
+    "qads_cache_lookups_total",
+    "Cache lookups by cache and result (hit ratio = hit / (hit + miss))",
+    ["cache", "result"],
+)
+COALESCED = Counter(
+    "qads_coalesced_total",
+    "Requests that joined an identical retrieval, web search or LLM generation already in flight",
+    ["stage"],
+)
+INGEST_FILES = Gauge(
+    "qads_ingest_files",
+    "PDF files in the current ingestion run",
+    ["status"],
+    multiprocess_mode="livemax",
+)
+INGEST_CHUNKS = Counter(
+    "qads_ingest_chunks_total",
+    "Chunks upserted into the vector store",
+)
+INGEST_STATE = Gauge(
+    "qads_ingest_state",
+    "1 for the current state of startup ingestion",
+    ["state"],
+    multiprocess_mode="mostrecent",
+)
+
+INGEST_STATES = ("pending", "ingesting", "ready", "failed")
+
+# Stage durations of the request being served; a dict so worker threads started
+# with a copy of the context still add to the same trace.
+_trace = contextvars.ContextVar("trace", default=None)
+
+
+def start_trace(endpoint):
+    trace = {"endpoint": endpoint, "start": time.perf_counter(), "stages": {}, "coalesced": {}}
+    _trace.set(trace)
+    return trace
+
+
+def observe_stage(stage, seconds):
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    trace = _trace.get()
+    if trace is not None:
+        trace["stages"][stage] = round(trace["stages"].get(stage, 0.0) + seconds, 4)
+
+
+@contextmanager
+def timed_stage(stage):
+    """Times the enclosed block as one stage of the current request."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def record_cache(cache, hit):
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def record_coalesced(stage, seconds):
+    """Counts a request that joined work already in flight and records its wait on its trace."""
+    COALESCED.labels(stage).inc()
+    trace = _trace.get()
+    if trace is not None:
+        trace["coalesced"][stage] = round(trace["coalesced"].get(stage, 0.0) + seconds, 4)
+
+
+def finish_trace(outcome):
+    """
+    Records the current request's total latency and outcome. Returns the trace as one
+    JSON line when it took at least TRACE_LOG_THRESHOLD seconds, otherwise None.
+    """
+    trace = _trace.get()
+    if trace is None:
+        return None
+    _trace.set(None)
+    total = time.perf_counter() - trace["start"]
+    REQUEST_SECONDS.labels(trace["endpoint"]).observe(total)
+    REQUESTS.labels(trace["endpoint"], outcome).inc()
+    if total < TRACE_LOG_THRESHOLD:
+        return None
+    return json.dumps({
+        "endpoint": trace["endpoint"],
+        "outcome": outcome,
+        "total": round(total, 4),
+        "stages": trace["stages"],
+        "coalesced": trace["coalesced"],
+    })
+
+
+def set_ingest_state(state):
+    for name in INGEST_STATES:
+        INGEST_STATE.labels(name).set(1 if name == state else 0)
+
+
+def render_metrics():
+    """Returns (body, content type) in the Prometheus text exposition format."""
+    registry = REGISTRY
+    if MULTIPROCESS:
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -1,55 +1,129 @@
 import os
 import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import chain
 import fitz  # PyMuPDF
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from config.config import PDF_EXTRACT_WORKERS, PDF_PAGES_PER_TASK
+from utils.chunker import chunk_pages
 
 logger = logging.getLogger(__name__)
 
-def load_and_chunk_pdfs(folder_path):
-    """
-    Loads all PDF files from a folder using the robust PyMuPDF library,
-    extracts their text, and splits it into manageable chunks.
-    """
+
+def list_pdf_files(folder_path):
+    """Returns the sorted PDF file names in a folder, validating the folder first."""
     if not os.path.isdir(folder_path):
         logger.error(f"The path '{folder_path}' is not a valid directory.")
         raise FileNotFoundError(f"Invalid books folder: {folder_path}")
 
-    all_chunks = []
-    pdf_files = [f for f in os.listdir(folder_path) if f.lower().endswith(".pdf")]
+    pdf_files = sorted(f for f in os.listdir(folder_path) if f.lower().endswith(".pdf"))
 
     if not pdf_files:
         logger.warning(f"No PDF files found in '{folder_path}'.")
         raise RuntimeError("No PDF files found to index.")
 
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
-        length_function=len
-    )
+    return pdf_files
 
-    files_processed = 0
+
+def iter_pages(file_path, start=0, end=None):
+    """Yields (page_no, text) for pages [start, end) of a PDF, one page at a time."""
+    with fitz.open(file_path) as doc:
+        end = doc.page_count if end is None else end
+        for page_no in range(start, end):
+            yield page_no, doc[page_no].get_text()
+
+
+def extract_pages(file_path, start=0, end=None):
+    """Extracts [(page_no, text)] for pages [start, end) of a PDF."""
+    return list(iter_pages(file_path, start, end))
+
+
+def page_ranges(file_path, pages_per_task=PDF_PAGES_PER_TASK):
+    """Splits a PDF into page ranges so large books can be parsed by several workers."""
+    with fitz.open(file_path) as doc:
+        count = doc.page_count
+    return [(s, min(s + pages_per_task, count)) for s in range(0, count, pages_per_task)] or [(0, 0)]
+
+
+def load_and_chunk_pdf(file_path, source=None):
+    """Splits a single PDF into Chunks, streaming its pages through the chunker."""
+    return list(chunk_pages(iter_pages(file_path), source or os.path.basename(file_path)))
+
+
+def iter_chunked_pdfs(folder_path, pdf_files=None, workers=PDF_EXTRACT_WORKERS):
+    """
+    Yields (pdf_file, chunks) as each PDF finishes, so callers can start embedding
+    before the whole library is parsed. chunks is a list of utils.chunker.Chunk (text
+    plus source file, page range and offsets), or None if the file could not be read.
+
+    With workers > 1, page ranges of every PDF are extracted in a process pool and
+    chunked in page order, so the chunks are identical to the serial path. Files are
+    yielded in completion order.
+    """
+    if pdf_files is None:
+        pdf_files = list_pdf_files(folder_path)
+
+    if workers <= 1:
+        for pdf_file in pdf_files:
+            try:
+                yield pdf_file, load_and_chunk_pdf(os.path.join(folder_path, pdf_file), pdf_file)
+            except Exception as e:
+                logger.warning(f"Could not process '{pdf_file}'. Skipping. Error: {e}")
+                yield pdf_file, None
+        return
+
+    # spawn: forking a threaded server process can deadlock the children
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        futures = {}
+        parts = {}
+        for pdf_file in pdf_files:
+            file_path = os.path.join(folder_path, pdf_file)
+            try:
+                ranges = page_ranges(file_path)
+            except Exception as e:
+                logger.warning(f"Could not process '{pdf_file}'. Skipping. Error: {e}")
+                yield pdf_file, None
+                continue
+            parts[pdf_file] = [None] * len(ranges)
+            for i, (start, end) in enumerate(ranges):
+                futures[pool.submit(extract_pages, file_path, start, end)] = (pdf_file, i)
+
+        for future in as_completed(futures):
+            pdf_file, i = futures[future]
+            file_parts = parts.get(pdf_file)
+            if file_parts is None:
+                continue  # an earlier range of this file already failed
+
+            try:
+                file_parts[i] = future.result()
+            except Exception as e:
+                logger.warning(f"Could not process '{pdf_file}'. Skipping. Error: {e}")
+                del parts[pdf_file]
+                yield pdf_file, None
+                continue
+
+            if all(part is not None for part in file_parts):
+                yield pdf_file, list(chunk_pages(chain.from_iterable(parts.pop(pdf_file)), pdf_file))
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def load_and_chunk_pdfs(folder_path, workers=PDF_EXTRACT_WORKERS):
+    """
+    Loads all PDF files from a folder using the robust PyMuPDF library,
+    extracts their text page by page, and splits it into Chunks.
+    """
+    pdf_files = list_pdf_files(folder_path)
     logger.info("Initializing PDF processing...")
 
-    for i, pdf_file in enumerate(pdf_files):
-        file_path = os.path.join(folder_path, pdf_file)
-        logger.info(f"Processing {pdf_file} ({i + 1}/{len(pdf_files)})")
-
-        try:
-            with fitz.open(file_path) as doc:
-                text = ""
-                for page in doc:
-                    page_text = page.get_text()
-                    if page_text:
-                        text += page_text
-
-            if text.strip():
-                chunks = text_splitter.split_text(text)
-                all_chunks.extend(chunks)
-                files_processed += 1
-
-        except Exception as e:
-            logger.warning(f"Could not process '{pdf_file}'. Skipping. Error: {e}")
-            continue
+    all_chunks = []
+    files_processed = 0
+    for pdf_file, chunks in iter_chunked_pdfs(folder_path, pdf_files, workers=workers):
+        if chunks:
+            all_chunks.extend(chunks)
+            files_processed += 1
 
     logger.info(f"Successfully processed and chunked {files_processed} out of {len(pdf_files)} PDF files.")
     return all_chunks
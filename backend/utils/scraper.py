@@ -1,41 +1,174 @@
-import requests
-from bs4 import BeautifulSoup
-from serpapi import GoogleSearch
-import os
+import time
+import codecs
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from html.parser import HTMLParser
 
-def perform_web_search(query: str, max_pages: int = 2) -> str:
-    try:
-        params = {
-            "api_key": os.environ.get("SERPAPI_API_KEY"),
-            "engine": "google",
-            "q": query,
-        }
-        search = GoogleSearch(params)
-        results = search.get_dict()
-        organic_results = results.get("organic_results", [])
-        
-        if not organic_results:
+from config.config import (
+    get_serpapi_api_key,
+    WEB_SEARCH_URL,
+    WEB_MAX_PAGES,
+    WEB_FETCH_CONCURRENCY,
+    WEB_SEARCH_DEADLINE,
+    WEB_MAX_BYTES,
+    WEB_PAGE_MAX_CHARS,
+    WEB_CACHE_TTL,
+    WEB_CACHE_SIZE,
+)
+from utils.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Small thread-safe LRU whose entries expire after `ttl` seconds."""
+
+    def __init__(self, capacity=WEB_CACHE_SIZE, ttl=WEB_CACHE_TTL):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+
+_search_cache = TTLCache()
+_page_cache = TTLCache()
+
+
+class _TextExtractor(HTMLParser):
+    """Incremental HTML-to-text parser: fed chunk by chunk as the body streams in."""
+
+    SKIP = {"script", "style", "nav", "footer", "header", "aside", "noscript", "svg", "template"}
+
+    def __init__(self, max_chars):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.parts = []
+        self.size = 0
+        self._skip_depth = 0
+
+    @property
+    def full(self):
+        return self.size >= self.max_chars
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skip_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP and self._skip_depth:
+            self._skip_depth -= 1
+
+    def handle_data(self, data):
+        if self._skip_depth or self.full:
+            return
+        text = " ".join(data.split())
+        if text:
+            self.parts.append(text)
+            self.size += len(text) + 1
+
+    def text(self):
+        return " ".join(self.parts)[:self.max_chars]
+
+
+async def search(query, client, max_results=WEB_MAX_PAGES):
+    """Returns the top organic result links for a query via SerpApi, cached per query."""
+    key = " ".join(query.lower().split())
+    links = _search_cache.get(key)
+    record_cache("web_search", links is not None)
+    if links is not None:
+        return links
+
+    api_key = get_serpapi_api_key()
+    if not api_key:
+        logger.warning("SerpApi API key not found. Web search will be disabled.")
+        return []
+    response = await client.get(WEB_SEARCH_URL, params={"q": query, "api_key": api_key, "engine": "google"})
+    response.raise_for_status()
+    links = [r["link"] for r in response.json().get("organic_results", [])[:max_results] if r.get("link")]
+    _search_cache.put(key, links)
+    return links
+
+
+async def fetch_page_text(url, client, max_bytes=WEB_MAX_BYTES, max_chars=WEB_PAGE_MAX_CHARS):
+    """
+    Streams an HTML page and extracts its text while it downloads. Reading stops at
+    max_bytes or once max_chars of text are collected. Results are cached per URL.
+    """
+    text = _page_cache.get(url)
+    record_cache("web_page", text is not None)
+    if text is not None:
+        return text
+
+    parser = _TextExtractor(max_chars)
+    received = 0
+    async with client.stream("GET", url) as response:
+        response.raise_for_status()
+        if "html" not in response.headers.get("content-type", "html"):
             return ""
+        decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+        async for chunk in response.aiter_bytes():
+            received += len(chunk)
+            parser.feed(decoder.decode(chunk))
+            if received >= max_bytes or parser.full:
+                break
+    parser.close()
+
+    text = parser.text()
+    _page_cache.put(url, text)
+    return text
+
+
+async def aperform_web_search(query, client, max_pages=WEB_MAX_PAGES,
+                              concurrency=WEB_FETCH_CONCURRENCY, deadline=WEB_SEARCH_DEADLINE):
+    """
+    Searches the web and returns the text of the top pages as prompt context.
+    Pages are fetched concurrently (at most `concurrency` at once); whatever has arrived
+    when `deadline` seconds have passed is used and slower fetches are cancelled.
+    """
+    loop = asyncio.get_running_loop()
+    stop_at = loop.time() + deadline
+    try:
+        links = await asyncio.wait_for(search(query, client, max_pages), deadline)
+    except Exception as e:
+        logger.warning(f"Web search failed: {e}")
+        return ""
+    if not links:
+        return ""
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(url):
+        async with semaphore:
+            return await fetch_page_text(url, client)
+
+    tasks = [asyncio.ensure_future(fetch(url)) for url in links]
+    done, pending = await asyncio.wait(tasks, timeout=max(0.0, stop_at - loop.time()))
+    for task in pending:
+        task.cancel()
 
-        scraped_texts = []
-        urls_to_scrape = [result['link'] for result in organic_results[:max_pages]]
-        
-        for url in urls_to_scrape:
-            try:
-                response = requests.get(url, timeout=10, headers={'User-Agent': 'Mozilla/5.0'})
-                response.raise_for_status()
-                
-                soup = BeautifulSoup(response.content, 'html.parser')
-                for element in soup(["script", "style", "nav", "footer", "header", "aside"]):
-                    element.decompose()
-                
-                text = soup.get_text(separator=' ', strip=True)
-                scraped_texts.append(f"--- Content from {url} ---\n{text}")
-            
-            except requests.RequestException:
-                continue
-
-        return "\n\n".join(scraped_texts)
-
-    except Exception:
-        return ""
\ No newline at end of file
+    pages = []
+    for url, task in zip(links, tasks):
+        if task in done and not task.exception() and task.result():
+            pages.append(f"--- Content from {url} ---\n{task.result()}")
+    return "\n\n".join(pages)
@@ -0,0 +1,116 @@
+import time
+import asyncio
+
+
+class _Broadcast:
+    """Items produced by one in-flight stream, replayed to every subscriber from the start."""
+
+    def __init__(self):
+        self.items = []
+        self.done = False
+        self.error = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        # Waiters hold the old event; a fresh one is armed for the next change
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def publish(self, item):
+        self.items.append(item)
+        self._notify()
+
+    def finish(self, error=None):
+        self.done = True
+        self.error = error
+        self._notify()
+
+    async def subscribe(self):
+        i = 0
+        while True:
+            changed = self._changed
+            if i < len(self.items):
+                yield self.items[i]
+                i += 1
+                continue
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await changed.wait()
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent work within one event loop.
+
+    call() runs a coroutine once per key while it is in flight and hands its result (or
+    exception) to every caller that asked for the same key meanwhile. stream() does the
+    same for an async generator: one task drains it and every subscriber receives all of
+    its items. The shared work runs in its own task, so a caller that disconnects does
+    not cancel it for the others. Keys are forgotten as soon as the work finishes.
+
+    The shared task runs in the first caller's context, so its stage timings land on that
+    caller's trace only; joiners report the join and how long they waited instead.
+    """
+
+    def __init__(self, on_coalesced=None):
+        # on_coalesced(key, seconds) is called in a joining caller's context once it has
+        # waited `seconds` for work that was already in flight
+        self._calls = {}
+        self._streams = {}
+        self.on_coalesced = on_coalesced
+
+    def _forget(self, table, key, value):
+        if table.get(key) is value:
+            del table[key]
+
+    def _joined(self, key, start):
+        if self.on_coalesced:
+            self.on_coalesced(key, time.perf_counter() - start)
+
+    async def call(self, key, fn, *args):
+        """Returns await fn(*args), sharing one call between concurrent callers with the same key."""
+        task = self._calls.get(key)
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(fn(*args))
+            task.add_done_callback(lambda t: self._forget(self._calls, key, t))
+            return await asyncio.shield(task)
+
+        start = time.perf_counter()
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._joined(key, start)
+
+    def stream(self, key, agen_fn, *args):
+        """Returns an async iterator over agen_fn(*args), shared with concurrent callers with the same key."""
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            broadcast = self._streams[key] = _Broadcast()
+            task = asyncio.ensure_future(self._pump(agen_fn(*args), broadcast))
+            task.add_done_callback(lambda t: self._forget(self._streams, key, broadcast))
+            return broadcast.subscribe()
+        return self._join_stream(key, broadcast)
+
+    async def _join_stream(self, key, broadcast):
+        start = time.perf_counter()
+        try:
+            async for item in broadcast.subscribe():
+                yield item
+        finally:
+            self._joined(key, start)
+
+    async def _pump(self, agen, broadcast):
+        # Subscribers must always be released, even when the pump itself is cancelled
+        error = None
+        try:
+            async for item in agen:
+                broadcast.publish(item)
+        except asyncio.CancelledError:
+            error = RuntimeError("Shared stream was cancelled")
+            raise
+        except Exception as e:
+            error = e
+        finally:
+            broadcast.finish(error)
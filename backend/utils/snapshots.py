@@ -0,0 +1,118 @@
+import os
+import time
+import uuid
+import shutil
+import logging
+
+logger = logging.getLogger(__name__)
+
+# File naming the live version; replaced atomically, so it gets a fresh inode on every publish
+POINTER = "CURRENT"
+# Superseded versions stay on disk this long, so a reader that resolved CURRENT just
+# before a publish can still open their files
+GRACE_SECONDS = 300
+# Staging directories this old were left behind by a crashed build
+STALE_STAGING_SECONDS = 24 * 3600
+_STAGING_PREFIX = ".tmp-"
+
+
+def staging_dir(root):
+    """Creates an empty directory under root to build a new version in."""
+    path = os.path.join(root, f"{_STAGING_PREFIX}{uuid.uuid4().hex}")
+    os.makedirs(path)
+    return path
+
+
+def publish(root, staged, prefix, grace=GRACE_SECONDS, legacy=()):
+    """
+    Moves a fully written staging directory into place as root/<prefix><time>_<pid>
+    and points CURRENT at it. Readers see either the old version or the new one,
+    never a partial build. Returns the new version's path.
+    """
+    name = f"{prefix}{time.time_ns()}_{os.getpid()}"
+    os.rename(staged, os.path.join(root, name))
+    tmp = os.path.join(root, f"{POINTER}.{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        f.write(name)
+    os.replace(tmp, os.path.join(root, POINTER))
+    prune(root, prefix, grace, legacy)
+    return os.path.join(root, name)
+
+
+def current_version(root):
+    """Path of the version CURRENT points at, or None if nothing has been published."""
+    try:
+        with open(os.path.join(root, POINTER), "r") as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return os.path.join(root, name) if name else None
+
+
+def pointer_key(root):
+    """Changes whenever a new version is published; None if nothing has been published."""
+    try:
+        st = os.stat(os.path.join(root, POINTER))
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns
+
+
+def load_current(root, load, attempts=3):
+    """
+    Returns load(path of the current version), or None if nothing has been published.
+    A version pruned between reading CURRENT and opening its files raises
+    FileNotFoundError; CURRENT has moved on by then, so it is read again.
+    """
+    for attempt in range(attempts):
+        path = current_version(root)
+        if path is None:
+            return None
+        try:
+            return load(path)
+        except FileNotFoundError:
+            if attempt == attempts - 1:
+                raise
+    return None
+
+
+def _version_time(name, prefix):
+    try:
+        return int(name[len(prefix):].split("_")[0])
+    except ValueError:
+        return 0
+
+
+def prune(root, prefix, grace=GRACE_SECONDS, legacy=()):
+    """
+    Removes superseded versions. The version published just before the current one is
+    always kept; older ones once the version that replaced them is more than grace
+    seconds old. Stale staging directories are removed too, and so are the top-level
+    files named in legacy, left by a flat, pre-versioned layout; nothing else in root
+    is touched.
+    """
+    current = current_version(root)
+    current = os.path.basename(current) if current else None
+    now = time.time()
+
+    versions = sorted((e for e in os.listdir(root) if e.startswith(prefix)), key=lambda e: _version_time(e, prefix))
+    superseded = [e for e in versions if e != current]
+    for i, name in enumerate(superseded[:-1]):
+        successor = superseded[i + 1]
+        try:
+            replaced_for = now - os.stat(os.path.join(root, successor)).st_mtime
+        except FileNotFoundError:
+            continue
+        if replaced_for > grace:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+    for entry in os.listdir(root):
+        path = os.path.join(root, entry)
+        try:
+            if entry.startswith(_STAGING_PREFIX):
+                if now - os.stat(path).st_mtime > STALE_STAGING_SECONDS:
+                    shutil.rmtree(path, ignore_errors=True)
+            elif entry in legacy and os.path.isfile(path):
+                os.remove(path)
+        except FileNotFoundError:
+            continue
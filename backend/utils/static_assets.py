@@ -0,0 +1,308 @@
+import os
+import re
+import gzip
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+import mimetypes
+import posixpath
+
+try:
+    import brotli
+except ImportError:  # only gzip variants are written
+    brotli = None
+
+from config.config import FRONTEND_DIR, STATIC_BUILD_DIR, STATIC_BUILD_GRACE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+BUILD_VERSION = 1
+COMPRESSIBLE = {".html", ".js", ".css", ".svg", ".json", ".txt"}
+# Smaller files gain nothing from compression once headers are counted
+MIN_COMPRESS_SIZE = 256
+# Preferred first when the client accepts several
+ENCODINGS = ("br", "gzip")
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+# Relative module specifiers in JS: `import ... from "./x.js"`, `export ... from`, `import("./x.js")`
+_JS_IMPORT_RE = re.compile(r"""(\b(?:from|import)\s*\(?\s*)(["'])(\.{1,2}/[^"']+)\2""")
+# Root-relative asset references in HTML attributes and inline module imports
+_STATIC_REF_RE = re.compile(r"""(["'])/static/([^"'?#]+)\1""")
+
+
+class StaticBundle:
+    """
+    A built frontend: every page and asset with precompressed variants and a manifest.
+
+    Layout of a build directory (one per source fingerprint under STATIC_BUILD_DIR):
+        manifest.json   served path -> stored file, media type, ETag, immutable flag, encodings
+        files/          pages under their own names, assets as name.<hash>.ext, each
+                        with .br / .gz siblings where compression pays off
+
+    Assets are served both under their fingerprinted name (cached for a year) and their
+    plain name (revalidated with the ETag), so stale pages and hand-written URLs still work.
+    Fingerprinted assets of the retained previous builds are served too, so a page loaded
+    before a deploy can still fetch the assets it references.
+    """
+
+    def __init__(self, path, manifest, retained=()):
+        self.path = path
+        self.manifest = manifest
+        self.files = {}
+        for build in (*retained, self):
+            for served, entry in build.manifest["files"].items():
+                if build is self or entry["immutable"]:
+                    self.files[served] = dict(entry, file=os.path.join(build.path, "files", entry["path"]))
+
+    def lookup(self, served_path):
+        return self.files.get(served_path)
+
+    def select(self, entry, accept_encoding):
+        """Returns (file path, content encoding or None) of the best variant the client accepts."""
+        accepted = _accepted_encodings(accept_encoding)
+        for encoding in ENCODINGS:
+            if encoding in entry["encodings"] and accepted.get(encoding, accepted.get("*", 0)) > 0:
+                suffix = ".br" if encoding == "br" else ".gz"
+                return entry["file"] + suffix, encoding
+        return entry["file"], None
+
+
+def _accepted_encodings(header):
+    accepted = {}
+    for part in (header or "").split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[name] = q
+    return accepted
+
+
+def _source_files(src):
+    for root, dirs, files in os.walk(src):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in sorted(files):
+            if not name.startswith("."):
+                yield os.path.relpath(os.path.join(root, name), src).replace(os.sep, "/")
+
+
+def source_fingerprint(src=FRONTEND_DIR):
+    """Identifies the frontend sources and build settings; a build is reused while it matches."""
+    h = hashlib.sha256(f"{BUILD_VERSION}:{brotli is not None}".encode())
+    for rel in _source_files(src):
+        with open(os.path.join(src, rel), "rb") as f:
+            h.update(rel.encode() + b"\0" + hashlib.sha256(f.read()).digest())
+    return h.hexdigest()[:16]
+
+
+def _fingerprinted(rel, data):
+    stem, ext = posixpath.splitext(rel)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+
+
+def _rewrite(sources):
+    """
+    Returns {source path: (stored path, content)} with references between files pointing
+    at fingerprinted names. A module's hash covers the rewritten imports, so changing
+    auth.js also renames every module that imports it.
+    """
+    built = {}
+    resolving = set()
+
+    def asset_name(rel):
+        if rel not in built:
+            if rel in resolving:
+                raise RuntimeError(f"Import cycle through {rel}")
+            resolving.add(rel)
+            data = sources[rel]
+            if rel.endswith(".js"):
+                data = _JS_IMPORT_RE.sub(lambda m: js_import(m, rel), data.decode("utf-8")).encode("utf-8")
+            built[rel] = (_fingerprinted(rel, data), data)
+            resolving.discard(rel)
+        return built[rel][0]
+
+    def js_import(match, importer):
+        base = posixpath.dirname(importer)
+        target = posixpath.normpath(posixpath.join(base, match.group(3)))
+        if target not in sources or target.endswith(".html"):
+            return match.group(0)
+        spec = posixpath.relpath(asset_name(target), base or ".")
+        if not spec.startswith("../"):
+            spec = "./" + spec
+        return f"{match.group(1)}{match.group(2)}{spec}{match.group(2)}"
+
+    def static_ref(match):
+        rel = match.group(2)
+        if rel not in sources or rel.endswith(".html"):
+            return match.group(0)
+        return f"{match.group(1)}/static/{asset_name(rel)}{match.group(1)}"
+
+    for rel in sources:
+        if rel.endswith(".html"):
+            html = _STATIC_REF_RE.sub(static_ref, sources[rel].decode("utf-8"))
+            built[rel] = (rel, html.encode("utf-8"))
+        else:
+            asset_name(rel)
+    return built
+
+
+def _write_variants(files_dir, stored, data):
+    """Writes the file and its compressed variants; returns the encodings written."""
+    path = os.path.join(files_dir, stored)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+    encodings = []
+    if posixpath.splitext(stored)[1] not in COMPRESSIBLE or len(data) < MIN_COMPRESS_SIZE:
+        return encodings
+    variants = {"gzip": (".gz", gzip.compress(data, compresslevel=9, mtime=0))}
+    if brotli is not None:
+        variants["br"] = (".br", brotli.compress(data, quality=11))
+    for encoding in ENCODINGS:
+        if encoding in variants:
+            suffix, compressed = variants[encoding]
+            if len(compressed) < len(data):
+                with open(path + suffix, "wb") as f:
+                    f.write(compressed)
+                encodings.append(encoding)
+    return encodings
+
+
+def build_static_assets(src=FRONTEND_DIR, out_dir=STATIC_BUILD_DIR):
+    """
+    Builds the frontend into out_dir/<source fingerprint> and returns its StaticBundle.
+    Builds are written to a temporary directory and renamed into place, so workers
+    building at the same time never serve a partial build. Superseded builds are
+    removed once they have been replaced for longer than the grace period.
+    """
+    fingerprint = source_fingerprint(src)
+    final = os.path.join(out_dir, fingerprint)
+    tmp = os.path.join(out_dir, f".tmp-{uuid.uuid4().hex}")
+    files_dir = os.path.join(tmp, "files")
+    os.makedirs(files_dir)
+
+    try:
+        sources = {}
+        for rel in _source_files(src):
+            with open(os.path.join(src, rel), "rb") as f:
+                sources[rel] = f.read()
+
+        files = {}
+        for rel, (stored, data) in _rewrite(sources).items():
+            entry = {
+                "path": stored,
+                "type": mimetypes.guess_type(rel)[0] or "application/octet-stream",
+                "etag": hashlib.sha256(data).hexdigest()[:20],
+                "encodings": _write_variants(files_dir, stored, data),
+                "immutable": False,
+            }
+            files[rel] = entry
+            if stored != rel:
+                files[stored] = dict(entry, immutable=True)
+
+        manifest = {"version": BUILD_VERSION, "source": fingerprint, "brotli": brotli is not None, "files": files}
+        with open(os.path.join(tmp, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+
+        try:
+            os.rename(tmp, final)
+        except OSError:
+            # Another worker finished the same build first
+            if not os.path.exists(os.path.join(final, "manifest.json")):
+                raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    prune_static_builds(out_dir, fingerprint)
+    return load_static_assets(final, _retained_builds(out_dir, fingerprint))
+
+
+def _builds(out_dir):
+    """Complete builds under out_dir as [(built at, name)], oldest first."""
+    builds = []
+    if not os.path.isdir(out_dir):
+        return builds
+    for name in os.listdir(out_dir):
+        if name.startswith("."):
+            continue
+        try:
+            builds.append((os.stat(os.path.join(out_dir, name, "manifest.json")).st_mtime, name))
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+    return sorted(builds)
+
+
+def prune_static_builds(out_dir, current, grace=STATIC_BUILD_GRACE_SECONDS):
+    """
+    Removes superseded builds once the build that replaced them is more than grace
+    seconds old. The current build and the newest superseded one are always kept.
+    """
+    now = time.time()
+    superseded = [(built, name) for built, name in _builds(out_dir) if name != current]
+    for (_, name), (replaced_at, _) in zip(superseded, superseded[1:]):
+        if now - replaced_at > grace:
+            shutil.rmtree(os.path.join(out_dir, name), ignore_errors=True)
+
+
+def _retained_builds(out_dir, current):
+    builds = []
+    for _, name in _builds(out_dir):
+        if name != current:
+            bundle = load_static_assets(os.path.join(out_dir, name))
+            if bundle is not None:
+                builds.append(bundle)
+    return builds
+
+
+def load_static_assets(path, retained=()):
+    """
+    Returns the StaticBundle built at path, or None if there is no complete build there.
+    retained: bundles of previous builds whose fingerprinted assets are served as well.
+    """
+    try:
+        with open(os.path.join(path, "manifest.json"), "r") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if manifest.get("version") != BUILD_VERSION:
+        return None
+    return StaticBundle(path, manifest, retained)
+
+
+def ensure_static_assets(src=FRONTEND_DIR, out_dir=STATIC_BUILD_DIR):
+    """Returns the build for the current frontend sources, building it if it is missing."""
+    fingerprint = source_fingerprint(src)
+    bundle = load_static_assets(os.path.join(out_dir, fingerprint), _retained_builds(out_dir, fingerprint))
+    if bundle is not None:
+        return bundle
+    print(f"[LOG] Building static assets from {src}...")
+    bundle = build_static_assets(src, out_dir)
+    if brotli is None:
+        logger.warning("brotli is not installed; serving gzip variants only")
+    return bundle
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build fingerprinted, precompressed frontend assets.")
+    parser.add_argument("--src", default=FRONTEND_DIR, help="frontend source directory")
+    parser.add_argument("--out", default=STATIC_BUILD_DIR, help="directory to write builds into")
+    args = parser.parse_args()
+
+    bundle = build_static_assets(args.src, args.out)
+    assets = sum(1 for entry in bundle.manifest["files"].values() if entry["immutable"])
+    print(f"[LOG] Built {assets} fingerprinted assets into {bundle.path}")
@@ -0,0 +1,319 @@
+import os
+import json
+import logging
+import sqlite3
+from collections import Counter
+from datetime import datetime
+
+from utils.db import get_connection, transaction
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS threads (
+    username TEXT NOT NULL,
+    thread_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (username, thread_id)
+);
+CREATE INDEX IF NOT EXISTS idx_threads_recent ON threads (username, updated_at DESC, thread_id DESC);
+CREATE TABLE IF NOT EXISTS messages (
+    username TEXT NOT NULL,
+    thread_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    ts TEXT,
+    PRIMARY KEY (username, thread_id, seq),
+    FOREIGN KEY (username, thread_id) REFERENCES threads (username, thread_id) ON DELETE CASCADE
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS thread_summaries (
+    username TEXT NOT NULL,
+    thread_id TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    covered INTEGER NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (username, thread_id),
+    FOREIGN KEY (username, thread_id) REFERENCES threads (username, thread_id) ON DELETE CASCADE
+);
+CREATE TABLE IF NOT EXISTS migrated_files (
+    filename TEXT PRIMARY KEY,
+    migrated_at TEXT NOT NULL
+);
+"""
+
+
+def init_thread_store():
+    get_connection().executescript(SCHEMA)
+
+
+def _thread_row_to_dict(row, messages=None):
+    thread = {
+        "id": row["thread_id"],
+        "title": row["title"],
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+        "message_count": row["message_count"],
+    }
+    if messages is not None:
+        thread["messages"] = messages
+    return thread
+
+
+def _load_messages(conn, username, thread_id, start=0):
+    rows = conn.execute(
+        "SELECT role, content, ts FROM messages WHERE username = ? AND thread_id = ? AND seq >= ? ORDER BY seq",
+        (username, thread_id, start)
+    )
+    return [{"role": r["role"], "content": r["content"], "ts": r["ts"]} for r in rows]
+
+
+def list_thread_page(username, limit, after=None):
+    """
+    One page of a user's threads without their messages, most recently updated first.
+    `after` is the (updated_at, thread_id) of the last thread on the previous page; the
+    query walks the (username, updated_at, thread_id) index, so every page costs the same.
+    Returns (threads, next_after) where next_after is None on the last page.
+    """
+    conn = get_connection()
+    if after is None:
+        rows = conn.execute(
+            "SELECT * FROM threads WHERE username = ? "
+            "ORDER BY updated_at DESC, thread_id DESC LIMIT ?",
+            (username, limit + 1)
+        ).fetchall()
+    else:
+        rows = conn.execute(
+            "SELECT * FROM threads WHERE username = ? AND (updated_at, thread_id) < (?, ?) "
+            "ORDER BY updated_at DESC, thread_id DESC LIMIT ?",
+            (username, after[0], after[1], limit + 1)
+        ).fetchall()
+    threads = [_thread_row_to_dict(r) for r in rows[:limit]]
+    next_after = (rows[limit - 1]["updated_at"], rows[limit - 1]["thread_id"]) if len(rows) > limit else None
+    return threads, next_after
+
+
+def get_thread_meta(username, thread_id):
+    """A thread's title, timestamps and message count without its messages. None if missing."""
+    row = get_connection().execute(
+        "SELECT * FROM threads WHERE username = ? AND thread_id = ?", (username, thread_id)
+    ).fetchone()
+    return _thread_row_to_dict(row) if row else None
+
+
+def get_thread(username, thread_id):
+    """Loads a single thread without touching the user's other threads. Returns None if missing."""
+    conn = get_connection()
+    row = conn.execute(
+        "SELECT * FROM threads WHERE username = ? AND thread_id = ?", (username, thread_id)
+    ).fetchone()
+    if row is None:
+        return None
+    return _thread_row_to_dict(row, _load_messages(conn, username, thread_id))
+
+
+def _ensure_thread(conn, username, thread_id, title, now):
+    conn.execute(
+        "INSERT OR IGNORE INTO threads (username, thread_id, title, created_at, updated_at) "
+        "VALUES (?, ?, ?, ?, ?)",
+        (username, thread_id, title, now, now)
+    )
+
+
+def create_thread(username, thread_id, title):
+    now = str(datetime.now())
+    with transaction() as conn:
+        _ensure_thread(conn, username, thread_id, title, now)
+    return {"id": thread_id, "title": title, "created_at": now, "updated_at": now, "messages": []}
+
+
+def _normalize_message(message):
+    """Accepts both server ({role, content}) and chat.js ({role: 'bot'|'user', text}) shapes."""
+    role = message.get("role", "user")
+    content = message.get("content")
+    if content is None:
+        content = message.get("text", "")
+    return ("assistant" if role == "bot" else role), content, message.get("ts")
+
+
+def _insert_messages(conn, username, thread_id, messages, start_seq):
+    conn.executemany(
+        "INSERT INTO messages (username, thread_id, seq, role, content, ts) VALUES (?, ?, ?, ?, ?, ?)",
+        [
+            (username, thread_id, start_seq + i, *_normalize_message(m))
+            for i, m in enumerate(messages)
+        ]
+    )
+
+
+def append_messages(username, thread_id, messages, title="New Chat"):
+    """
+    Appends messages to a thread (creating it with `title` if needed).
+    Cost is independent of how long the thread or the user's history already is.
+    """
+    now = str(datetime.now())
+    with transaction() as conn:
+        _ensure_thread(conn, username, thread_id, title, now)
+        count = conn.execute(
+            "SELECT message_count FROM threads WHERE username = ? AND thread_id = ?", (username, thread_id)
+        ).fetchone()[0]
+        _insert_messages(conn, username, thread_id, messages, count)
+        conn.execute(
+            "UPDATE threads SET message_count = ?, updated_at = ? WHERE username = ? AND thread_id = ?",
+            (count + len(messages), now, username, thread_id)
+        )
+
+
+def sync_messages(username, thread_id, base_seq, messages, title="Synced Chat"):
+    """
+    Delta sync of a client's copy of a thread. `base_seq` is how many of the thread's
+    messages the client already holds from the server and `messages` are the client's
+    messages after those. Any the server already stores after base_seq (same role and
+    content, e.g. a turn the chat endpoint persisted) are skipped; the rest are appended,
+    creating the thread with `title` if needed.
+
+    Returns {"seq", "messages", "appended"}: the thread's new message count and the
+    server's messages from base_seq on, which the client adopts in place of its own.
+    Returns None if base_seq is past the end of the server's thread.
+    """
+    now = str(datetime.now())
+    with transaction() as conn:
+        row = conn.execute(
+            "SELECT message_count FROM threads WHERE username = ? AND thread_id = ?", (username, thread_id)
+        ).fetchone()
+        count = row["message_count"] if row else 0
+        if base_seq > count:
+            return None
+
+        stored = Counter(
+            (m["role"], m["content"]) for m in _load_messages(conn, username, thread_id, base_seq)
+        )
+        new = []
+        for message in messages:
+            role, content, _ = _normalize_message(message)
+            if stored[(role, content)] > 0:
+                stored[(role, content)] -= 1
+            else:
+                new.append(message)
+
+        if new:
+            _ensure_thread(conn, username, thread_id, title, now)
+            _insert_messages(conn, username, thread_id, new, count)
+            count += len(new)
+            conn.execute(
+                "UPDATE threads SET message_count = ?, updated_at = ? WHERE username = ? AND thread_id = ?",
+                (count, now, username, thread_id)
+            )
+        return {"seq": count, "messages": _load_messages(conn, username, thread_id, base_seq), "appended": len(new)}
+
+
+def conversation_window(username, thread_id, recent):
+    """
+    Returns (summary, messages): the cached summary of the thread's older messages ("" if
+    none yet) and its last `recent` messages, oldest first. Reads only that window.
+    """
+    conn = get_connection()
+    row = conn.execute(
+        "SELECT summary FROM thread_summaries WHERE username = ? AND thread_id = ?", (username, thread_id)
+    ).fetchone()
+    rows = conn.execute(
+        "SELECT role, content FROM messages WHERE username = ? AND thread_id = ? ORDER BY seq DESC LIMIT ?",
+        (username, thread_id, recent)
+    ).fetchall()
+    return (row["summary"] if row else ""), [{"role": r["role"], "content": r["content"]} for r in reversed(rows)]
+
+
+def summary_backlog(username, thread_id, recent, limit):
+    """
+    Returns (summary, covered, messages) where covered is how many leading messages the
+    summary already folds in and messages are the next ones (at most `limit`) that have
+    fallen out of the last `recent` and still need folding.
+    """
+    conn = get_connection()
+    thread = conn.execute(
+        "SELECT message_count FROM threads WHERE username = ? AND thread_id = ?", (username, thread_id)
+    ).fetchone()
+    if thread is None:
+        return "", 0, []
+    row = conn.execute(
+        "SELECT summary, covered FROM thread_summaries WHERE username = ? AND thread_id = ?", (username, thread_id)
+    ).fetchone()
+    summary, covered = (row["summary"], row["covered"]) if row else ("", 0)
+    end = min(thread["message_count"] - recent, covered + limit)
+    if end <= covered:
+        return summary, covered, []
+    rows = conn.execute(
+        "SELECT role, content FROM messages WHERE username = ? AND thread_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+        (username, thread_id, covered, end)
+    ).fetchall()
+    return summary, covered, [{"role": r["role"], "content": r["content"]} for r in rows]
+
+
+def save_summary(username, thread_id, summary, covered):
+    """Stores a thread summary unless one covering as many messages is already there."""
+    try:
+        with transaction() as conn:
+            conn.execute(
+                "INSERT INTO thread_summaries (username, thread_id, summary, covered, updated_at) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (username, thread_id) DO UPDATE SET "
+                "summary = excluded.summary, covered = excluded.covered, updated_at = excluded.updated_at "
+                "WHERE excluded.covered > thread_summaries.covered",
+                (username, thread_id, summary, covered, str(datetime.now()))
+            )
+    except sqlite3.IntegrityError:
+        pass  # the thread was deleted while its summary was being written
+
+
+def delete_thread(username, thread_id):
+    """Deletes a thread and its messages. Returns False if it did not exist."""
+    with transaction() as conn:
+        cur = conn.execute("DELETE FROM threads WHERE username = ? AND thread_id = ?", (username, thread_id))
+        return cur.rowcount > 0
+
+
+def migrate_json_history(history_dir):
+    """
+    Imports legacy threads_<username>.json files into the store.
+    Each file is imported once (recorded in migrated_files); the JSON files are left untouched.
+    """
+    if not os.path.isdir(history_dir):
+        return
+
+    for filename in sorted(os.listdir(history_dir)):
+        if not (filename.startswith("threads_") and filename.endswith(".json")):
+            continue
+        username = filename[len("threads_"):-len(".json")]
+
+        with transaction() as conn:
+            if conn.execute("SELECT 1 FROM migrated_files WHERE filename = ?", (filename,)).fetchone():
+                continue
+            try:
+                with open(os.path.join(history_dir, filename), "r") as f:
+                    threads = json.load(f)
+            except Exception as e:
+                logger.warning(f"Could not migrate '{filename}': {e}")
+                continue
+
+            if isinstance(threads, dict):
+                for thread_id, thread in threads.items():
+                    created = thread.get("created_at") or str(datetime.now())
+                    messages = thread.get("messages") or []
+                    cur = conn.execute(
+                        "INSERT OR IGNORE INTO threads "
+                        "(username, thread_id, title, created_at, updated_at, message_count) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (username, thread_id, thread.get("title") or "New Chat",
+                         created, thread.get("updated_at") or created, len(messages))
+                    )
+                    if cur.rowcount and messages:
+                        _insert_messages(conn, username, thread_id, messages, 0)
+
+            conn.execute(
+                "INSERT INTO migrated_files (filename, migrated_at) VALUES (?, ?)",
+                (filename, str(datetime.now()))
+            )
+            print(f"[LOG] Migrated {filename} into the thread store")
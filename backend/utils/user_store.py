@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import secrets
+import sqlite3
+import threading
+from datetime import datetime
+import bcrypt
+
+from config.config import SESSION_TTL, SESSION_CACHE_SIZE, SESSION_RECHECK_SECONDS
+from utils.db import get_connection, transaction
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password_hash TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    token_hash TEXT PRIMARY KEY,
+    username TEXT NOT NULL REFERENCES users (username) ON DELETE CASCADE,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at);
+"""
+
+
+class UserExistsError(Exception):
+    pass
+
+
+def init_user_store():
+    get_connection().executescript(SCHEMA)
+
+
+# ---------- passwords (CPU-bound; callers run these off the event loop) ----------
+
+def hash_password(password):
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+
+
+def create_user(username, password):
+    """Creates a user with a bcrypt-hashed password. Raises UserExistsError if taken."""
+    password_hash = hash_password(password)
+    try:
+        with transaction() as conn:
+            conn.execute(
+                "INSERT INTO users (username, password_hash, created_at) VALUES (?, ?, ?)",
+                (username, password_hash, str(datetime.now()))
+            )
+    except sqlite3.IntegrityError:
+        raise UserExistsError(username)
+
+
+def verify_user(username, password):
+    row = get_connection().execute(
+        "SELECT password_hash FROM users WHERE username = ?", (username,)
+    ).fetchone()
+    if row is None:
+        return False
+    try:
+        return bcrypt.checkpw(password.encode(), row["password_hash"].encode())
+    except ValueError:
+        return False
+
+
+# ---------- sessions ----------
+
+# token hash -> (username, expires_at, checked_at); a recent hit validates a token without
+# touching the database. Entries older than SESSION_RECHECK_SECONDS are confirmed against
+# the sessions table again, so a logout handled by another worker takes effect here too.
+_session_cache = {}
+_session_lock = threading.Lock()
+
+
+def _token_hash(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def create_session(username):
+    """Issues a random session token; only its hash is stored."""
+    token = secrets.token_urlsafe(32)
+    expires_at = time.time() + SESSION_TTL
+    with transaction() as conn:
+        conn.execute("DELETE FROM sessions WHERE expires_at < ?", (time.time(),))
+        conn.execute(
+            "INSERT INTO sessions (token_hash, username, expires_at) VALUES (?, ?, ?)",
+            (_token_hash(token), username, expires_at)
+        )
+    return token
+
+
+def cached_session_user(token):
+    """Returns the username for a token if this worker validated it recently, else None."""
+    entry = _session_cache.get(_token_hash(token))
+    now = time.time()
+    if entry and entry[1] > now and now - entry[2] < SESSION_RECHECK_SECONDS:
+        return entry[0]
+    return None
+
+
+def session_user(token):
+    """Returns the username owning a valid token, or None. Consults the in-memory cache first."""
+    username = cached_session_user(token)
+    if username:
+        return username
+
+    token_hash = _token_hash(token)
+    row = get_connection().execute(
+        "SELECT username, expires_at FROM sessions WHERE token_hash = ? AND expires_at > ?",
+        (token_hash, time.time())
+    ).fetchone()
+    if row is None:
+        _session_cache.pop(token_hash, None)
+        return None
+
+    with _session_lock:
+        if len(_session_cache) >= SESSION_CACHE_SIZE:
+            _session_cache.clear()
+        _session_cache[token_hash] = (row["username"], row["expires_at"], time.time())
+    return row["username"]
+
+
+def delete_session(token):
+    token_hash = _token_hash(token)
+    _session_cache.pop(token_hash, None)
+    with transaction() as conn:
+        conn.execute("DELETE FROM sessions WHERE token_hash = ?", (token_hash,))
+
+
+# ---------- migration ----------
+
+def migrate_users_json(users_file):
+    """
+    Imports the legacy users.json into the store. Existing users are kept; legacy
+    plaintext passwords are bcrypt-hashed on the way in. The JSON file is left untouched.
+    """
+    if not os.path.exists(users_file):
+        return
+    try:
+        with open(users_file, "r") as f:
+            users = json.load(f)
+    except Exception as e:
+        logger.warning(f"Could not migrate '{users_file}': {e}")
+        return
+
+    conn = get_connection()
+    for username, record in users.items():
+        if conn.execute("SELECT 1 FROM users WHERE username = ?", (username,)).fetchone():
+            continue
+        password = record.get("password", "")
+        if not password.startswith("$2"):
+            password = hash_password(password)
+        with transaction() as tx:
+            tx.execute(
+                "INSERT OR IGNORE INTO users (username, password_hash, created_at) VALUES (?, ?, ?)",
+                (username, password, record.get("created_at") or str(datetime.now()))
+            )
+        print(f"[LOG] Migrated user {username} into the user store")
@@ -1,31 +1,10 @@
 from serpapi import GoogleSearch
 from config.config import get_serpapi_api_key
 import logging
-from transformers import pipeline
+from models.domain_gate import is_data_science_query
 
 logger = logging.getLogger(__name__)
 
-# Lazy-load Zero-Shot Classifier for non-Streamlit environments
-_intent_classifier = None
-
-def load_intent_classifier():
-    global _intent_classifier
-    if _intent_classifier is None:
-        _intent_classifier = pipeline("zero-shot-classification", model="facebook/bart-large-mnli")
-    return _intent_classifier
-
-# Only allow data science questions
-DOMAIN_LABELS = ["data science"]
-
-def is_data_science_query(query: str, threshold: float = 0.75) -> bool:
-    """Return True only if 'data science' label score is highest and above threshold."""
-    clf = load_intent_classifier()
-    result = clf(query, DOMAIN_LABELS)
-    labels = result["labels"]
-    scores = result["scores"]
-
-    return labels[0] == "data science" and scores[0] >= threshold
-
 def serpapi_web_search(query):
     try:
         # Strict domain intent detection for data science only
@@ -2,6 +2,7 @@
 
 export let userId = null;
 export let username = null;
+export let authToken = null;
 export let isAuthReady = false;
 
 const BASE = (window.location.port === '8000' || window.location.protocol === 'https:') 
@@ -15,6 +16,7 @@ try {
         const userData = JSON.parse(savedUser);
         username = userData.username;
         userId = userData.username; // Using username as ID
+        authToken = userData.token || null;
     }
 } catch (error) {
     console.error("Error parsing user data from localStorage:", error);
@@ -23,6 +25,11 @@ try {
     isAuthReady = true;
 }
 
+/**
+ * Authorization header for API calls made on behalf of the logged-in user
+ */
+export const authHeaders = () => (authToken ? { Authorization: `Bearer ${authToken}` } : {});
+
 /**
  * Signup function
  */
@@ -40,10 +47,11 @@ export const handleSignup = async (uname, password) => {
 
     localStorage.setItem(
       "chatbot_user",
-      JSON.stringify({ username: uname })
+      JSON.stringify({ username: uname, token: data.token })
     );
     username = uname;
     userId = uname;
+    authToken = data.token;
 
     alert("Signup successful! Redirecting...");
     window.location.href = "index.html";
@@ -71,10 +79,11 @@ export const handleLogin = async (uname, password) => {
 
     localStorage.setItem(
       "chatbot_user",
-      JSON.stringify({ username: uname })
+      JSON.stringify({ username: uname, token: data.token })
     );
     username = uname;
     userId = uname;
+    authToken = data.token;
 
     alert("Login successful! Redirecting...");
     window.location.href = "index.html";
@@ -88,10 +97,16 @@ export const handleLogin = async (uname, password) => {
 /**
  * Logout function
  */
-export const handleLogout = () => {
+export const handleLogout = async () => {
+  try {
+    await fetch(`${BASE}/logout`, { method: "POST", headers: authHeaders() });
+  } catch (error) {
+    console.error("Logout request failed:", error);
+  }
   localStorage.removeItem("chatbot_user");
   username = null;
   userId = null;
+  authToken = null;
   alert("Logged out successfully");
   window.location.href = "login.html";
 };
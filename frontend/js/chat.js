@@ -1,4 +1,4 @@
-import { userId, username } from "./auth.js";
+import { userId, username, authToken, authHeaders } from "./auth.js";
 
 
 
@@ -8,7 +8,8 @@ document.addEventListener('DOMContentLoaded', () => {
     const chatMessages = document.getElementById('chat-messages');
     const newChatBtn = document.getElementById('new-chat-btn');
 
-    if (!userId) {
+    if (!userId || !authToken) {
+        localStorage.removeItem("chatbot_user");
         window.location.href = 'login.html';
         return;
     }
@@ -64,61 +65,80 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     // -------- LocalStorage Chat History --------
-    const HISTORY_KEY = (u) => `qads_chat_history_${u}`;
-
-    function getFullHistory() {
+    // Each thread has its own keys: the messages the server has acknowledged with their
+    // sequence number ({ seq, messages }), and the local messages not yet synced. Adding a
+    // message only rewrites the small pending list, never the user's whole history.
+    const THREAD_KEY = (u, t) => `qads_thread_${u}_${t}`;
+    const PENDING_KEY = (u, t) => `qads_pending_${u}_${t}`;
+    const LEGACY_HISTORY_KEY = (u) => `qads_chat_history_${u}`;
+
+    function readJSON(key, fallback) {
         try {
-            const raw = localStorage.getItem(HISTORY_KEY(username));
-            return raw ? JSON.parse(raw) : {};
+            const raw = localStorage.getItem(key);
+            return raw ? JSON.parse(raw) : fallback;
         } catch (e) {
-            console.error("Failed to parse chat history:", e);
-            return {};
+            console.error(`Failed to parse ${key}:`, e);
+            return fallback;
         }
     }
 
-    function saveFullHistory(history) {
+    function writeJSON(key, value) {
         try {
-            localStorage.setItem(HISTORY_KEY(username), JSON.stringify(history));
+            localStorage.setItem(key, JSON.stringify(value));
         } catch (e) {
-            console.error("Failed to save chat history:", e);
+            console.error(`Failed to save ${key}:`, e);
         }
     }
 
-    function getThreadHistory(threadId) {
-        if (!threadId) return [];
-        const history = getFullHistory();
-        return history[threadId] || [];
+    function getSyncedThread(threadId) {
+        return readJSON(THREAD_KEY(username, threadId), { seq: 0, messages: [] });
     }
 
-    function saveThreadHistory(threadId, messages) {
-        if (!threadId) return;
-        const history = getFullHistory();
-        history[threadId] = messages;
-        saveFullHistory(history);
+    function getPendingMessages(threadId) {
+        return readJSON(PENDING_KEY(username, threadId), []);
+    }
+
+    function getThreadHistory(threadId) {
+        if (!threadId) return [];
+        return getSyncedThread(threadId).messages.concat(getPendingMessages(threadId));
     }
 
     function addMessageToHistory(threadId, message) {
         if (!threadId) return;
-        const history = getFullHistory();
-        if (!history[threadId]) {
-            history[threadId] = [];
-        }
-        history[threadId].push(message);
-        saveFullHistory(history);
+        const pending = getPendingMessages(threadId);
+        pending.push(message);
+        writeJSON(PENDING_KEY(username, threadId), pending);
     }
 
     function removeThreadHistory(threadId) {
         if (!threadId) return;
-        const history = getFullHistory();
-        delete history[threadId];
-        saveFullHistory(history);
+        localStorage.removeItem(THREAD_KEY(username, threadId));
+        localStorage.removeItem(PENDING_KEY(username, threadId));
     }
 
+    // The old single-blob history becomes pending messages; the first sync from seq 0
+    // drops the ones the server already has.
+    function migrateLegacyHistory() {
+        const legacy = readJSON(LEGACY_HISTORY_KEY(username), null);
+        if (!legacy) return;
+        Object.entries(legacy).forEach(([threadId, messages]) => {
+            if (Array.isArray(messages) && messages.length && !localStorage.getItem(THREAD_KEY(username, threadId))) {
+                writeJSON(PENDING_KEY(username, threadId), messages);
+            }
+        });
+        localStorage.removeItem(LEGACY_HISTORY_KEY(username));
+    }
+    migrateLegacyHistory();
+
     // -------- API helpers --------
-    async function apiListThreads() {
+    // One page of thread metadata, newest first; pass the returned nextCursor to get the next page.
+    // The server sends an ETag, so the browser revalidates repeat requests with a 304.
+    async function apiListThreads(cursor = null) {
         const user = getAuthUser();
         if (!user) throw new Error("User not identified");
-        const r = await fetch(`${BASE}/api/threads?username=${encodeURIComponent(user)}`);
+        let url = `${BASE}/api/threads?username=${encodeURIComponent(user)}`;
+        if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
+        const r = await fetch(url, { headers: authHeaders() });
         if (!r.ok) {
             const txt = await r.text();
             console.error("List threads failed", r.status, txt);
@@ -126,7 +146,7 @@ document.addEventListener('DOMContentLoaded', () => {
         }
         const data = await r.json();
         if (!data.ok) throw new Error('List threads not ok');
-        return data.threads || [];
+        return { threads: data.threads || [], nextCursor: data.next_cursor || null };
     }
 
     async function apiCreateThread(title) {
@@ -134,7 +154,7 @@ document.addEventListener('DOMContentLoaded', () => {
         if (!user) throw new Error("User not identified");
         const r = await fetch(`${BASE}/api/threads`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: { 'Content-Type': 'application/json', ...authHeaders() },
             body: JSON.stringify({ username: user, title })
         });
         if (!r.ok) {
@@ -147,24 +167,17 @@ document.addEventListener('DOMContentLoaded', () => {
         return data.thread;
     }
 
-    async function apiGetThread(threadId) {
-        const user = getAuthUser();
-        if (!user) throw new Error("User not identified");
-        const r = await fetch(`${BASE}/api/threads/${encodeURIComponent(threadId)}?username=${encodeURIComponent(user)}`);
-        if (!r.ok) throw new Error(`Get thread failed: ${r.status}`);
-        const data = await r.json();
-        if (!data.ok) throw new Error('Get thread not ok');
-        return data.thread;
-    }
-
-    async function apiSyncThread(threadId, messages) {
+    // Sends the messages after baseSeq; resolves to { seq, messages } (the server's messages
+    // from baseSeq on), or null when the server has fewer than baseSeq messages (409).
+    async function apiSyncThread(threadId, baseSeq, messages) {
         const user = getAuthUser();
         if (!user) throw new Error("User not identified");
         const r = await fetch(`${BASE}/api/threads/${encodeURIComponent(threadId)}/sync?username=${encodeURIComponent(user)}`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ username: user, session_id: sessionId, messages })
+            headers: { 'Content-Type': 'application/json', ...authHeaders() },
+            body: JSON.stringify({ username: user, session_id: sessionId, base_seq: baseSeq, messages })
         });
+        if (r.status === 409) return null;
         if (!r.ok) {
             const txt = await r.text();
             console.error("Sync failed", r.status, txt);
@@ -172,7 +185,7 @@ document.addEventListener('DOMContentLoaded', () => {
         }
         const data = await r.json();
         if (!data.ok) throw new Error('Sync not ok');
-        return data.thread; // server thread after merge
+        return { seq: data.seq, messages: data.messages || [] };
     }
 
     async function apiRenameThread(threadId, title) {
@@ -180,7 +193,7 @@ document.addEventListener('DOMContentLoaded', () => {
         if (!user) throw new Error("User not identified");
         const r = await fetch(`${BASE}/api/threads/${encodeURIComponent(threadId)}?username=${encodeURIComponent(user)}`, {
             method: 'PATCH',
-            headers: { 'Content-Type': 'application/json' },
+            headers: { 'Content-Type': 'application/json', ...authHeaders() },
             body: JSON.stringify({ username: user, title })
         });
         if (!r.ok) throw new Error(`Rename thread failed: ${r.status}`);
@@ -193,7 +206,8 @@ document.addEventListener('DOMContentLoaded', () => {
         const user = getAuthUser();
         if (!user) throw new Error("User not identified");
         const r = await fetch(`${BASE}/api/threads/${encodeURIComponent(threadId)}?username=${encodeURIComponent(user)}`, {
-            method: 'DELETE'
+            method: 'DELETE',
+            headers: authHeaders()
         });
         if (!r.ok) throw new Error(`Delete thread failed: ${r.status}`);
         const data = await r.json();
@@ -206,7 +220,7 @@ document.addEventListener('DOMContentLoaded', () => {
         if (!user) throw new Error("User not identified");
         const r = await fetch(`${BASE}/api/chat`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: { 'Content-Type': 'application/json', ...authHeaders() },
             body: JSON.stringify({ username: user, query: prompt, thread_id: threadId, session_id: sessionId })
         });
         if (!r.ok) {
@@ -224,6 +238,52 @@ document.addEventListener('DOMContentLoaded', () => {
         return data; // { response, ts, thread_id }
     }
 
+    // Streams the answer as NDJSON events; onToken receives the text generated so far.
+    // Resolves to the final { response, ts, thread_id } once the server has saved the thread.
+    async function apiChatStream(threadId, prompt, onToken) {
+        const user = getAuthUser();
+        if (!user) throw new Error("User not identified");
+        const r = await fetch(`${BASE}/api/chat/stream`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', ...authHeaders() },
+            body: JSON.stringify({ username: user, query: prompt, thread_id: threadId, session_id: sessionId })
+        });
+        if (!r.ok || !r.body) {
+            const txt = await r.text();
+            throw new Error(`Chat stream failed: ${r.status} ${txt}`);
+        }
+
+        const reader = r.body.getReader();
+        const decoder = new TextDecoder();
+        let buffered = '';
+        let text = '';
+        let done = null;
+
+        const handleLine = (line) => {
+            if (!line.trim()) return;
+            const evt = JSON.parse(line);
+            if (evt.type === 'token') {
+                text += evt.content;
+                onToken(text);
+            } else if (evt.type === 'done') {
+                done = evt;
+            }
+        };
+
+        while (true) {
+            const { value, done: finished } = await reader.read();
+            if (finished) break;
+            buffered += decoder.decode(value, { stream: true });
+            const lines = buffered.split('\n');
+            buffered = lines.pop();
+            lines.forEach(handleLine);
+        }
+        handleLine(buffered + decoder.decode());
+
+        if (!done) throw new Error('Chat stream ended early');
+        return done;
+    }
+
     // -------- UI helpers (neutral look) --------
     const displayMessage = (message, sender, isLoading = false, ts = null) => {
         const wrapper = document.createElement('div');
@@ -239,32 +299,10 @@ document.addEventListener('DOMContentLoaded', () => {
         if (isLoading) {
             bubble.id = 'loading-indicator';
             bubble.textContent = 'Thinking…';
+        } else if (sender === 'bot') {
+            renderBotContent(bubble, message);
         } else {
-            if (sender === 'bot' && window.marked && window.DOMPurify) {
-                const html = DOMPurify.sanitize(marked.parse(message || ''));
-                bubble.innerHTML = html;
-                // Add copy buttons to code blocks
-                const codeBlocks = bubble.querySelectorAll('pre');
-                codeBlocks.forEach(block => {
-                    const code = block.querySelector('code');
-                    if (code) {
-                        const copyBtn = document.createElement('button');
-                        copyBtn.className = 'copy-btn';
-                        copyBtn.textContent = 'Copy';
-                        copyBtn.addEventListener('click', () => {
-                            navigator.clipboard.writeText(code.textContent).then(() => {
-                                copyBtn.textContent = 'Copied!';
-                                setTimeout(() => {
-                                    copyBtn.textContent = 'Copy';
-                                }, 2000);
-                            });
-                        });
-                        block.appendChild(copyBtn);
-                    }
-                });
-            } else {
-                bubble.textContent = message;
-            }
+            bubble.textContent = message;
         }
         wrapper.appendChild(bubble);
 
@@ -278,8 +316,37 @@ document.addEventListener('DOMContentLoaded', () => {
 
         chatMessages.appendChild(wrapper);
         chatMessages.scrollTop = chatMessages.scrollHeight;
+        return bubble;
     };
 
+    function renderBotContent(bubble, message, withCopyButtons = true) {
+        if (!(window.marked && window.DOMPurify)) {
+            bubble.textContent = message;
+            return;
+        }
+        bubble.innerHTML = DOMPurify.sanitize(marked.parse(message || ''));
+        if (!withCopyButtons) return;
+        // Add copy buttons to code blocks
+        const codeBlocks = bubble.querySelectorAll('pre');
+        codeBlocks.forEach(block => {
+            const code = block.querySelector('code');
+            if (code) {
+                const copyBtn = document.createElement('button');
+                copyBtn.className = 'copy-btn';
+                copyBtn.textContent = 'Copy';
+                copyBtn.addEventListener('click', () => {
+                    navigator.clipboard.writeText(code.textContent).then(() => {
+                        copyBtn.textContent = 'Copied!';
+                        setTimeout(() => {
+                            copyBtn.textContent = 'Copy';
+                        }, 2000);
+                    });
+                });
+                block.appendChild(copyBtn);
+            }
+        });
+    }
+
     function clearChatUI() {
         chatMessages.innerHTML = '';
     }
@@ -300,12 +367,56 @@ document.addEventListener('DOMContentLoaded', () => {
         return { role: m.role === 'assistant' ? 'bot' : 'user', text: m.content, ts: m.ts };
     }
 
+    // -------- Delta sync --------
+    // One sync per thread at a time; callers arriving meanwhile share the running one.
+    const syncsInFlight = {};
+
+    function syncThread(threadId) {
+        if (!threadId) return Promise.resolve(false);
+        if (!syncsInFlight[threadId]) {
+            syncsInFlight[threadId] = runSync(threadId).finally(() => { delete syncsInFlight[threadId]; });
+        }
+        return syncsInFlight[threadId];
+    }
+
+    // Pushes the thread's pending messages and pulls what the server has after the last
+    // acknowledged seq; the server's order wins. Resolves to true when the thread now
+    // differs from what was shown locally.
+    async function runSync(threadId) {
+        let synced = getSyncedThread(threadId);
+        const pending = getPendingMessages(threadId);
+        let result = await apiSyncThread(threadId, synced.seq, pending);
+        if (result === null) {
+            // The server has fewer messages than we thought: resend everything from 0
+            const all = synced.messages.concat(pending);
+            synced = { seq: 0, messages: [] };
+            result = await apiSyncThread(threadId, 0, all);
+            if (result === null) return false;
+        }
+        const tail = result.messages.map(mapServerMsg);
+        writeJSON(THREAD_KEY(username, threadId), {
+            seq: result.seq,
+            messages: synced.messages.slice(0, synced.seq).concat(tail)
+        });
+        // Messages added while the request was in flight stay pending for the next sync
+        const remaining = getPendingMessages(threadId).slice(pending.length);
+        if (remaining.length) {
+            writeJSON(PENDING_KEY(username, threadId), remaining);
+        } else {
+            localStorage.removeItem(PENDING_KEY(username, threadId));
+        }
+        return tail.length !== pending.length || tail.some((m, i) => m.role !== pending[i].role || m.text !== pending[i].text);
+    }
+
     // -------- State --------
-    let threads = []; // list view
+    let threads = []; // list view, in server order (most recently updated first)
+    let threadsCursor = null; // cursor of the next sidebar page, null when all are loaded
     let activeThreadId = null;
 
     async function loadAndRenderThreads() {
-        threads = await apiListThreads();
+        const page = await apiListThreads();
+        threads = page.threads;
+        threadsCursor = page.nextCursor;
         const saved = getActiveThreadId();
         if (saved && threads.some(t => t.id === saved)) {
             activeThreadId = saved;
@@ -316,6 +427,15 @@ document.addEventListener('DOMContentLoaded', () => {
         renderHistoryList();
     }
 
+    async function loadMoreThreads() {
+        if (!threadsCursor) return;
+        const page = await apiListThreads(threadsCursor);
+        const known = new Set(threads.map(t => t.id));
+        threads = threads.concat(page.threads.filter(t => !known.has(t.id)));
+        threadsCursor = page.nextCursor;
+        renderHistoryList();
+    }
+
     async function loadAndRenderActiveThreadMessages() {
         if (!activeThreadId) {
             renderEmptyState();
@@ -331,24 +451,21 @@ document.addEventListener('DOMContentLoaded', () => {
             renderEmptyState();
         }
 
-        // 2) Attempt to sync local -> server (merge), then fetch server truth
+        // 2) Push pending messages and pull anything new on the server since the last sync
+        const threadId = activeThreadId;
         try {
-            if (localMessages && localMessages.length > 0) {
-                await apiSyncThread(activeThreadId, localMessages);
-            }
-            const thread = await apiGetThread(activeThreadId);
-            const serverMsgs = (thread.messages || []).map(mapServerMsg);
-
-            // 3) Update UI and localStorage with server data (source of truth)
-            clearChatUI();
-            if (serverMsgs.length === 0) {
-                renderEmptyState();
-            } else {
-                serverMsgs.forEach(m => displayMessage(m.text, m.role, false, m.ts));
+            const changed = await syncThread(threadId);
+            if (changed && threadId === activeThreadId) {
+                clearChatUI();
+                const messages = getThreadHistory(threadId);
+                if (messages.length === 0) {
+                    renderEmptyState();
+                } else {
+                    messages.forEach(m => displayMessage(m.text, m.role, false, m.ts));
+                }
             }
-            saveThreadHistory(activeThreadId, serverMsgs);
         } catch (e) {
-            console.error("Failed to sync/fetch thread:", e);
+            console.error("Failed to sync thread:", e);
             // Fallback: keep showing local history
         }
     }
@@ -359,95 +476,108 @@ document.addEventListener('DOMContentLoaded', () => {
         if (!list) return;
         list.innerHTML = '';
 
-        threads
-            .slice()
-            .sort((a, b) => new Date(b.updatedAt) - new Date(a.updatedAt))
-            .forEach(thread => {
-                const isActive = thread.id === activeThreadId;
-                const item = document.createElement('div');
-                item.className = `group border border-slate-200 rounded-lg ${isActive ? 'bg-slate-50' : 'bg-white'} hover:bg-slate-50 transition`;
+        threads.forEach(thread => {
+            const isActive = thread.id === activeThreadId;
+            const item = document.createElement('div');
+            item.className = `group border border-slate-200 rounded-lg ${isActive ? 'bg-slate-50' : 'bg-white'} hover:bg-slate-50 transition`;
+
+            const row = document.createElement('div');
+            row.className = 'w-full text-left p-3 flex items-start gap-2 cursor-pointer';
 
-                const row = document.createElement('div');
-                row.className = 'w-full text-left p-3 flex items-start gap-2 cursor-pointer';
+            const textWrap = document.createElement('div');
+            textWrap.className = 'flex-1 min-w-0';
 
-                const textWrap = document.createElement('div');
-                textWrap.className = 'flex-1 min-w-0';
+            const titleEl = document.createElement('div');
+            titleEl.className = 'text-sm font-medium text-slate-800 truncate';
+            titleEl.title = thread.title || 'New conversation';
+            titleEl.textContent = thread.title || 'New conversation';
 
-                const titleEl = document.createElement('div');
-                titleEl.className = 'text-sm font-medium text-slate-800 truncate';
-                titleEl.title = thread.title || 'New conversation';
-                titleEl.textContent = thread.title || 'New conversation';
+            const timeEl = document.createElement('div');
+            timeEl.className = 'text-[10px] text-slate-400 mt-1';
+            timeEl.textContent = `Updated: ${new Date(thread.updated_at).toLocaleString()}`;
 
-                const timeEl = document.createElement('div');
-                timeEl.className = 'text-[10px] text-slate-400 mt-1';
-                timeEl.textContent = `Updated: ${new Date(thread.lastTs || thread.updatedAt).toLocaleString()}`;
+            textWrap.appendChild(titleEl);
+            textWrap.appendChild(timeEl);
 
-                textWrap.appendChild(titleEl);
-                textWrap.appendChild(timeEl);
+            const actions = document.createElement('div');
+            actions.className = 'flex items-center gap-1 opacity-0 group-hover:opacity-100 transition';
 
-                const actions = document.createElement('div');
-                actions.className = 'flex items-center gap-1 opacity-0 group-hover:opacity-100 transition';
+            const renameBtn = document.createElement('button');
+            renameBtn.className = 'rename-btn text-slate-500 hover:text-slate-700 px-2 py-1';
+            renameBtn.title = 'Rename';
+            renameBtn.textContent = 'Rename';
 
-                const renameBtn = document.createElement('button');
-                renameBtn.className = 'rename-btn text-slate-500 hover:text-slate-700 px-2 py-1';
-                renameBtn.title = 'Rename';
-                renameBtn.textContent = 'Rename';
+            const deleteBtn = document.createElement('button');
+            deleteBtn.className = 'delete-btn text-red-500 hover:text-red-600 px-2 py-1';
+            deleteBtn.title = 'Delete';
+            deleteBtn.textContent = 'Delete';
 
-                const deleteBtn = document.createElement('button');
-                deleteBtn.className = 'delete-btn text-red-500 hover:text-red-600 px-2 py-1';
-                deleteBtn.title = 'Delete';
-                deleteBtn.textContent = 'Delete';
+            actions.appendChild(renameBtn);
+            actions.appendChild(deleteBtn);
 
-                actions.appendChild(renameBtn);
-                actions.appendChild(deleteBtn);
+            row.appendChild(textWrap);
+            row.appendChild(actions);
 
-                row.appendChild(textWrap);
-                row.appendChild(actions);
+            // Switch to thread
+            row.addEventListener('click', async () => {
+                activeThreadId = thread.id;
+                setActiveThreadId(activeThreadId);
+                renderHistoryList();
+                await loadAndRenderActiveThreadMessages();
+                chatInput?.focus();
+            });
 
-                // Switch to thread
-                row.addEventListener('click', async () => {
-                    activeThreadId = thread.id;
-                    setActiveThreadId(activeThreadId);
-                    renderHistoryList();
+            // Rename
+            renameBtn.addEventListener('click', async (e) => {
+                e.stopPropagation();
+                const newTitle = prompt('Rename conversation:', thread.title || 'New conversation');
+                if (newTitle === null) return;
+                const trimmed = newTitle.trim();
+                if (!trimmed) return;
+                try {
+                    await apiRenameThread(thread.id, trimmed);
+                    await loadAndRenderThreads();
                     await loadAndRenderActiveThreadMessages();
-                    chatInput?.focus();
-                });
+                } catch (err) {
+                    console.error(err);
+                    alert('Failed to rename');
+                }
+            });
 
-                // Rename
-                renameBtn.addEventListener('click', async (e) => {
-                    e.stopPropagation();
-                    const newTitle = prompt('Rename conversation:', thread.title || 'New conversation');
-                    if (newTitle === null) return;
-                    const trimmed = newTitle.trim();
-                    if (!trimmed) return;
-                    try {
-                        await apiRenameThread(thread.id, trimmed);
-                        await loadAndRenderThreads();
-                        await loadAndRenderActiveThreadMessages();
-                    } catch (err) {
-                        console.error(err);
-                        alert('Failed to rename');
-                    }
-                });
+            // Delete
+            deleteBtn.addEventListener('click', async (e) => {
+                e.stopPropagation();
+                if (!confirm('Delete this conversation?')) return;
+                try {
+                    await apiDeleteThread(thread.id);
+                    removeThreadHistory(thread.id); // Also remove from localStorage
+                    await loadAndRenderThreads();
+                    await loadAndRenderActiveThreadMessages();
+                } catch (err) {
+                    console.error(err);
+                    alert('Failed to delete');
+                }
+            });
 
-                // Delete
-                deleteBtn.addEventListener('click', async (e) => {
-                    e.stopPropagation();
-                    if (!confirm('Delete this conversation?')) return;
-                    try {
-                        await apiDeleteThread(thread.id);
-                        removeThreadHistory(thread.id); // Also remove from localStorage
-                        await loadAndRenderThreads();
-                        await loadAndRenderActiveThreadMessages();
-                    } catch (err) {
-                        console.error(err);
-                        alert('Failed to delete');
-                    }
-                });
+            item.appendChild(row);
+            list.appendChild(item);
+        });
 
-                item.appendChild(row);
-                list.appendChild(item);
+        if (threadsCursor) {
+            const moreBtn = document.createElement('button');
+            moreBtn.className = 'w-full text-sm text-slate-500 hover:text-slate-700 py-2';
+            moreBtn.textContent = 'Show more';
+            moreBtn.addEventListener('click', async () => {
+                moreBtn.disabled = true;
+                try {
+                    await loadMoreThreads();
+                } catch (err) {
+                    console.error(err);
+                    moreBtn.disabled = false;
+                }
             });
+            list.appendChild(moreBtn);
+        }
     }
 
     // Send message flow
@@ -484,30 +614,51 @@ document.addEventListener('DOMContentLoaded', () => {
         displayMessage('', 'bot', true); // Loading indicator
 
         try {
-            // Proactively sync local -> server before sending to reduce duplication
-            // const localMessages = getThreadHistory(activeThreadId);
-            // if (localMessages?.length) {
-            //     await apiSyncThread(activeThreadId, localMessages);
-            // }
+            // Render tokens as they arrive; markdown is re-rendered at most once per frame
+            let botBubble = null;
+            let latest = '';
+            let frame = null;
+            const onToken = (textSoFar) => {
+                latest = textSoFar;
+                if (!botBubble) {
+                    const loadingIndicator = document.getElementById('loading-indicator');
+                    if (loadingIndicator) loadingIndicator.parentElement.remove();
+                    botBubble = displayMessage('', 'bot');
+                }
+                if (frame) return;
+                frame = requestAnimationFrame(() => {
+                    frame = null;
+                    renderBotContent(botBubble, latest, false);
+                    chatMessages.scrollTop = chatMessages.scrollHeight;
+                });
+            };
 
-            const data = await apiChat(activeThreadId, message);
+            let data;
+            try {
+                data = await apiChatStream(activeThreadId, message, onToken);
+            } catch (streamError) {
+                if (botBubble) throw streamError;
+                // Streaming unsupported or failed before any token: fall back to the JSON endpoint
+                console.debug('Streaming failed, falling back:', streamError);
+                data = await apiChat(activeThreadId, message);
+            }
+            if (frame) cancelAnimationFrame(frame);
             const loadingIndicator = document.getElementById('loading-indicator');
             if (loadingIndicator) loadingIndicator.parentElement.remove();
+            if (botBubble) botBubble.parentElement.remove();
 
             if (data.thread_id && data.thread_id !== activeThreadId) {
                 activeThreadId = data.thread_id;
                 setActiveThreadId(activeThreadId);
             }
 
-            // Render bot message and save to local history
+            // Render final bot message (with timestamp and copy buttons) and save to local history
             const botMessage = { role: 'bot', text: data.response, ts: data.ts };
             displayMessage(botMessage.text, botMessage.role, false, botMessage.ts);
             addMessageToHistory(activeThreadId, botMessage);
 
-            // Fetch server truth to keep cache accurate
-            const thread = await apiGetThread(activeThreadId);
-            const serverMsgs = (thread.messages || []).map(mapServerMsg);
-            saveThreadHistory(activeThreadId, serverMsgs);
+            // The server already stored this turn; syncing acknowledges it without resending history
+            await syncThread(activeThreadId);
 
             await loadAndRenderThreads(); // update sidebar
         } catch (error) {
@@ -551,15 +702,12 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
 
-    // Periodic sync of active thread (local -> server), then refresh local cache from server
+    // Periodic push of the active thread's pending messages (the sync also pulls new server messages)
     async function periodicSync() {
         if (!activeThreadId) return;
-        const localMessages = getThreadHistory(activeThreadId);
-        if (!localMessages?.length) return;
+        if (!getPendingMessages(activeThreadId).length) return;
         try {
-            const serverThread = await apiSyncThread(activeThreadId, localMessages);
-            const serverMsgs = (serverThread.messages || []).map(mapServerMsg);
-            saveThreadHistory(activeThreadId, serverMsgs);
+            await syncThread(activeThreadId);
         } catch (e) {
             // Silent fail; next tick will retry
             console.debug('Periodic sync failed:', e);
@@ -1,5 +1,8 @@
 import os
 import multiprocessing
+import uuid
+import shutil
+import tempfile
 
 # Gunicorn configuration file
 
@@ -15,3 +18,17 @@ worker_class = "uvicorn.workers.UvicornWorker"
 loglevel = "info"
 accesslog = "-"
 errorlog = "-"
+
+
+def on_starting(server):
+    # Shared by every worker so they agree on which startup ingestion they are waiting for
+    os.environ["INGEST_RUN_ID"] = uuid.uuid4().hex
+    # Workers write metric samples here and /metrics merges them; samples from a previous run are dropped
+    metrics_dir = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "qads-metrics"))
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)